@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported after Django is set up
+from class_catch_app.push import sse_app, websocket_app  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Push endpoints run directly on the event loop; everything else goes to Django."""
+    if scope['type'] == 'websocket' and scope['path'] == '/ws/classes/':
+        return await websocket_app(scope, receive, send)
+    if scope['type'] == 'http' and scope['path'] == '/api/stream/':
+        return await sse_app(scope, receive, send)
+    if scope['type'] == 'websocket':
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    return await django_application(scope, receive, send)
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'class_catch_app',
@@ -142,6 +143,49 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Selenium driver pool (class_catch_app.driver_pool)
+SELENIUM_POOL_SIZE = int(os.environ.get('SELENIUM_POOL_SIZE', 2))
+SELENIUM_POOL_MAX_USES = 25
+
+# how long cookies from a browser-bootstrapped scrape session are reused
+SCRAPER_SESSION_TTL = 60 * 30  # seconds
+
+# pooled keep-alive HTTP sessions (class_catch_app.http_transport)
+HTTP_MAX_SESSIONS = 256
+HTTP_POOL_MAXSIZE = 16
+USER_AGENT_POOL_SIZE = 50
+
+# proxy health service (manage.py proxy_health)
+PROXY_POOL_TARGET_SIZE = 20
+PROXY_POOL_LOW_WATERMARK = 10
+PROXY_PROBE_INTERVAL = 300  # seconds between probes of a median-scoring proxy
+
+# watchlist notifications (manage.py dispatch_notifications)
+SENDGRID_API_HOST = os.environ.get('SENDGRID_API_HOST', 'https://api.sendgrid.com')
+NOTIFICATION_RATE_LIMIT = 10  # provider calls per second
+NOTIFICATION_WORKERS = 4
+NOTIFICATION_BATCH_SIZE = 1000  # personalizations per call, the SendGrid maximum
+NOTIFICATION_MAX_ATTEMPTS = 5  # dispatch passes per failed batch before giving up
+NOTIFICATION_RETRY_DELAY = 60  # seconds before a failed batch is first re-sent, doubled per attempt
+OUTBOX_GAP_TIMEOUT = 30  # seconds an outbox id gap is waited on before it is taken as a rollback
+
+# shared by the scraper and the API processes (class data version for ETags)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', str(BASE_DIR / '.cache')),
+    }
+}
+DATA_VERSION_CACHE_TIMEOUT = 60  # seconds a cached data version is trusted before it is re-read
+
+# class API response cache (class_catch_app.response_cache), in front of CACHES
+RESPONSE_CACHE_MAX_ENTRIES = 512
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESPONSE_CACHE_TIMEOUT = 60 * 60  # seconds
+
+# how often the ASGI push stream polls the change event outbox (seconds)
+PUSH_POLL_INTERVAL = 1.0
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -1,14 +1,62 @@
 from django.contrib import admin
-from .models import Class, Proxy
+from .models import BlacklistedProxy, Class, ClassAggregate, ClassChangeEvent, FailedNotification, OutboxCursor, Proxy, ScrapeState, ScraperSession, Watch
+from .search import filter_search, is_text_query, search_enabled
 
 @admin.register(Class)
 class ClassAdmin(admin.ModelAdmin):
-    list_display = ('class_code', 'course_number', 'section', 'title', 'instructor', 'term', 'enrollment', 'limit')
-    search_fields = ('class_code', 'course_number', 'title', 'instructor', 'term')
+    list_display = ('class_code', 'course_number', 'section', 'title', 'instructor', 'term', 'enrollment', 'limit', 'is_active')
+    search_fields = ('class_code', 'course_number', 'title', 'instructor', 'term', 'crn')
+
+    def get_search_results(self, request, queryset, search_term):
+        # use the search indexes instead of OR'd icontains scans for words; numbers
+        # like terms and CRNs aren't in the search vector, so those use search_fields
+        if search_enabled() and is_text_query(search_term):
+            return filter_search(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
+@admin.register(ClassAggregate)
+class ClassAggregateAdmin(admin.ModelAdmin):
+    list_display = ('term', 'class_code', 'distrib', 'sections', 'open_sections', 'enrollment', 'capacity', 'updated')
+    list_filter = ('term',)
+    search_fields = ('class_code', 'distrib')
 
 @admin.register(Proxy)
 class ProxyAdmin(admin.ModelAdmin):
     list_display = ('ip', 'port', 'is_working', 'last_verified', 'is_working_requests',
-                    'last_verified_requests', 'is_working_selenium', 'last_verified_selenium')
-    list_filter = ('is_working',)
+                    'last_verified_requests', 'is_working_selenium', 'last_verified_selenium',
+                    'success_rate', 'latency_ewma', 'consecutive_failures', 'last_error')
+    list_filter = ('is_working', 'is_working_requests', 'is_working_selenium')
+    search_fields = ('ip', 'port')
+
+@admin.register(ScrapeState)
+class ScrapeStateAdmin(admin.ModelAdmin):
+    list_display = ('term', 'payload_digest', 'etag', 'last_modified', 'last_success', 'last_checked')
+
+@admin.register(ScraperSession)
+class ScraperSessionAdmin(admin.ModelAdmin):
+    list_display = ('proxy', 'user_agent', 'created', 'expires_at')
+
+@admin.register(BlacklistedProxy)
+class BlacklistedProxyAdmin(admin.ModelAdmin):
+    list_display = ('ip', 'port', 'failures', 'last_error', 'expires_at')
     search_fields = ('ip', 'port')
+
+@admin.register(ClassChangeEvent)
+class ClassChangeEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'term', 'class_code', 'course_number', 'section_number', 'created')
+    list_filter = ('event_type', 'term')
+
+@admin.register(Watch)
+class WatchAdmin(admin.ModelAdmin):
+    list_display = ('email', 'class_code', 'course_number', 'section', 'term', 'event_types', 'is_active', 'created')
+    list_filter = ('is_active', 'term')
+    search_fields = ('email', 'class_code', 'course_number')
+
+@admin.register(OutboxCursor)
+class OutboxCursorAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_event_id', 'gap_seen_at', 'updated')
+
+@admin.register(FailedNotification)
+class FailedNotificationAdmin(admin.ModelAdmin):
+    list_display = ('event', 'status_code', 'error', 'retryable', 'attempts', 'next_attempt_at', 'created')
+    list_filter = ('retryable', 'status_code')
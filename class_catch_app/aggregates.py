@@ -0,0 +1,101 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from class_catch_app.crosslists import HAS_ROOM
+from class_catch_app.models import Class, ClassAggregate
+
+# oversubscribed sections kept per aggregate row, and returned per group
+TOP_OVERSUBSCRIBED = 5
+
+COUNTERS = ('sections', 'open_sections', 'enrollment', 'capacity', 'capped_enrollment', 'oversubscribed_sections')
+GROUP_FIELDS = {'department': 'class_code', 'distrib': 'distrib'}
+
+CAPPED = Q(limit__gt=0)
+OVERSUBSCRIBED = Q(limit__gt=0, enrollment__gt=F('limit'))
+
+
+def oversubscription(entry):
+    """Sort key of a top_oversubscribed entry: enrollment over limit."""
+    return entry[4] / entry[5]
+
+
+def aggregates_exist(term):
+    return ClassAggregate.objects.filter(term=term).exists()
+
+
+def refresh_aggregates(term, departments=None, now=None):
+    """
+    Rebuild the aggregate rows of `departments` (class codes) of `term`, or of
+    every department when None. Returns the number of rows written.
+    """
+    classes = Class.objects.filter(term=term, is_active=True).annotate(group_distrib=Coalesce('distrib', Value('')))
+    stale = ClassAggregate.objects.filter(term=term)
+    if departments is not None:
+        departments = set(departments)
+        if not departments:
+            return 0
+        classes = classes.filter(class_code__in=departments)
+        stale = stale.filter(class_code__in=departments)
+    now = now or timezone.now()
+
+    # annotations are prefixed since `enrollment` would clash with the model field
+    totals = classes.order_by().values('class_code', 'group_distrib').annotate(
+        total_sections=Count('pk'),
+        total_open_sections=Count('pk', filter=HAS_ROOM),
+        total_enrollment=Coalesce(Sum('enrollment'), 0),
+        total_capacity=Coalesce(Sum('limit', filter=CAPPED), 0),
+        total_capped_enrollment=Coalesce(Sum('enrollment', filter=CAPPED), 0),
+        total_oversubscribed_sections=Count('pk', filter=OVERSUBSCRIBED),
+    )
+
+    top = defaultdict(list)
+    for class_code, distrib, *entry in classes.filter(OVERSUBSCRIBED).values_list(
+        'class_code', 'group_distrib', 'course_number', 'section', 'title', 'enrollment', 'limit'
+    ):
+        top[class_code, distrib].append([class_code, *entry])
+
+    aggregates = [
+        ClassAggregate(
+            term=term, class_code=row['class_code'], distrib=row['group_distrib'], updated=now,
+            top_oversubscribed=sorted(
+                top[row['class_code'], row['group_distrib']], key=oversubscription, reverse=True
+            )[:TOP_OVERSUBSCRIBED],
+            **{counter: row[f'total_{counter}'] for counter in COUNTERS},
+        )
+        for row in totals
+    ]
+    with transaction.atomic():
+        stale.delete()
+        ClassAggregate.objects.bulk_create(aggregates)
+    return len(aggregates)
+
+
+def term_aggregates(term, group_by='department'):
+    """
+    Totals per department or distrib of `term`, summed from the aggregate rows
+    (no pass over the sections), with fill rates and the most oversubscribed
+    sections of each group and of the whole term.
+    """
+    field = GROUP_FIELDS[group_by]
+    groups = {}
+    for aggregate in ClassAggregate.objects.filter(term=term):
+        key = getattr(aggregate, field)
+        group = groups.setdefault(key, dict({counter: 0 for counter in COUNTERS}, top_oversubscribed=[]))
+        for counter in COUNTERS:
+            group[counter] += getattr(aggregate, counter)
+        group['top_oversubscribed'].extend(aggregate.top_oversubscribed)
+
+    results = []
+    for key, group in sorted(groups.items()):
+        group['top_oversubscribed'] = sorted(
+            group['top_oversubscribed'], key=oversubscription, reverse=True
+        )[:TOP_OVERSUBSCRIBED]
+        group['fill_rate'] = group['capped_enrollment'] / group['capacity'] if group['capacity'] else None
+        results.append(dict({group_by: key}, **group))
+
+    most_oversubscribed = sorted(
+        (entry for group in results for entry in group['top_oversubscribed']), key=oversubscription, reverse=True
+    )[:TOP_OVERSUBSCRIBED]
+    return {'term': term, 'group_by': group_by, 'groups': results, 'most_oversubscribed': most_oversubscribed}
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ClassCatchAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'class_catch_app'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from class_catch_app import signals
+        post_migrate.connect(signals.migrated, sender=self)
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.utils import timezone
+from class_catch_app.models import ClassChangeEvent
+
+BATCH_SIZE = 1000
+# how long an id gap in the outbox may be an uncommitted transaction rather than a rollback
+GAP_TIMEOUT = timezone.timedelta(seconds=getattr(settings, 'OUTBOX_GAP_TIMEOUT', 30))
+
+
+def is_full(enrollment, limit):
+    # a limit of 0 means the section is uncapped
+    return limit > 0 and enrollment >= limit
+
+
+def diff_events(old, new):
+    """
+    Change events between a stored section and a scraped row, as
+    (event_type, data) pairs. `old` and `new` both provide enrollment, limit,
+    instructor; `old` is None for a section the scrape added. Seats opening
+    and filling are pool events, see `seat_event`.
+    """
+    seats = {'enrollment': new['enrollment'], 'limit': new['limit']}
+    if old is None:
+        return [(ClassChangeEvent.SECTION_ADDED, seats)]
+
+    events = []
+    if old['limit'] != new['limit']:
+        events.append((ClassChangeEvent.LIMIT_CHANGED, dict(seats, old=old['limit'], new=new['limit'])))
+    if (old['instructor'] or '') != (new['instructor'] or ''):
+        events.append((ClassChangeEvent.INSTRUCTOR_CHANGED, dict(seats, old=old['instructor'], new=new['instructor'])))
+    return events
+
+
+def seat_event(old, new):
+    """
+    (event_type, data) for a section whose seat pool, shared with the sections
+    it is cross-listed with, went from (enrollment, limit) `old` to `new`
+    across full, else None.
+    """
+    was_full, now_full = is_full(*old), is_full(*new)
+    if was_full == now_full:
+        return None
+    event_type = ClassChangeEvent.SEAT_FILLED if now_full else ClassChangeEvent.SEAT_OPENED
+    return event_type, {'enrollment': new[0], 'limit': new[1], 'old_enrollment': old[0]}
+
+
+def write_events(events, created):
+    """
+    Append events to the outbox. `events` are (section_id, key, term, event_type,
+    data) tuples in detection order, which becomes their id order.
+    """
+    ClassChangeEvent.objects.bulk_create([
+        ClassChangeEvent(
+            section_id=section_id, event_type=event_type, term=term,
+            class_code=class_code, course_number=course_number, section_number=section_number,
+            data=data, created=created,
+        )
+        for section_id, (class_code, course_number, section_number), term, event_type, data in events
+    ], batch_size=BATCH_SIZE)
+    return len(events)
+
+
+def consumable(ids, after_id, gap_seen_at, now, gap_timeout=GAP_TIMEOUT):
+    """
+    How many of the outbox ids read past `after_id` (ascending) a consumer can
+    move over. Ids are assigned when a row is inserted but become visible when
+    its transaction commits, so a missing id may still show up; reading stops
+    at a gap until it has been open for `gap_timeout`, after which it is taken
+    to be a rollback. `gap_seen_at` is when the gap right after `after_id` was
+    first seen, or None. Returns (count, gap_seen_at) to pass to the next read.
+    """
+    expected = after_id + 1
+    for count, event_id in enumerate(ids):
+        if event_id != expected:
+            if gap_seen_at is None:
+                return count, now
+            if now - gap_seen_at < gap_timeout:
+                return count, gap_seen_at
+        gap_seen_at = None
+        expected = event_id + 1
+    return len(ids), None
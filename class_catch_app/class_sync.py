@@ -0,0 +1,251 @@
+import hashlib
+from collections import namedtuple
+from django.db import transaction
+from django.utils import timezone
+from class_catch_app.models import Class, ClassChangeEvent
+from class_catch_app.aggregates import aggregates_exist, refresh_aggregates
+from class_catch_app.crosslists import (
+    crosslists_resolved, rebuild_crosslists, refresh_crosslist_totals, regroup_crosslists,
+)
+from class_catch_app.change_events import diff_events, seat_event, write_events
+from class_catch_app.enrollment_history import VANISHED_STATE, enrollment_state, record_snapshots
+from class_catch_app.schedule import encode_mask, period_masks
+from class_catch_app.search import refresh_search_vectors
+from class_catch_app.staging_merge import copy_enabled, merge_classes
+
+# scraped fields, in the order they are hashed into the fingerprint
+SCRAPED_FIELDS = (
+    'class_code', 'course_number', 'section', 'title', 'instructor', 'term', 'limit',
+    'enrollment', 'distrib', 'world_culture', 'period', 'period_code', 'status', 'text',
+    'xlist', 'crn',
+)
+
+UPDATE_FIELDS = [
+    'title', 'instructor', 'limit', 'enrollment', 'distrib', 'world_culture',
+    'period', 'period_code', 'status', 'text', 'xlist', 'crn', 'schedule_mask', 'xhour_mask',
+    'fingerprint', 'is_active', 'last_updated'
+]
+
+BATCH_SIZE = 500
+
+
+def class_data_from_row(data):
+    """Map a parsed timetable row (header -> text) onto Class fields."""
+    schedule_mask, xhour_mask = period_masks(data.get('Period Code', ''), data.get('Period', ''))
+    return {
+        'class_code': data.get('Subj', ''),
+        'course_number': data.get('Num', ''),
+        'section': data.get('Sec', ''),
+        'title': data.get('Title', ''),
+        'instructor': data.get('Instructor', ''),
+        'term': data.get('Term', ''),
+        'limit': int(data.get('Lim', '0') or '0'),
+        'enrollment': int(data.get('Enrl', '0') or '0'),
+        'distrib': data.get('Dist', ''),
+        'world_culture': data.get('WC', ''),
+        'period': data.get('Period', ''),
+        'period_code': data.get('Period Code', ''),
+        'status': data.get('Status', ''),
+        'text': data.get('Text', ''),
+        'xlist': data.get('Xlist', ''),
+        'crn': data.get('CRN', ''),
+        # derived from the period columns, so not part of the fingerprint
+        'schedule_mask': encode_mask(schedule_mask),
+        'xhour_mask': encode_mask(xhour_mask),
+    }
+
+
+def class_key(class_data):
+    return (class_data['class_code'], class_data['course_number'], class_data['section'])
+
+
+def class_fingerprint(class_data):
+    """Stable hash of the scraped fields of a row."""
+    payload = '\x1f'.join(str(class_data[field]) for field in SCRAPED_FIELDS)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+# what the diff needs to know about a stored class
+IndexEntry = namedtuple('IndexEntry', 'pk fingerprint enrollment limit status instructor xlist is_active')
+
+
+def fingerprint_index_rows(term, subjects=None):
+    """
+    (class_code, course_number, section, *IndexEntry) of the stored classes
+    of a term; every column is in class_term_sync_idx, so PostgreSQL can
+    answer it with an index-only scan.
+    """
+    classes = Class.objects.filter(term=term)
+    if subjects:
+        classes = classes.filter(class_code__in=subjects)
+    return classes.values_list('class_code', 'course_number', 'section', *IndexEntry._fields)
+
+
+def load_fingerprint_index(term, subjects=None):
+    """Compact key -> IndexEntry index of the stored classes of a term."""
+    return {
+        (class_code, course_number, section): IndexEntry(*entry)
+        for class_code, course_number, section, *entry in fingerprint_index_rows(term, subjects)
+    }
+
+
+class SyncResult:
+    """Keys of the rows a scrape created, changed, left unchanged or no longer saw."""
+
+    def __init__(self):
+        self.created = []
+        self.changed = []
+        self.unchanged = []
+        self.vanished = []
+        self.events = 0
+
+    @property
+    def has_changes(self):
+        return bool(self.created or self.changed or self.vanished)
+
+    def summary(self):
+        return (
+            f"{len(self.created)} created, {len(self.changed)} changed, "
+            f"{len(self.unchanged)} unchanged, {len(self.vanished)} vanished, {self.events} events"
+        )
+
+
+def sync_classes(term, class_rows, subjects=None, use_copy=None):
+    """
+    Upsert scraped rows for a term, writing only rows whose fingerprint changed.
+    Sections missing from the scrape are marked inactive. Enrollment history,
+    change events for the outbox, the search vectors of written rows,
+    cross-list groups and the aggregates of the departments that changed are
+    updated in the same transaction. Seats opening and filling are events of
+    every section sharing the seat pool that crossed full.
+
+    `class_rows` is an iterable of Class field dicts (see `class_data_from_row`);
+    it is consumed lazily, so rows can come straight from the streaming parser.
+    When the scrape only covered some `subjects`, only their sections can vanish.
+
+    On PostgreSQL the rows are written with a COPY staging-table merge (see
+    `staging_merge`); `use_copy=False` forces the ORM bulk path used elsewhere.
+    """
+    if use_copy is None:
+        use_copy = copy_enabled()
+    index = load_fingerprint_index(term, subjects)
+    result = SyncResult()
+    now = timezone.now()
+
+    classes_to_create = []
+    classes_to_update = []
+    # (section_id, term, class_code, state) history points for changed enrollment
+    history = []
+    # (section_id, key, term, event_type, data) outbox events, in detection order
+    events = []
+    seen = set()
+    # pks of sections to regroup: listed again or with a new Xlist (added and vanished ones join later)
+    regroup = []
+    # pks of sections that count as added, whose stored seat pool is stale or missing
+    added = set()
+
+    for class_data in class_rows:
+        key = class_key(class_data)
+        if key in seen:
+            # the timetable occasionally repeats a row; the first one wins
+            continue
+        seen.add(key)
+
+        fingerprint = class_fingerprint(class_data)
+        existing = index.get(key)
+
+        if existing is None:
+            classes_to_create.append(Class(fingerprint=fingerprint, **class_data))
+            result.created.append(key)
+        elif existing.fingerprint != fingerprint or not existing.is_active:
+            # bulk_update skips auto_now, so stamp last_updated explicitly
+            classes_to_update.append(
+                Class(pk=existing.pk, fingerprint=fingerprint, is_active=True, last_updated=now, **class_data)
+            )
+            result.changed.append(key)
+            if not existing.is_active or (existing.xlist or '') != (class_data['xlist'] or ''):
+                regroup.append(existing.pk)
+            if not existing.is_active:
+                added.add(existing.pk)
+            state = enrollment_state(class_data)
+            # a section listed again after vanishing resumes from its terminal point
+            if not existing.is_active or state != (existing.enrollment, existing.limit, existing.status):
+                history.append((existing.pk, class_data['term'], class_data['class_code'], state))
+            # a section listed again after vanishing counts as added
+            old = existing._asdict() if existing.is_active else None
+            for event_type, data in diff_events(old, class_data):
+                events.append((existing.pk, key, class_data['term'], event_type, data))
+        else:
+            result.unchanged.append(key)
+
+    result.vanished = [key for key, entry in index.items() if entry.is_active and key not in seen]
+    for key in result.vanished:
+        entry = index[key]
+        events.append((entry.pk, key, term, ClassChangeEvent.SECTION_REMOVED, {
+            'enrollment': entry.enrollment, 'limit': entry.limit,
+        }))
+        history.append((entry.pk, term, key[0], VANISHED_STATE))
+
+    # make bulk operations atomic
+    with transaction.atomic():
+        # sections added below have no group yet, so check before writing them
+        grouped = crosslists_resolved(term)
+        if use_copy and (classes_to_create or classes_to_update):
+            pks = merge_classes(classes_to_create + classes_to_update, now)
+            for cls, key in zip(classes_to_create, result.created):
+                cls.pk = pks.get(key)
+        else:
+            if classes_to_create:
+                Class.objects.bulk_create(classes_to_create, batch_size=BATCH_SIZE)
+                if any(cls.pk is None for cls in classes_to_create):
+                    # backends that can't return ids from a bulk insert
+                    pks = {key: entry.pk for key, entry in load_fingerprint_index(term).items()}
+                    for cls in classes_to_create:
+                        cls.pk = pks.get((cls.class_code, cls.course_number, cls.section))
+            if classes_to_update:
+                Class.objects.bulk_update(classes_to_update, UPDATE_FIELDS, batch_size=BATCH_SIZE)
+        for cls, key in zip(classes_to_create, result.created):
+            history.append((cls.pk, cls.term, cls.class_code, (cls.enrollment, cls.limit, cls.status)))
+            for event_type, data in diff_events(None, {'enrollment': cls.enrollment, 'limit': cls.limit}):
+                events.append((cls.pk, key, cls.term, event_type, data))
+        if result.vanished:
+            Class.objects.filter(pk__in=[index[key].pk for key in result.vanished]).update(
+                is_active=False, last_updated=now
+            )
+        if history:
+            record_snapshots(history, now)
+        # bulk writes bypass the search vector, so recompute it for the rows just written
+        refresh_search_vectors([cls.pk for cls in classes_to_create + classes_to_update])
+
+        # only the groups the scrape can have reshaped are resolved again, the rest get new totals
+        added.update(cls.pk for cls in classes_to_create)
+        regroup += [*added, *(index[key].pk for key in result.vanished)]
+        if not grouped:
+            pools = rebuild_crosslists(term)
+        else:
+            pools = regroup_crosslists(term, regroup) if regroup else []
+            regrouped = set(regroup)
+            pools += refresh_crosslist_totals(term, [cls.pk for cls in classes_to_update if cls.pk not in regrouped])
+        pooled = {}
+        if pools:
+            keys = Class.objects.filter(pk__in=[pk for pk, *_ in pools]).values_list(
+                'pk', 'class_code', 'course_number', 'section'
+            )
+            pooled = {pk: tuple(key) for pk, *key in keys}
+        for pk, old, new in pools:
+            # a section that counts as added has no earlier pool to compare with
+            event = None if pk in added or None in old else seat_event(old, new)
+            if event:
+                events.append((pk, pooled[pk], term, *event))
+        if events:
+            result.events = write_events(events, now)
+
+        if not aggregates_exist(term):
+            refresh_aggregates(term, now=now)
+        elif result.has_changes or pools:
+            # a cross-listed section opens or fills with its pool, in whichever department it is
+            departments = {key[0] for key in result.created + result.changed + result.vanished}
+            departments.update(key[0] for key in pooled.values())
+            refresh_aggregates(term, departments, now=now)
+
+    return result
@@ -0,0 +1,153 @@
+import re
+from collections import defaultdict
+from django.db.models import F, Q
+from class_catch_app.models import Class
+
+BATCH_SIZE = 1000
+GROUP_FIELDS = ['xlist_group', 'group_enrollment', 'group_limit']
+RESOLVE_FIELDS = ['pk', 'class_code', 'course_number', 'section', 'xlist', 'enrollment', 'limit']
+
+# what "open" means everywhere: the pool shared by cross-listed sections has room (a limit of 0 is uncapped)
+HAS_ROOM = Q(group_enrollment__lt=F('group_limit')) | Q(group_limit=0)
+
+# 'AAAS 021 01', 'LACS-021-01' or 'WGSS 65'; the section is optional
+XLIST_RE = re.compile(r'\b([A-Z]{2,5})\s*-?\s*(\d{1,3}(?:\.\d{1,2})?)(?:\s*-?\s*(\d{1,2})\b)?')
+
+
+def normalize(number):
+    """'021' and '21' name the same course (and '01' and '1' the same section)."""
+    whole, dot, fraction = (number or '').strip().partition('.')
+    if whole:
+        whole = whole.lstrip('0') or '0'
+    return whole + dot + fraction
+
+
+def crosslist_key(class_code, course_number, section):
+    return ((class_code or '').strip().upper(), normalize(course_number), normalize(section))
+
+
+def parse_xlist(xlist, section):
+    """Keys of the sections an Xlist value names; references without a section mean the same section number."""
+    return [
+        crosslist_key(class_code, course_number, ref_section or section)
+        for class_code, course_number, ref_section in XLIST_RE.findall((xlist or '').upper())
+    ]
+
+
+def group_totals(members):
+    """Shared (enrollment, limit) of a group from its members' (enrollment, limit)."""
+    enrollment = sum(enrollment for enrollment, _ in members)
+    # cross-listed sections each show the pool's limit; any uncapped (0) member uncaps the pool
+    limits = [limit for _, limit in members]
+    return enrollment, 0 if 0 in limits else max(limits)
+
+
+def resolve_groups(rows):
+    """
+    Union-find over the Xlist references of `rows`, given as (pk, class_code,
+    course_number, section, xlist, enrollment, limit). Returns {pk: (group,
+    group_enrollment, group_limit)}, where a group is named by its lowest pk
+    and a section that isn't cross-listed forms a group of one.
+    """
+    rows = list(rows)
+    parent = {row[0]: row[0] for row in rows}
+
+    def find(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    pks = {crosslist_key(class_code, course_number, section): pk for pk, class_code, course_number, section, *_ in rows}
+    for pk, class_code, course_number, section, xlist, *_ in rows:
+        for key in parse_xlist(xlist, section):
+            other = pks.get(key)
+            if other is None:
+                # references to sections the term doesn't list are ignored
+                continue
+            root, other_root = sorted((find(pk), find(other)))
+            parent[other_root] = root
+
+    members = defaultdict(list)
+    for pk, *_, enrollment, limit in rows:
+        members[find(pk)].append((enrollment, limit))
+    totals = {root: group_totals(group) for root, group in members.items()}
+    return {pk: (find(pk), *totals[find(pk)]) for pk in parent}
+
+
+def write_groups(queryset, resolved):
+    """
+    Save the resolved group fields of the rows in `queryset` that differ from
+    them. Returns (pk, old, new) of the rows written, where old and new are
+    the pooled (enrollment, limit); old is (None, None) for a row never grouped.
+    """
+    changed = []
+    for pk, group, enrollment, limit in queryset.values_list('pk', *GROUP_FIELDS):
+        if pk in resolved and (group, enrollment, limit) != resolved[pk]:
+            changed.append((pk, (enrollment, limit), resolved[pk][1:]))
+    Class.objects.bulk_update(
+        [Class(pk=pk, **dict(zip(GROUP_FIELDS, resolved[pk]))) for pk, *_ in changed], GROUP_FIELDS,
+        batch_size=BATCH_SIZE,
+    )
+    return changed
+
+
+def crosslists_resolved(term):
+    return not Class.objects.filter(term=term, is_active=True, xlist_group__isnull=True).exists()
+
+
+def rebuild_crosslists(term):
+    """Regroup every active section of `term`."""
+    classes = Class.objects.filter(term=term, is_active=True)
+    return write_groups(classes, resolve_groups(classes.values_list(*RESOLVE_FIELDS)))
+
+
+def regroup_crosslists(term, pks):
+    """
+    Regroup the sections `pks` (added, listed again, vanished or with a new
+    Xlist) and everything they can be grouped with: their current groups, the
+    sections they reference, the sections referencing them, and the groups of
+    those, until no new section turns up. Other groups are left alone.
+    """
+    classes = Class.objects.filter(term=term, is_active=True)
+    groups = Class.objects.filter(pk__in=pks).exclude(xlist_group=None).values_list('xlist_group', flat=True)
+    lookup = Q(pk__in=pks) | Q(xlist_group__in=set(groups))
+    rows = {}
+    while True:
+        found = [row for row in classes.filter(lookup).values_list(*RESOLVE_FIELDS) if row[0] not in rows]
+        if not found:
+            break
+        rows.update((row[0], row) for row in found)
+        keys = {crosslist_key(class_code, number, section) for _, class_code, number, section, *_ in found}
+        references = {key for _, _, _, section, xlist, *_ in found for key in parse_xlist(xlist, section)} - keys
+        codes = {key[0] for key in keys}
+        # Xlist values spell numbers loosely, so candidates are narrowed by subject and matched here
+        candidates = classes.exclude(pk__in=list(rows)).filter(
+            Q(class_code__in={key[0] for key in references})
+            | Q(*(Q(xlist__icontains=code) for code in codes), _connector=Q.OR)
+        ).values_list('pk', 'class_code', 'course_number', 'section', 'xlist', 'xlist_group')
+        neighbours = [
+            (pk, group) for pk, class_code, number, section, xlist, group in candidates
+            if crosslist_key(class_code, number, section) in references
+            or not keys.isdisjoint(parse_xlist(xlist, section))
+        ]
+        if not neighbours:
+            break
+        lookup = Q(pk__in=[pk for pk, _ in neighbours]) | Q(
+            xlist_group__in={group for _, group in neighbours if group is not None}
+        )
+    return write_groups(classes.filter(pk__in=list(rows)), resolve_groups(rows.values()))
+
+
+def refresh_crosslist_totals(term, pks):
+    """Recompute the shared enrollment and limit of the groups of the sections `pks`, keeping the groups."""
+    groups = set(Class.objects.filter(pk__in=pks).exclude(xlist_group=None).values_list('xlist_group', flat=True))
+    if not groups:
+        return []
+    members = Class.objects.filter(term=term, is_active=True, xlist_group__in=groups)
+    by_group = defaultdict(list)
+    for group, enrollment, limit in members.values_list('xlist_group', 'enrollment', 'limit'):
+        by_group[group].append((enrollment, limit))
+    totals = {group: group_totals(group_members) for group, group_members in by_group.items()}
+    resolved = {pk: (group, *totals[group]) for pk, group in members.values_list('pk', 'xlist_group')}
+    return write_groups(members, resolved)
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from class_catch_app.models import Class, ScrapeState
+
+CACHE_KEY = 'class_catch:data_version'
+# bounds how long a write that didn't bump the version can go unseen
+CACHE_TIMEOUT = getattr(settings, 'DATA_VERSION_CACHE_TIMEOUT', 60)
+
+
+def cache_key(term=None):
+    return f'{CACHE_KEY}:{term}' if term else CACHE_KEY
+
+
+def load_data_version(term=None):
+    """Version of the class data of `term`, or of all terms (the sum of the per-term versions)."""
+    states = ScrapeState.objects.all()
+    if term:
+        states = states.filter(term=term)
+    return states.aggregate(version=Sum('version'))['version'] or 0
+
+
+def get_data_version(term=None):
+    """Current class data version, read from the shared cache when possible."""
+    key = cache_key(term)
+    version = cache.get(key)
+    if version is None:
+        version = load_data_version(term)
+        cache.set(key, version, timeout=CACHE_TIMEOUT)
+    return version
+
+
+def bump_data_version(term):
+    """
+    Mark the classes of `term` as changed. Call inside the transaction that
+    wrote them; the cached versions are refreshed once it commits.
+    """
+    # terms written outside a scrape (admin, backfills) may not have a state row yet
+    ScrapeState.objects.get_or_create(term=term)
+    ScrapeState.objects.filter(term=term).update(version=F('version') + 1)
+
+    def refresh():
+        cache.set_many({
+            cache_key(term): load_data_version(term),
+            cache_key(): load_data_version(),
+        }, timeout=CACHE_TIMEOUT)
+
+    transaction.on_commit(refresh)
+
+
+def bump_all_data_versions():
+    """Mark every term with classes as changed, e.g. after a migration rewrote class data."""
+    with transaction.atomic():
+        for term in Class.objects.order_by('term').values_list('term', flat=True).distinct():
+            bump_data_version(term)
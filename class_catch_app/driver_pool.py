@@ -0,0 +1,367 @@
+import atexit
+import functools
+import logging
+import queue
+import re
+import select
+import socket
+import socketserver
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from urllib3.exceptions import HTTPError
+from django.conf import settings
+from selenium import webdriver
+from selenium.common.exceptions import (
+    InvalidSessionIdException, NoSuchWindowException, SessionNotCreatedException, WebDriverException,
+)
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+# logging
+logger = logging.getLogger(__name__)
+
+# only the DOM is needed, so skip stylesheets, images and fonts
+BLOCKED_EXTENSIONS = [
+    'css', 'png', 'jpg', 'jpeg', 'gif', 'svg', 'ico', 'webp',
+    'woff', 'woff2', 'ttf', 'otf',
+]
+# Network.setBlockedURLs wildcards match the whole URL, so cover query strings and fragments too
+BLOCKED_URL_PATTERNS = [
+    pattern
+    for extension in BLOCKED_EXTENSIONS
+    for pattern in (f'*.{extension}', f'*.{extension}?*', f'*.{extension}#*')
+]
+BLOCKED_URL_RE = re.compile('|'.join(
+    '(?:' + '.*'.join(re.escape(part) for part in pattern.split('*')) + ')'
+    for pattern in BLOCKED_URL_PATTERNS
+), re.IGNORECASE)
+
+
+def is_blocked(url):
+    """Whether Chrome drops `url` under BLOCKED_URL_PATTERNS (whole-URL `*` wildcard match)."""
+    return BLOCKED_URL_RE.fullmatch(url) is not None
+
+# origins whose storage is wiped between sessions
+RESET_ORIGINS = ['https://oracle-www.dartmouth.edu']
+
+# the browser or the connection to chromedriver is gone; errors about the page
+# (timeouts, missing elements, script errors) leave the browser reusable
+DRIVER_FAILURES = (
+    InvalidSessionIdException, NoSuchWindowException, SessionNotCreatedException, HTTPError, ConnectionError,
+)
+
+
+def is_driver_failure(error):
+    """Whether `error`, raised while a pooled browser was in use, means the browser can't be reused."""
+    # chromedriver reports crashed or unreachable browsers as plain WebDriverExceptions
+    return isinstance(error, DRIVER_FAILURES) or type(error) is WebDriverException
+
+
+@functools.lru_cache(maxsize=None)
+def chromedriver_path():
+    """Resolve (downloading if needed) the chromedriver binary once per process."""
+    return ChromeDriverManager().install()
+
+
+def chrome_driver(proxy_server):
+    """Headless Chrome sending its traffic through `proxy_server` ('host:port'), with static resources blocked."""
+    chrome_options = Options()
+    chrome_options.add_argument('--headless=new')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+    chrome_options.add_argument(f'--proxy-server=http://{proxy_server}')
+    chrome_options.add_experimental_option('prefs', {
+        'profile.managed_default_content_settings.images': 2,
+    })
+    driver = webdriver.Chrome(service=Service(chromedriver_path()), options=chrome_options)
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+    except Exception:
+        driver.quit()
+        raise
+    return driver
+
+
+class _ForwardingHandler(socketserver.BaseRequestHandler):
+    """Relays one browser connection, through the server's current upstream proxy if set."""
+
+    def handle(self):
+        client = self.request
+        client.settimeout(self.server.io_timeout)
+        try:
+            head, extra = self.read_head(client)
+        except OSError:
+            return
+        if not head:
+            return
+
+        request_line, _, header_block = head.partition(b'\r\n')
+        try:
+            method, target, version = request_line.split(b' ', 2)
+        except ValueError:
+            return
+
+        upstream = self.server.upstream
+        try:
+            if upstream:
+                # the upstream proxy speaks the same protocol, pass the request through as-is
+                host, port = upstream.rsplit(':', 1)
+                remote = socket.create_connection((host, int(port)), timeout=self.server.io_timeout)
+                remote.sendall(head + b'\r\n\r\n' + extra)
+            elif method == b'CONNECT':
+                host, port = target.decode().rsplit(':', 1)
+                remote = socket.create_connection((host, int(port)), timeout=self.server.io_timeout)
+                client.sendall(b'HTTP/1.1 200 Connection established\r\n\r\n')
+                if extra:
+                    remote.sendall(extra)
+            else:
+                url = urlsplit(target.decode())
+                remote = socket.create_connection((url.hostname, url.port or 80), timeout=self.server.io_timeout)
+                path = (url.path or '/') + (f'?{url.query}' if url.query else '')
+                headers = [
+                    line for line in header_block.split(b'\r\n')
+                    if line and not line.lower().startswith((b'connection:', b'proxy-connection:'))
+                ]
+                headers.append(b'Connection: close')
+                remote.sendall(
+                    b' '.join([method, path.encode(), version]) + b'\r\n'
+                    + b'\r\n'.join(headers) + b'\r\n\r\n' + extra
+                )
+        except (OSError, ValueError):
+            try:
+                client.sendall(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n')
+            except OSError:
+                pass
+            return
+
+        self.server.track(remote)
+        try:
+            self.pipe(client, remote)
+        finally:
+            self.server.untrack(remote)
+            remote.close()
+
+    def read_head(self, sock):
+        buf = b''
+        while b'\r\n\r\n' not in buf:
+            data = sock.recv(65536)
+            if not data:
+                return None, b''
+            buf += data
+            if len(buf) > 65536:
+                return None, b''
+        head, _, extra = buf.partition(b'\r\n\r\n')
+        return head, extra
+
+    def pipe(self, client, remote):
+        sockets = [client, remote]
+        while True:
+            readable, _, errored = select.select(sockets, [], sockets, self.server.io_timeout)
+            if errored or not readable:
+                return
+            for sock in readable:
+                try:
+                    data = sock.recv(65536)
+                except OSError:
+                    return
+                if not data:
+                    return
+                (remote if sock is client else client).sendall(data)
+
+
+class LocalForwardingProxy(socketserver.ThreadingTCPServer):
+    """
+    Local HTTP proxy the pooled browsers point at, so the real upstream proxy
+    can be switched per session without relaunching Chrome.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, io_timeout=30):
+        super().__init__(('127.0.0.1', 0), _ForwardingHandler)
+        self.io_timeout = io_timeout
+        self.upstream = None
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def address(self):
+        host, port = self.server_address
+        return f"{host}:{port}"
+
+    def set_upstream(self, proxy):
+        """Route new connections through `proxy` ('ip:port', or None for direct)."""
+        if proxy == self.upstream:
+            return
+        self.upstream = proxy
+        # drop tunnels opened through the previous upstream so Chrome can't reuse them
+        with self.lock:
+            connections, self.connections = self.connections, set()
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def track(self, sock):
+        with self.lock:
+            self.connections.add(sock)
+
+    def untrack(self, sock):
+        with self.lock:
+            self.connections.discard(sock)
+
+    def close(self):
+        self.set_upstream(None)
+        self.shutdown()
+        self.server_close()
+
+
+class PooledDriver:
+    def __init__(self, driver, forwarder):
+        self.driver = driver
+        self.forwarder = forwarder
+        self.uses = 0
+
+
+class DriverPool:
+    """
+    Bounded pool of warm headless Chrome instances.
+
+    Each browser talks to its own LocalForwardingProxy, so `session(proxy)`
+    switches the upstream proxy instead of relaunching Chrome. Cookies, cache
+    and storage are cleared between sessions, and browsers are recycled after
+    `max_uses` sessions, when the browser itself fails, or when the reset
+    fails. `driver_factory` starts a browser for a local proxy address.
+    """
+
+    def __init__(self, size=2, max_uses=25, page_load_timeout=30, driver_factory=None):
+        self.size = size
+        self.max_uses = max_uses
+        self.page_load_timeout = page_load_timeout
+        self.driver_factory = driver_factory or chrome_driver
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'launches': 0, 'recycles': 0, 'resets': 0}
+
+    def launch(self):
+        forwarder = LocalForwardingProxy(io_timeout=self.page_load_timeout)
+        try:
+            driver = self.driver_factory(forwarder.address)
+        except Exception:
+            forwarder.close()
+            raise
+        with self.lock:
+            self.stats['launches'] += 1
+        return PooledDriver(driver, forwarder)
+
+    def warm(self):
+        """Launch browsers up front so the first sessions skip the cold start."""
+        for _ in range(self.size - self.idle.qsize()):
+            self.idle.put(self.launch())
+
+    def acquire(self):
+        self.slots.acquire()
+        try:
+            pooled = self.idle.get_nowait()
+            with self.lock:
+                self.stats['hits'] += 1
+            return pooled
+        except queue.Empty:
+            pass
+        try:
+            return self.launch()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, pooled, broken=False):
+        try:
+            pooled.uses += 1
+            if not broken and pooled.uses < self.max_uses:
+                try:
+                    self.reset(pooled.driver)
+                    self.idle.put(pooled)
+                    return
+                except Exception as e:
+                    logger.warning("Resetting pooled browser failed, recycling it: %s", e)
+            self.discard(pooled)
+            with self.lock:
+                self.stats['recycles'] += 1
+        finally:
+            self.slots.release()
+
+    def reset(self, driver):
+        """Clear cookies, cache and site storage so the next session starts clean."""
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+        for origin in RESET_ORIGINS:
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+        driver.get('about:blank')
+        with self.lock:
+            self.stats['resets'] += 1
+
+    def discard(self, pooled):
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+        pooled.forwarder.close()
+
+    @contextmanager
+    def session(self, proxy=None, page_load_timeout=None):
+        """Borrow a clean browser routed through `proxy` ('ip:port' or None for direct)."""
+        pooled = self.acquire()
+        broken = False
+        try:
+            pooled.forwarder.set_upstream(proxy)
+            pooled.driver.set_page_load_timeout(page_load_timeout or self.page_load_timeout)
+            yield pooled.driver
+        except Exception as e:
+            # other errors are the caller's; the reset on release tells whether the browser survived them
+            broken = is_driver_failure(e)
+            raise
+        finally:
+            self.release(pooled, broken=broken)
+
+    def close(self):
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def metrics(self):
+        with self.lock:
+            return dict(self.stats, idle=self.idle.qsize())
+
+    def summary(self):
+        metrics = self.metrics()
+        return (
+            f"{metrics['hits']} pool hits, {metrics['launches']} launches, "
+            f"{metrics['recycles']} recycles, {metrics['idle']} idle"
+        )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """Process-wide driver pool, sized by settings.SELENIUM_POOL_SIZE."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool(
+                size=getattr(settings, 'SELENIUM_POOL_SIZE', 2),
+                max_uses=getattr(settings, 'SELENIUM_POOL_MAX_USES', 25),
+            )
+            atexit.register(_pool.close)
+        return _pool
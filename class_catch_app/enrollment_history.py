@@ -0,0 +1,175 @@
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import TruncDay, TruncHour
+from class_catch_app.models import Class, EnrollmentSnapshot
+
+BATCH_SIZE = 1000
+
+# resolution a snapshot is compacted into, and how its bucket is truncated
+DOWNSAMPLE_STEPS = {
+    EnrollmentSnapshot.RAW: (EnrollmentSnapshot.HOURLY, TruncHour),
+    EnrollmentSnapshot.HOURLY: (EnrollmentSnapshot.DAILY, TruncDay),
+}
+
+
+def enrollment_state(class_data):
+    """The part of a row the history tracks."""
+    return (class_data['enrollment'], class_data['limit'], class_data['status'])
+
+
+# terminal point of a section the timetable stopped listing: it no longer counts toward totals
+VANISHED_STATE = (0, 0, EnrollmentSnapshot.VANISHED)
+
+
+def record_snapshots(points, recorded_at):
+    """
+    Append history points, given as (section_id, term, class_code, state)
+    tuples with `state` from `enrollment_state`. Callers only pass sections
+    whose state changed.
+    """
+    snapshots = [
+        EnrollmentSnapshot(
+            section_id=section_id, term=term, class_code=class_code, recorded_at=recorded_at,
+            enrollment=enrollment, limit=limit, status=status,
+        )
+        for section_id, term, class_code, (enrollment, limit, status) in points
+    ]
+    EnrollmentSnapshot.objects.bulk_create(snapshots, batch_size=BATCH_SIZE)
+    return len(snapshots)
+
+
+def section_series(section_id, since=None, until=None):
+    """
+    (recorded_at, enrollment, limit, status) points of one section, oldest
+    first. Each value holds until the next point; the point in effect at
+    `since` is included so the series starts with a known state.
+    """
+    snapshots = EnrollmentSnapshot.objects.filter(section_id=section_id)
+    fields = ('recorded_at', 'enrollment', 'limit', 'status')
+    series = []
+    if since is not None:
+        previous = snapshots.filter(recorded_at__lt=since).order_by('-recorded_at').values_list(*fields).first()
+        if previous:
+            series.append(previous)
+        snapshots = snapshots.filter(recorded_at__gte=since)
+    if until is not None:
+        snapshots = snapshots.filter(recorded_at__lte=until)
+    series.extend(snapshots.order_by('recorded_at').values_list(*fields))
+    return series
+
+
+def department_fill_curve(term, class_code, since=None, until=None):
+    """
+    (recorded_at, total enrollment, total limit) for a department, one point
+    per moment any of its sections changed. Only the department's snapshots
+    from `since` on are read, through the (term, class_code, recorded_at)
+    index; the state each section was in at `since` seeds the totals and
+    makes up the first point.
+    """
+    snapshots = EnrollmentSnapshot.objects.filter(term=term, class_code=class_code)
+    if until is not None:
+        snapshots = snapshots.filter(recorded_at__lte=until)
+
+    current = {}
+    curve = []
+    total_enrollment = total_limit = 0
+    if since is not None:
+        seeds = section_states_at(term, class_code, since)
+        for section_id, recorded_at, enrollment, limit in seeds:
+            current[section_id] = (enrollment, limit)
+            total_enrollment += enrollment
+            total_limit += limit
+        if seeds:
+            curve.append((max(seed[1] for seed in seeds), total_enrollment, total_limit))
+        snapshots = snapshots.filter(recorded_at__gte=since)
+
+    for section_id, recorded_at, enrollment, limit in snapshots.order_by('recorded_at').values_list(
+        'section_id', 'recorded_at', 'enrollment', 'limit'
+    ).iterator():
+        old_enrollment, old_limit = current.get(section_id, (0, 0))
+        current[section_id] = (enrollment, limit)
+        total_enrollment += enrollment - old_enrollment
+        total_limit += limit - old_limit
+        point = (recorded_at, total_enrollment, total_limit)
+        if curve and curve[-1][0] == recorded_at:
+            # sections changed in the same scrape share one point
+            curve[-1] = point
+        else:
+            curve.append(point)
+    return curve
+
+
+def section_states_at(term, class_code, moment):
+    """
+    (section_id, recorded_at, enrollment, limit) of the last point before
+    `moment` of each section of a department, one (section, recorded_at)
+    index lookup per section.
+    """
+    latest = EnrollmentSnapshot.objects.filter(
+        section_id=OuterRef('pk'), recorded_at__lt=moment
+    ).order_by('-recorded_at')
+    sections = Class.objects.filter(term=term, class_code=class_code).annotate(
+        seed_recorded_at=Subquery(latest.values('recorded_at')[:1]),
+        seed_enrollment=Subquery(latest.values('enrollment')[:1]),
+        seed_limit=Subquery(latest.values('limit')[:1]),
+    )
+    return [
+        seed for seed in sections.values_list('pk', 'seed_recorded_at', 'seed_enrollment', 'seed_limit')
+        if seed[1] is not None
+    ]
+
+
+def compact_history(resolution, older_than):
+    """
+    Downsample `resolution` snapshots recorded before `older_than` into the
+    next coarser resolution: the last point of each bucket is kept (it is the
+    state the bucket ended in) and points that repeat the previous state are
+    dropped. Returns (kept, deleted).
+    """
+    target, trunc = DOWNSAMPLE_STEPS[resolution]
+    rows = (
+        EnrollmentSnapshot.objects
+        .filter(resolution=resolution, recorded_at__lt=older_than)
+        .annotate(bucket=trunc('recorded_at'))
+        .order_by('section_id', 'recorded_at')
+        .values_list('pk', 'section_id', 'bucket', 'enrollment', 'limit', 'status')
+    )
+
+    keep = []
+    delete = []
+    last_state = {}
+
+    def close_bucket(pending):
+        pk, section_id, state = pending
+        if last_state.get(section_id) == state:
+            delete.append(pk)
+        else:
+            keep.append(pk)
+            last_state[section_id] = state
+
+    pending = None
+    pending_bucket = None
+    for pk, section_id, bucket, enrollment, limit, status in rows.iterator():
+        if pending is not None and (pending[1], pending_bucket) == (section_id, bucket):
+            # a later point in the same bucket supersedes the pending one
+            delete.append(pending[0])
+        elif pending is not None:
+            close_bucket(pending)
+        pending = (pk, section_id, (enrollment, limit, status))
+        pending_bucket = bucket
+    if pending is not None:
+        close_bucket(pending)
+
+    with transaction.atomic():
+        for start in range(0, len(delete), BATCH_SIZE):
+            EnrollmentSnapshot.objects.filter(pk__in=delete[start:start + BATCH_SIZE]).delete()
+        for start in range(0, len(keep), BATCH_SIZE):
+            EnrollmentSnapshot.objects.filter(pk__in=keep[start:start + BATCH_SIZE]).update(resolution=target)
+    return len(keep), len(delete)
+
+
+def history_counts():
+    """Snapshot count per resolution."""
+    return dict(
+        EnrollmentSnapshot.objects.order_by().values_list('resolution').annotate(count=Count('pk'))
+    )
@@ -0,0 +1,30 @@
+import django_filters
+from .crosslists import HAS_ROOM
+from .models import Class
+from .search import filter_search
+
+
+class ClassFilter(django_filters.FilterSet):
+    term = django_filters.CharFilter(field_name='term')
+    subject = django_filters.CharFilter(field_name='class_code', lookup_expr='iexact')
+    course_number = django_filters.CharFilter(field_name='course_number')
+    section = django_filters.CharFilter(field_name='section')
+    distrib = django_filters.CharFilter(field_name='distrib', lookup_expr='icontains')
+    world_culture = django_filters.CharFilter(field_name='world_culture', lookup_expr='iexact')
+    period = django_filters.CharFilter(field_name='period_code', lookup_expr='iexact')
+    open_seats = django_filters.BooleanFilter(method='filter_open_seats')
+    is_active = django_filters.BooleanFilter(field_name='is_active')
+    q = django_filters.CharFilter(method='filter_q')
+    # DRF's SearchFilter parameter, kept for existing clients
+    search = django_filters.CharFilter(method='filter_q')
+
+    class Meta:
+        model = Class
+        fields = []
+
+    def filter_open_seats(self, queryset, name, value):
+        return queryset.filter(HAS_ROOM) if value else queryset.exclude(HAS_ROOM)
+
+    def filter_q(self, queryset, name, value):
+        # indexed full-text and trigram search, typo tolerant
+        return filter_search(queryset, value)
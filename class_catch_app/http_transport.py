@@ -0,0 +1,154 @@
+import itertools
+import threading
+from collections import Counter, OrderedDict
+from http import cookiejar
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from fake_useragent import UserAgent
+
+
+class _BlockAllCookies(cookiejar.DefaultCookiePolicy):
+    """Keep pooled sessions stateless; cookies are only sent when passed per request."""
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+class UserAgentPool:
+    """User agents sampled once per process and handed out round-robin."""
+
+    def __init__(self, size=50):
+        self.size = size
+        self.lock = threading.Lock()
+        self.cycle = None
+
+    def next(self):
+        with self.lock:
+            if self.cycle is None:
+                # loading the fake_useragent dataset is the expensive part, do it once
+                ua = UserAgent()
+                self.cycle = itertools.cycle([ua.random for _ in range(self.size)])
+            return next(self.cycle)
+
+
+class SessionPool:
+    """
+    Keep-alive `requests` sessions, one per proxy (None for direct), so TLS
+    sessions and connections are reused across requests through the same
+    proxy. The least recently used sessions are evicted beyond `max_sessions`;
+    an evicted session still checked out is only closed once it is released.
+    """
+
+    def __init__(self, max_sessions=256, pool_maxsize=16):
+        self.max_sessions = max_sessions
+        self.pool_maxsize = pool_maxsize
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+        self.checkouts = Counter()  # session -> requests in flight
+        self.retired = set()        # evicted while checked out, closed on release
+
+    def acquire(self, proxy=None):
+        """Check out the session for `proxy`; pair with `release()`."""
+        evicted = []
+        with self.lock:
+            session = self.sessions.get(proxy)
+            if session is not None:
+                self.sessions.move_to_end(proxy)
+            else:
+                session = requests.Session()
+                session.cookies.set_policy(_BlockAllCookies())
+                session.verify = False
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[proxy] = session
+            self.checkouts[session] += 1
+
+            while len(self.sessions) > self.max_sessions:
+                _, old = self.sessions.popitem(last=False)
+                if self.checkouts[old]:
+                    self.retired.add(old)
+                else:
+                    evicted.append(old)
+        for old in evicted:
+            old.close()
+        return session
+
+    def release(self, session):
+        with self.lock:
+            self.checkouts[session] -= 1
+            if self.checkouts[session] > 0:
+                return
+            del self.checkouts[session]
+            if session not in self.retired:
+                return
+            self.retired.discard(session)
+        session.close()
+
+    def request(self, method, url, proxy=None, **kwargs):
+        """
+        Send a request through the session for `proxy`. A streamed response
+        keeps the session checked out until the response is closed.
+        """
+        session = self.acquire(proxy)
+        try:
+            response = session.request(method, url, proxies=proxies_for(proxy), **kwargs)
+        except BaseException:
+            self.release(session)
+            raise
+        if not kwargs.get('stream'):
+            self.release(session)
+            return response
+
+        close = response.close
+        released = False
+
+        def close_and_release():
+            nonlocal released
+            try:
+                close()
+            finally:
+                if not released:
+                    released = True
+                    self.release(session)
+
+        response.close = close_and_release
+        return response
+
+    def close(self):
+        with self.lock:
+            sessions = [*self.sessions.values(), *self.retired]
+            self.sessions.clear()
+            self.retired.clear()
+        for session in sessions:
+            session.close()
+
+
+user_agents = UserAgentPool(size=getattr(settings, 'USER_AGENT_POOL_SIZE', 50))
+sessions = SessionPool(
+    max_sessions=getattr(settings, 'HTTP_MAX_SESSIONS', 256),
+    pool_maxsize=getattr(settings, 'HTTP_POOL_MAXSIZE', 16),
+)
+
+
+def proxies_for(proxy):
+    if not proxy:
+        return None
+    return {
+        'http': f'http://{proxy}',
+        'https': f'http://{proxy}',
+    }
+
+
+def get(url, proxy=None, **kwargs):
+    """GET through the pooled session for `proxy` ('ip:port' or None for direct)."""
+    return sessions.request('GET', url, proxy=proxy, **kwargs)
+
+
+def post(url, proxy=None, **kwargs):
+    """POST through the pooled session for `proxy` ('ip:port' or None for direct)."""
+    return sessions.request('POST', url, proxy=proxy, **kwargs)
@@ -0,0 +1,97 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from class_catch_app.class_sync import BATCH_SIZE, UPDATE_FIELDS, class_fingerprint
+from class_catch_app.models import Class
+from class_catch_app.schedule import encode_mask, period_masks
+from class_catch_app.staging_merge import copy_enabled, merge_classes
+
+BENCHMARK_TERM = 'BENCH'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the write step of a sync: the COPY staging-table merge against '
+            'bulk_create/bulk_update on the same rows')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[5000, 50000, 500000],
+                            help='Synthetic section counts to write')
+        parser.add_argument('--orm-max-rows', type=int, default=50000,
+                            help='Skip the ORM path above this many rows (bulk_update gets very slow)')
+
+    def handle(self, *args, **options):
+        if not copy_enabled():
+            raise CommandError('The COPY path needs PostgreSQL')
+
+        for n_rows in options['rows']:
+            # built once, so both paths write exactly the same values
+            inserted = self.synthetic_rows(n_rows, enrollment_offset=0)
+            updated = self.synthetic_rows(n_rows, enrollment_offset=1)
+            paths = [('copy', self.write_copy)]
+            if n_rows <= options['orm_max_rows']:
+                paths.append(('orm', self.write_orm))
+
+            results = {}
+            for name, write in paths:
+                insert, update = self.run(write, inserted, updated)
+                results[name] = insert + update
+                self.stdout.write(
+                    f"{n_rows:>7} rows {name:>4}: insert {insert:.2f}s ({n_rows / insert:,.0f} rows/sec), "
+                    f"update {update:.2f}s ({n_rows / update:,.0f} rows/sec)"
+                )
+            if 'orm' in results:
+                self.stdout.write(self.style.SUCCESS(f"Speedup: {results['orm'] / results['copy']:.1f}x"))
+
+    def run(self, write, inserted, updated):
+        """Time a cold insert and a full update with `write`, then roll both back."""
+        timings = []
+        try:
+            with transaction.atomic():
+                pks = None
+                for rows in (inserted, updated):
+                    classes = [Class(pk=pks.get(key) if pks else None, **data) for key, data in rows]
+                    now = timezone.now()
+                    start_time = time.perf_counter()
+                    pks = write(classes, now)
+                    timings.append(time.perf_counter() - start_time)
+                raise Rollback
+        except Rollback:
+            pass
+        return timings
+
+    def write_copy(self, classes, now):
+        return merge_classes(classes, now)
+
+    def write_orm(self, classes, now):
+        """What sync_classes does without COPY: bulk_create new rows, bulk_update known ones."""
+        for cls in classes:
+            cls.last_updated = now
+        if classes[0].pk is None:
+            Class.objects.bulk_create(classes, batch_size=BATCH_SIZE)
+        else:
+            Class.objects.bulk_update(classes, UPDATE_FIELDS, batch_size=BATCH_SIZE)
+        return {(cls.class_code, cls.course_number, cls.section): cls.pk for cls in classes}
+
+    def synthetic_rows(self, n_rows, enrollment_offset):
+        """(key, Class fields) pairs shaped like sync_classes' input, fingerprints included."""
+        schedule_mask, xhour_mask = (encode_mask(mask) for mask in period_masks('10'))
+        rows = []
+        for i in range(n_rows):
+            data = {
+                'class_code': f'S{i // 3000:03d}', 'course_number': f'{i // 3 % 1000:03d}',
+                'section': f'{i % 3 + 1:02d}', 'title': f'Course Title {i} & Topics',
+                'instructor': 'Instructor Name', 'term': BENCHMARK_TERM, 'limit': 40,
+                'enrollment': (i + enrollment_offset) % 41, 'distrib': 'SCI', 'world_culture': '',
+                'period': 'MWF 10:10-11:15', 'period_code': '10', 'status': '', 'text': 'Text',
+                'xlist': '', 'crn': str(10000 + i),
+            }
+            data.update(
+                fingerprint=class_fingerprint(data), schedule_mask=schedule_mask, xhour_mask=xhour_mask, is_active=True,
+            )
+            rows.append(((data['class_code'], data['course_number'], data['section']), data))
+        return rows
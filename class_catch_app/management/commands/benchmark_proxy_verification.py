@@ -0,0 +1,97 @@
+import concurrent.futures
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from django.core.management.base import BaseCommand
+from fake_useragent import UserAgent
+from class_catch_app import http_transport
+from class_catch_app.proxy_manager import ProxyManager
+
+
+class StubProxyHandler(BaseHTTPRequestHandler):
+    """Plain HTTP forward proxy stand-in: answers every request itself, with keep-alive."""
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out as separate writes; don't let Nagle stall reused connections
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"origin": "127.0.0.1"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnpooledUserAgents:
+    """The old behaviour: a fresh UserAgent (and its dataset load) per request."""
+
+    def next(self):
+        return UserAgent().random
+
+
+def unpooled_get(url, proxy=None, **kwargs):
+    """The old behaviour: module-level requests.get, a new connection per request."""
+    return requests.get(url, proxies=http_transport.proxies_for(proxy), **kwargs)
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks test URL verification throughput through the pooled transport against '
+            'per-request connections and user agents, using local stub proxies')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--proxies', type=int, default=20, help='Stub proxies to verify')
+        parser.add_argument('--rounds', type=int, default=5, help='Checks per proxy')
+        parser.add_argument('--workers', type=int, default=ProxyManager.STAGE_WORKERS['test_url'],
+                            help='Concurrent checks')
+
+    def handle(self, *args, **options):
+        servers = []
+        for _ in range(options['proxies']):
+            server = ThreadingHTTPServer(('127.0.0.1', 0), StubProxyHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            servers.append(server)
+
+        manager = ProxyManager()
+        # plain http, so requests send it to the stub proxy instead of opening a CONNECT tunnel
+        manager.TEST_URL = 'http://verification.invalid/ip'
+        candidates = [{'ip': '127.0.0.1', 'port': server.server_address[1]} for server in servers]
+        checks = candidates * options['rounds']
+
+        try:
+            results = {}
+            for name in ('unpooled', 'pooled'):
+                results[name] = self.run(name, manager, checks, options['workers'])
+        finally:
+            for server in servers:
+                server.shutdown()
+                server.server_close()
+            http_transport.sessions.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {results['unpooled'] / results['pooled']:.1f}x"))
+
+    def run(self, name, manager, checks, workers):
+        saved = http_transport.get, http_transport.user_agents
+        if name == 'unpooled':
+            http_transport.get, http_transport.user_agents = unpooled_get, UnpooledUserAgents()
+        else:
+            # warm the user agent pool, which happens once per process
+            http_transport.user_agents.next()
+        try:
+            start_time = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                passed = sum(executor.map(manager.verify_proxy_on_test_url, checks))
+            elapsed = time.perf_counter() - start_time
+        finally:
+            http_transport.get, http_transport.user_agents = saved
+
+        self.stdout.write(
+            f"{name:>8}: {passed}/{len(checks)} checks passed in {elapsed:.3f}s "
+            f"({len(checks) / elapsed:,.1f} checks/sec)"
+        )
+        return elapsed
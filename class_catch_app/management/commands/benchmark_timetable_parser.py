@@ -0,0 +1,71 @@
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from class_catch_app.timetable_parser import iter_timetable_rows, iter_timetable_rows_bs4
+
+HEADERS = [
+    'Term', 'CRN', 'Subj', 'Num', 'Sec', 'Title', 'Text', 'Xlist', 'Period Code', 'Period',
+    'Room', 'Building', 'Instructor', 'WC', 'Dist', 'Lang Req', 'Lim', 'Enrl', 'Status',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the streaming timetable row parser against the BeautifulSoup fallback'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Saved timetable.display_courses HTML page to parse')
+        parser.add_argument('--rows', type=int, default=5000, help='Rows in the synthetic page when no --file is given')
+        parser.add_argument('--chunk-size', type=int, default=64 * 1024, help='Chunk size fed to the streaming parser')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            with open(options['file'], encoding='utf-8', errors='replace') as f:
+                html_content = f.read()
+        else:
+            html_content = self.synthetic_page(options['rows'])
+
+        chunk_size = options['chunk_size']
+        chunks = [html_content[i:i + chunk_size] for i in range(0, len(html_content), chunk_size)]
+        self.stdout.write(f"Page size: {len(html_content) / 1024:.0f} KiB")
+
+        results = {}
+        for name, parse in (
+            ('stream', lambda: iter_timetable_rows(iter(chunks))),
+            ('bs4', lambda: iter_timetable_rows_bs4(html_content)),
+        ):
+            start_time = time.perf_counter()
+            rows = sum(1 for _ in parse())
+            elapsed = time.perf_counter() - start_time
+
+            # measured in a separate pass since tracing skews the timings
+            tracemalloc.start()
+            sum(1 for _ in parse())
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[name] = elapsed
+            self.stdout.write(
+                f"{name:>6}: {rows} rows in {elapsed:.3f}s "
+                f"({rows / elapsed:,.0f} rows/sec), peak memory {peak / 1024 / 1024:.1f} MiB"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {results['bs4'] / results['stream']:.1f}x"))
+
+    def synthetic_page(self, n_rows):
+        """Build a page shaped like timetable.display_courses with `n_rows` sections."""
+        parts = [
+            '<html><body><div class="data-table"><table>',
+            '<tr>' + ''.join(f'<th>{header}</th>' for header in HEADERS) + '</tr>',
+        ]
+        for i in range(n_rows):
+            if i % 25 == 0:
+                parts.append('<tr><td colspan="19"><hr></td></tr>')
+            cells = [
+                '202501', str(10000 + i), 'SUBJ', f'{i // 3:03d}', f'{i % 3 + 1:02d}',
+                f'<a href="#">Course Title {i} &amp; Topics</a>', '<a href="#">Text</a>', '',
+                '10', 'MWF 10:10-11:15', 'ROOM 101', 'Building', 'Instructor Name', '', 'SCI', '',
+                '40', str(i % 41), '',
+            ]
+            parts.append('<tr>' + ''.join(f'<td>\n  {cell}\n</td>' for cell in cells) + '</tr>')
+        parts.append('</table></div></body></html>')
+        return ''.join(parts)
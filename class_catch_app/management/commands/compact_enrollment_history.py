@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from class_catch_app.enrollment_history import compact_history, history_counts
+from class_catch_app.models import EnrollmentSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Downsamples old enrollment history into hourly and then daily points'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raw-days', type=int, default=7, help='Keep raw points for this many days')
+        parser.add_argument('--hourly-days', type=int, default=90, help='Keep hourly points for this many days')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        self.stdout.write(f"Enrollment history before: {history_counts()}")
+
+        steps = [
+            (EnrollmentSnapshot.RAW, now - timezone.timedelta(days=options['raw_days'])),
+            (EnrollmentSnapshot.HOURLY, now - timezone.timedelta(days=options['hourly_days'])),
+        ]
+        for resolution, older_than in steps:
+            kept, deleted = compact_history(resolution, older_than)
+            self.stdout.write(f"{resolution} points before {older_than:%Y-%m-%d %H:%M}: {kept} kept, {deleted} deleted")
+
+        self.stdout.write(self.style.SUCCESS(f"Enrollment history after: {history_counts()}"))
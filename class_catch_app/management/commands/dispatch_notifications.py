@@ -0,0 +1,40 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from class_catch_app.notifications import NotificationDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Emails watchers about class change events from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the pending events and exit')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when no events are pending')
+        parser.add_argument('--limit', type=int, default=500, help='Events read per pass')
+
+    def handle(self, *args, **options):
+        if not settings.SENDGRID_API_KEY:
+            raise CommandError("SENDGRID_API_KEY is not set")
+
+        dispatcher = NotificationDispatcher()
+        self.stdout.write("Dispatching notifications...")
+        try:
+            while True:
+                start_time = time.time()
+                dispatched = dispatcher.dispatch_pending(limit=options['limit'])
+                redelivered = dispatcher.retry_failed()
+                if dispatched or redelivered:
+                    self.stdout.write(
+                        f"Dispatched {dispatched} events and {redelivered} failed batches "
+                        f"in {time.time() - start_time:.2f}s ({dispatcher.summary()})"
+                    )
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.close()
+        self.stdout.write(self.style.SUCCESS(f"Notification dispatch stopped: {dispatcher.summary()}"))
@@ -0,0 +1,45 @@
+import asyncio
+import signal
+import warnings
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from urllib3.exceptions import InsecureRequestWarning
+from class_catch_app.proxy_health import ProxyHealthService
+
+warnings.filterwarnings("ignore", category=InsecureRequestWarning)
+
+
+class Command(BaseCommand):
+    help = 'Runs the proxy health service, keeping a warm pool of verified proxies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-size', type=int, default=getattr(settings, 'PROXY_POOL_TARGET_SIZE', 20),
+                            help='Healthy proxies to keep in the pool')
+        parser.add_argument('--low-watermark', type=int, default=getattr(settings, 'PROXY_POOL_LOW_WATERMARK', 10),
+                            help='Refill from the proxy sources when fewer healthy proxies remain')
+        parser.add_argument('--probe-interval', type=float, default=getattr(settings, 'PROXY_PROBE_INTERVAL', 300),
+                            help='Seconds between probes of a median-scoring proxy')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent probes')
+        parser.add_argument('--tick', type=float, default=5.0, help='Seconds between scheduling passes')
+
+    def handle(self, *args, **options):
+        service = ProxyHealthService(
+            target_size=options['target_size'],
+            low_watermark=options['low_watermark'],
+            probe_interval=options['probe_interval'],
+            concurrency=options['concurrency'],
+            tick=options['tick'],
+        )
+        self.stdout.write(
+            f"Starting proxy health service (target {service.target_size}, "
+            f"low watermark {service.low_watermark})..."
+        )
+        asyncio.run(self.serve(service))
+        self.stdout.write(self.style.SUCCESS(f"Proxy health service stopped: {service.summary()}"))
+
+    async def serve(self, service):
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        await service.run(stop_event)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from class_catch_app.aggregates import refresh_aggregates
+from class_catch_app.data_version import bump_data_version
+from class_catch_app.models import Class
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the precomputed department and distrib aggregates (scrapes keep them current afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', action='append', help='Term to rebuild (repeatable); all terms by default')
+
+    def handle(self, *args, **options):
+        terms = options['term'] or Class.objects.order_by('term').values_list('term', flat=True).distinct()
+        for term in terms:
+            with transaction.atomic():
+                rows = refresh_aggregates(term)
+                # the aggregates endpoint's ETags derive from the data version
+                bump_data_version(term)
+            self.stdout.write(f"{term}: {rows} aggregate rows")
+        self.stdout.write(self.style.SUCCESS('Aggregates rebuilt.'))
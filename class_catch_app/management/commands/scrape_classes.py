@@ -1,137 +1,280 @@
+import hashlib
 import time
+from datetime import datetime, timezone as dt_timezone
+import threading
+import concurrent.futures
+from collections import namedtuple
+from itertools import chain
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from class_catch_app.models import Class, Proxy
-from selenium import webdriver
+from class_catch_app.models import Class, ScrapeState, ScraperSession
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from class_catch_app.proxy_manager import ProxyManager
-from django.db import transaction
-from bs4 import BeautifulSoup
-import requests
+from class_catch_app.proxy_manager import ProxyManager, describe_error
+from class_catch_app.driver_pool import get_driver_pool
+from class_catch_app.timetable_parser import parse_subjects, read_timetable
+from class_catch_app.class_sync import class_data_from_row, sync_classes
+from class_catch_app.data_version import bump_data_version
+from class_catch_app import http_transport
 import warnings
 from urllib3.exceptions import InsecureRequestWarning
+from django.db import connection, transaction
 from django.utils import timezone
 
 warnings.simplefilter('ignore', InsecureRequestWarning)
 
+TIMETABLE_MAIN_URL = "https://oracle-www.dartmouth.edu/dart/groucho/timetable.main"
+TIMETABLE_URL = "https://oracle-www.dartmouth.edu/dart/groucho/timetable.display_courses"
+SUBJECT_SEARCH_URL = "https://oracle-www.dartmouth.edu/dart/groucho/timetable.subject_search"
+
+# records the time of the last change under the data table
+INSTALL_ROW_OBSERVER_JS = """
+if (!window.__ccRowObserver) {
+    window.__ccLastMutation = performance.now();
+    const target = document.querySelector('div.data-table') || document.body;
+    window.__ccRowObserver = new MutationObserver(() => { window.__ccLastMutation = performance.now(); });
+    window.__ccRowObserver.observe(target, {childList: true, subtree: true});
+}
+"""
+
+# scrolls to trigger any lazy loading and reports the signals load_all_data waits on
+PAGE_STATE_JS = """
+window.scrollTo(0, document.body.scrollHeight);
+const now = performance.now();
+const responseEnds = performance.getEntriesByType('resource').map(entry => entry.responseEnd);
+return {
+    rows: document.querySelectorAll('div.data-table table tr').length,
+    readyState: document.readyState,
+    mutationQuietMs: now - window.__ccLastMutation,
+    networkQuietMs: now - Math.max(0, ...responseEnds),
+};
+"""
+
+# chunk size for reading timetable responses into the streaming parser
+CHUNK_SIZE = 64 * 1024
+
+# winning response of a hedged proxy race; `page` is a ParsedPage, None for a 304
+RaceResult = namedtuple('RaceResult', 'proxy status_code page etag last_modified fetch_seconds')
+
+
+class RaceCancelled(Exception):
+    """A racer's response was abandoned because another proxy already won."""
+
 class Command(BaseCommand):
-    help = 'Scrapes class data for Winter Term 2025 and updates the database'
+    help = 'Scrapes class data for the given terms (Winter Term 2025 by default) and updates the database'
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.proxy_manager = ProxyManager()
+        self.driver_pool = get_driver_pool()
         self.DEBUG = False
+        self.parser = 'stream'
+        self.terms = ['202501']
+        self.shard_by = 'none'
+        self.subjects = []
+        self.shard_size = 1
+        self.workers = 8
+        self.shard_retries = 2
+        self.hedge = 3
+        self.hedge_stagger = 1.0
+        self.load_quiet_window = 0.5
+        self.load_timeout = 30.0
 
     def add_arguments(self, parser):
         # [change warning] --use-requests option removed since we'll always try requests first
-        pass
-
-    def create_driver(self, proxy=None):
-        chrome_options = Options()
-        chrome_options.add_argument('--headless=new')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        
-        if proxy:
-            chrome_options.add_argument(f'--proxy-server={proxy}')
-            
-        driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
-            options=chrome_options
+        parser.add_argument(
+            '--parser',
+            choices=['stream', 'bs4'],
+            default='stream',
+            help='HTML parser for the timetable: incremental row parser (default) or BeautifulSoup fallback',
+        )
+        parser.add_argument(
+            '--terms',
+            nargs='+',
+            default=['202501'],
+            help='Term codes to scrape, e.g. 202501 202503',
+        )
+        parser.add_argument(
+            '--shard-by',
+            choices=['none', 'subject'],
+            default='none',
+            help='Split each term into concurrent per-subject requests instead of one all-subjects request',
+        )
+        parser.add_argument(
+            '--subjects',
+            nargs='+',
+            default=[],
+            help="Subjects to shard over (defaults to the timetable's subject list plus the subjects stored for the term)",
+        )
+        parser.add_argument('--shard-size', type=int, default=1, help='Subjects per shard request')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent shard requests')
+        parser.add_argument('--shard-retries', type=int, default=2, help='Retries per failed shard, each on another proxy')
+        parser.add_argument(
+            '--hedge',
+            type=int,
+            default=3,
+            help='Race this many top requests proxies concurrently before trying the rest one by one (0 disables)',
+        )
+        parser.add_argument(
+            '--hedge-stagger',
+            type=float,
+            default=1.0,
+            help='Seconds to wait for a racing proxy before launching the next one',
+        )
+        parser.add_argument(
+            '--load-quiet-window',
+            type=float,
+            default=0.5,
+            help='Selenium: seconds the data table and network must stay quiet to count as loaded',
+        )
+        parser.add_argument(
+            '--load-timeout',
+            type=float,
+            default=30.0,
+            help='Selenium: upper bound in seconds on waiting for the data table to finish loading',
         )
-        
-        driver.set_page_load_timeout(30)
-        return driver
 
     def handle(self, *args, **options):
         start_time = time.time()
+        self.parser = options.get('parser', 'stream')
+        self.terms = options.get('terms') or ['202501']
+        self.shard_by = options.get('shard_by', 'none')
+        self.subjects = options.get('subjects') or []
+        self.shard_size = max(1, options.get('shard_size', 1))
+        self.workers = max(1, options.get('workers', 8))
+        self.shard_retries = max(0, options.get('shard_retries', 2))
+        self.hedge = max(0, options.get('hedge', 3))
+        self.hedge_stagger = max(0.0, options.get('hedge_stagger', 1.0))
+        self.load_quiet_window = max(0.0, options.get('load_quiet_window', 0.5))
+        self.load_timeout = max(self.load_quiet_window, options.get('load_timeout', 30.0))
+
+        # the proxy pool is kept warm by the proxy_health service
+
+        failed_terms = []
+        for term in self.terms:
+            self.stdout.write(f"Scraping term {term}...")
+            if not self.scrape_term(term):
+                failed_terms.append(term)
+
+        if not failed_terms:
+            self.stdout.write(self.style.SUCCESS("Scraping completed successfully."))
+        else:
+            self.stdout.write(self.style.ERROR(f"Scraping failed with all methods for term(s) {', '.join(failed_terms)}."))
 
-        # proxy refreshing is handled asynchronously via a separate cron job
-        
-        # time threshold for considering proxies as recently verified
-        time_threshold = timezone.now() - timezone.timedelta(hours=1)
+        if self.driver_pool.metrics()['launches']:
+            self.stdout.write(f"Driver pool: {self.driver_pool.summary()}")
 
-        # fetch working proxies for either requests or Selenium, 
-        # annotate w/ most recent verification time
-        proxies = Proxy.objects.filter(
-            Q(is_working_requests=True, last_verified_requests__gte=time_threshold) |
-            Q(is_working_selenium=True, last_verified_selenium__gte=time_threshold)
-        ).annotate(
-            max_last_verified=Greatest('last_verified_requests', 'last_verified_selenium')
-        ).order_by('-max_last_verified')
+        end_time = time.time()
+        self.stdout.write(self.style.SUCCESS(f"Total scraping time: {end_time - start_time:.2f} seconds"))
 
-        success = False
+    def record_proxy(self, proxy_address, kind, success, latency=None, nbytes=None, error=''):
+        """Record a scrape attempt through `proxy_address` in that proxy's stats."""
+        if proxy_address:
+            ip, port = proxy_address.rsplit(':', 1)
+            self.proxy_manager.record_outcome(
+                ip, int(port), kind, success, latency=latency, nbytes=nbytes, error=error
+            )
+
+    def scrape_term(self, term):
+        """Scrape one term, falling back through proxies, direct requests and Selenium."""
+        # working proxies for either requests or Selenium, best score first
+        # (kept warm by the proxy_health service, so no verification happens here)
+        proxies = self.proxy_manager.rank_proxies()
+
+        if self.shard_by == 'subject':
+            try:
+                if self.scrape_sharded(term, [
+                    f"{proxy.ip}:{proxy.port}" for proxy in proxies if proxy.is_working_requests
+                ]):
+                    return True
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Sharded scrape failed, falling back to a single request: {e}"))
+
+        # a browser-bootstrapped session from an earlier run keeps us off Selenium
+        session = ScraperSession.current()
+        if session:
+            self.stdout.write(f"Attempting to scrape with the cached session via {session.proxy or 'direct'}...")
+            if self.scrape_with_session(session, term):
+                return True
+
+        if self.hedge:
+            racers = [proxy for proxy in proxies if proxy.is_working_requests][:self.hedge]
+            result = self.race_proxies(term, racers)
+            if result:
+                self.stdout.write(self.style.SUCCESS(f"Proxy {result.proxy} won the race in {result.fetch_seconds:.2f}s."))
+                try:
+                    self.apply_response(term, result)
+                    return True
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"Failed with proxy {result.proxy}: {e}"))
+            # every racer failed (and was recorded as such); try the rest one by one
+            proxies = [proxy for proxy in proxies if proxy not in racers]
 
         for proxy in proxies:
             proxy_address = f"{proxy.ip}:{proxy.port}"
-            if proxy.is_working_requests and proxy.last_verified_requests >= proxy.last_verified_selenium:
-                # try scraping with requests
+            if proxy.is_working_requests:
+                # try scraping with requests (success is recorded once the response is in)
                 try:
                     self.stdout.write(f"Attempting to scrape with requests using proxy {proxy_address}...")
-                    self.scrape_with_requests(proxy_address)
-                    success = True
-                    break
+                    self.scrape_with_requests(proxy_address, term)
+                    return True
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f"Failed with proxy {proxy_address}: {e}"))
-                    # update proxy status
-                    proxy.is_working_requests = False
-                    proxy.save(update_fields=['is_working_requests'])
+                    # update proxy stats
+                    self.record_proxy(proxy_address, 'requests', False, error=describe_error(e))
             elif proxy.is_working_selenium:
-                # try scraping with Selenium
+                # use the browser only to set up a session, then fetch with requests
+                session = self.try_bootstrap_session(proxy_address)
+                if session is None:
+                    continue
+                if self.scrape_with_session(session, term):
+                    return True
+                # the session didn't carry over to requests; try scraping with Selenium
                 try:
                     self.stdout.write(f"Attempting to scrape with Selenium using proxy {proxy_address}...")
-                    driver = self.create_driver(proxy_address)
-                    self.scrape_with_selenium(driver)
-                    driver.quit()
-                    success = True
-                    break 
+                    start_time = time.time()
+                    with self.driver_pool.session(proxy_address) as driver:
+                        self.scrape_with_selenium(driver, term)
+                    self.record_proxy(proxy_address, 'selenium', True, latency=time.time() - start_time)
+                    return True
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f"Failed with proxy {proxy_address}: {e}"))
-                    # update proxy status
-                    proxy.is_working_selenium = False
-                    proxy.save(update_fields=['is_working_selenium'])
+                    # update proxy stats
+                    self.record_proxy(proxy_address, 'selenium', False, error=describe_error(e))
             else:
                 # if both fail, skip to the next proxy
                 continue
 
-        if not success:
-            # try scraping without any proxy using requests
-            self.stdout.write("Trying to scrape with requests without a proxy...")
-            try:
-                self.scrape_with_requests(None)
-                success = True
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Failed without proxy: {e}"))
-
-        if not success:
-            # if scraping with requests failed, fall back to Selenium (still, without a proxy)
-            self.stdout.write("Trying to scrape with Selenium without a proxy...")
-            try:
-                driver = self.create_driver()
-                self.scrape_with_selenium(driver)
-                driver.quit()
-                success = True
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Failed without proxy: {e}"))
+        # try scraping without any proxy using requests
+        self.stdout.write("Trying to scrape with requests without a proxy...")
+        try:
+            self.scrape_with_requests(None, term)
+            return True
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Failed without proxy: {e}"))
 
-        if success:
-            self.stdout.write(self.style.SUCCESS("Scraping completed successfully."))
-        else:
-            self.stdout.write(self.style.ERROR("Scraping failed with all methods."))
+        # set up a session in the browser, then retry with requests
+        session = self.try_bootstrap_session(None)
+        if session and self.scrape_with_session(session, term):
+            return True
 
-        end_time = time.time()
-        self.stdout.write(self.style.SUCCESS(f"Total scraping time: {end_time - start_time:.2f} seconds"))
+        # if scraping with requests failed, fall back to Selenium (still, without a proxy)
+        self.stdout.write("Trying to scrape with Selenium without a proxy...")
+        try:
+            with self.driver_pool.session() as driver:
+                self.scrape_with_selenium(driver, term)
+            return True
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Failed without proxy: {e}"))
 
+        return False
 
-    def scrape_with_selenium(self, driver):
+    def scrape_with_selenium(self, driver, term='202501'):
         # navigate to the timetable page
-        driver.get("https://oracle-www.dartmouth.edu/dart/groucho/timetable.main")
-        
+        driver.get(TIMETABLE_MAIN_URL)
+
         # wait for the Subject Area button to be clickable
         wait = WebDriverWait(driver, 10)
         subject_button = wait.until(
@@ -140,11 +283,11 @@ class Command(BaseCommand):
         subject_button.click()
 
         # wait for the term checkbox to be clickable
-        winter_term_checkbox = wait.until(
-            EC.element_to_be_clickable((By.XPATH, "//input[@value='202501']"))
+        term_checkbox = wait.until(
+            EC.element_to_be_clickable((By.XPATH, f"//input[@value='{term}']"))
         )
-        if not winter_term_checkbox.is_selected():
-            winter_term_checkbox.click()
+        if not term_checkbox.is_selected():
+            term_checkbox.click()
 
         # click search button
         search_button = wait.until(
@@ -157,186 +300,464 @@ class Command(BaseCommand):
             EC.presence_of_element_located((By.XPATH, "//div[@class='data-table']/table"))
         )
 
-        # load all data without scrolling
+        # wait for all rows to load
         self.load_all_data(driver)
 
         # scrape courses :)
-        self.scrape_courses(driver.page_source)
+        self.process_pages(term, [self.read_page(driver.page_source)])
 
     def load_all_data(self, driver):
         """
-        Load all data on the page by scrolling to the bottom repeatedly until all data is loaded.
+        Wait until the data table has finished loading: the row count has been
+        stable, no rows were appended (MutationObserver) and no network response
+        completed for --load-quiet-window seconds, bounded by --load-timeout.
         """
-        last_height = driver.execute_script("return document.body.scrollHeight")
-        while True:
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(1)
-            # calculate new scroll height and compare with last scroll height
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
-                # if heights are the same, all data is loaded
-                break
-            last_height = new_height
-
-    def scrape_with_requests(self, proxy):
-        start_time = time.time()
-        try:
-            # payload and headers
-            url = "https://oracle-www.dartmouth.edu/dart/groucho/timetable.display_courses"
-            payload = {
-                "distribradio": "alldistribs",
-                "depts": "no_value",
-                "periods": "no_value",
-                "distribs": "no_value",
-                "distribs_i": "no_value",
-                "distribs_wc": "no_value",
-                "distribs_lang": "no_value",
-                "deliveryradio": "alldelivery",
-                "deliverymodes": "no_value",
-                "pmode": "public",
-                "term": "",
-                "levl": "",
-                "fys": "n",
-                "wrt": "n",
-                "pe": "n",
-                "review": "n",
-                "crnl": "no_value",
-                "classyear": "2008",
-                "searchtype": "Subject Area(s)",
-                "termradio": "selectterms",
-                "terms": "202501",
-                "subjectradio": "selectsubjects",
-                "hoursradio": "allhours",
-                "sortorder": "dept",
-            }
-            headers = self.proxy_manager.get_random_headers()
-            headers["Referer"] = "https://oracle-www.dartmouth.edu/dart/groucho/timetable.subject_search"
-
-            proxies_dict = None
-            if proxy:
-                proxies_dict = {
-                    "http": f"http://{proxy}",
-                    "https": f"http://{proxy}",
-                }
-
-            # POST request
-            response = requests.post(
-                url,
-                data=payload,
-                headers=headers,
-                proxies=proxies_dict,
-                timeout=30,
-                verify=False
+        driver.execute_script(INSTALL_ROW_OBSERVER_JS)
+        quiet_ms = self.load_quiet_window * 1000
+        last = {'rows': -1, 'since': time.monotonic()}
+
+        def loaded(driver):
+            state = driver.execute_script(PAGE_STATE_JS)
+            now = time.monotonic()
+            if state['rows'] != last['rows']:
+                last['rows'], last['since'] = state['rows'], now
+                return False
+            return (
+                state['rows'] > 0
+                and state['readyState'] == 'complete'
+                and (now - last['since']) * 1000 >= quiet_ms
+                and state['mutationQuietMs'] >= quiet_ms
+                and state['networkQuietMs'] >= quiet_ms
             )
 
-            if response.status_code == 200:
-                self.stdout.write(self.style.SUCCESS("Request successful!"))
-                html_content = response.text
-                self.scrape_courses(html_content)
-            else:
-                raise Exception(f"Request failed with status code: {response.status_code}")
-
+        start_time = time.time()
+        try:
+            WebDriverWait(driver, self.load_timeout, poll_frequency=0.1).until(loaded)
+            self.stdout.write(f"Loaded {last['rows']} rows in {time.time() - start_time:.2f}s")
+        except TimeoutException:
+            self.stdout.write(self.style.WARNING(
+                f"Data table still changing after {self.load_timeout}s, scraping the {last['rows']} rows loaded so far"
+            ))
+
+    def try_bootstrap_session(self, proxy_address):
+        """Bootstrap a session through `proxy_address`, recording the outcome; None on failure."""
+        try:
+            self.stdout.write(f"Bootstrapping a session with Selenium via {proxy_address or 'direct'}...")
+            start_time = time.time()
+            session = self.bootstrap_session(proxy_address)
+            self.record_proxy(proxy_address, 'selenium', True, latency=time.time() - start_time)
+            return session
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error during scraping with requests: {e}'))
-            raise e
+            self.stdout.write(self.style.ERROR(f"Session bootstrap failed: {e}"))
+            self.record_proxy(proxy_address, 'selenium', False, error=describe_error(e))
+            return None
 
-    def scrape_courses(self, html_content):
-        start_time = time.time()
+    def scrape_with_session(self, session, term):
+        """Scrape with requests using a bootstrapped session; discards the session on failure."""
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+            self.scrape_with_requests(session.proxy or None, term, session=session)
+            return True
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Requests with the session from {session.proxy or 'direct'} failed: {e}"))
+            session.delete()
+            return False
 
-            # find the data table
-            table = soup.find('div', class_='data-table').find('table')
+    def bootstrap_session(self, proxy_address):
+        """
+        Open the subject search form once in a pooled browser and cache its
+        cookies and hidden form fields as a ScraperSession.
+        """
+        with self.driver_pool.session(proxy_address) as driver:
+            driver.get(TIMETABLE_MAIN_URL)
+            wait = WebDriverWait(driver, 10)
+            wait.until(
+                EC.element_to_be_clickable((By.XPATH, "//input[@value='Subject Area(s)']"))
+            ).click()
+            wait.until(
+                EC.presence_of_element_located((By.XPATH, "//input[@value='Search for Courses']"))
+            )
 
-            # headers
-            header_cells = table.find('tr').find_all('th')
-            headers = [cell.get_text(strip=True) for cell in header_cells]
-            header_indices = {header: idx for idx, header in enumerate(headers)}
+            form_fields = {}
+            for element in driver.find_elements(By.XPATH, "//form//input[@type='hidden']"):
+                name = element.get_attribute('name')
+                if name:
+                    form_fields.setdefault(name, element.get_attribute('value') or '')
+            cookies = driver.get_cookies()
+            user_agent = driver.execute_script("return navigator.userAgent")
+
+        # the session lasts as long as the TTL allows and no cookie has expired
+        expires_at = timezone.now() + timezone.timedelta(seconds=settings.SCRAPER_SESSION_TTL)
+        cookie_expiries = [cookie['expiry'] for cookie in cookies if cookie.get('expiry')]
+        if cookie_expiries:
+            expires_at = min(expires_at, datetime.fromtimestamp(min(cookie_expiries), tz=dt_timezone.utc))
+
+        return ScraperSession.objects.create(
+            proxy=proxy_address or '',
+            user_agent=user_agent,
+            cookies={cookie['name']: cookie['value'] for cookie in cookies},
+            form_fields=form_fields,
+            expires_at=expires_at,
+        )
 
-            # fetch existing classes for the term
-            existing_classes = Class.objects.filter(term='202501')
-            existing_classes_dict = {
-                (cls.class_code, cls.course_number, cls.section): cls
-                for cls in existing_classes
-            }
+    def build_payload(self, term, subjects=None, extra_fields=None):
+        """
+        Form fields for timetable.display_courses; `subjects` narrows the search
+        to those departments, `extra_fields` adds hidden fields from a session.
+        """
+        payload = {
+            "distribradio": "alldistribs",
+            # list-valued fields carry a leading no_value placeholder, as the search form does
+            "depts": ["no_value", *subjects] if subjects else "no_value",
+            "periods": "no_value",
+            "distribs": "no_value",
+            "distribs_i": "no_value",
+            "distribs_wc": "no_value",
+            "distribs_lang": "no_value",
+            "deliveryradio": "alldelivery",
+            "deliverymodes": "no_value",
+            "pmode": "public",
+            "term": "",
+            "levl": "",
+            "fys": "n",
+            "wrt": "n",
+            "pe": "n",
+            "review": "n",
+            "crnl": "no_value",
+            "classyear": "2008",
+            "searchtype": "Subject Area(s)",
+            "termradio": "selectterms",
+            "terms": term,
+            "subjectradio": "selectsubjects",
+            "hoursradio": "allhours",
+            "sortorder": "dept",
+        }
+        for name, value in (extra_fields or {}).items():
+            payload.setdefault(name, value)
+        return payload
+
+    def fetch_with_requests(self, proxy, term, subjects=None, conditional_headers=None, stream=False, session=None):
+        """
+        POST the timetable search and return the response (200, or 304 when
+        `conditional_headers` are sent). A ScraperSession supplies cookies, the
+        browser's user agent and hidden form fields.
+        """
+        headers = self.proxy_manager.get_random_headers()
+        if session and session.user_agent:
+            headers['User-Agent'] = session.user_agent
+        headers["Referer"] = SUBJECT_SEARCH_URL
+        if conditional_headers:
+            headers.update(conditional_headers)
+
+        # POST request, over the pooled keep-alive session for this proxy
+        response = http_transport.post(
+            TIMETABLE_URL,
+            proxy=proxy,
+            data=self.build_payload(term, subjects, session.form_fields if session else None),
+            headers=headers,
+            cookies=session.cookies if session else None,
+            timeout=30,
+            stream=stream
+        )
 
-            # lists for bulk operations
-            classes_to_create = []
-            classes_to_update = []
+        if response.status_code == 200 or (conditional_headers and response.status_code == 304):
+            return response
+        response.close()
+        raise Exception(f"Request failed with status code: {response.status_code}")
 
-            data_rows = table.find_all('tr')[1:]  # Skip header row
+    def read_page(self, chunks, encoding='utf-8'):
+        """Parse a timetable page as its chunks arrive (see `read_timetable`)."""
+        return read_timetable(chunks, encoding=encoding, parser=self.parser)
 
-            for row in data_rows:
-                # skip separator rows
-                if row.find('td', {'colspan': True}):
-                    continue
+    def scrape_with_requests(self, proxy, term='202501', session=None):
+        try:
+            start_time = time.time()
+            response = self.fetch_with_requests(
+                proxy, term, conditional_headers=self.conditional_headers(term), stream=True, session=session
+            )
+            with response:
+                # rows are parsed as the body arrives; a page without the data table raises here
+                page = None if response.status_code == 304 else self.read_page(
+                    response.iter_content(chunk_size=CHUNK_SIZE), response.encoding or 'utf-8'
+                )
+                result = RaceResult(
+                    proxy,
+                    response.status_code,
+                    page,
+                    response.headers.get('ETag', ''),
+                    response.headers.get('Last-Modified', ''),
+                    time.time() - start_time,
+                )
+            self.record_proxy(proxy, 'requests', True, latency=result.fetch_seconds, nbytes=page.nbytes if page else None)
+            self.apply_response(term, result)
 
-                data_cells = row.find_all('td')
-                cell_texts = [cell.get_text(strip=True) for cell in data_cells]
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error during scraping with requests: {e}'))
+            raise e
 
-                data = {}
-                for header, idx in header_indices.items():
-                    data[header] = cell_texts[idx] if idx < len(cell_texts) else ''
+    def apply_response(self, term, result):
+        """Apply a fetched full-term response (a RaceResult)."""
+        if result.status_code == 304:
+            self.stdout.write(self.style.SUCCESS("Timetable not modified since the last run, skipping."))
+            self.mark_checked(term)
+            return
+
+        self.stdout.write(self.style.SUCCESS("Request successful!"))
+        ScrapeState.objects.update_or_create(term=term, defaults={'single_fetch_seconds': result.fetch_seconds})
+        self.process_pages(term, [result.page], etag=result.etag, last_modified=result.last_modified)
+
+    def race_proxies(self, term, proxies):
+        """
+        Hedged fetch: launch `proxies` one every --hedge-stagger seconds (sooner if
+        the running ones have already failed) and return the first valid response
+        as a RaceResult, cancelling the rest. Returns None if every proxy failed.
+        """
+        if not proxies:
+            return None
 
-                # row data
-                class_key = (
-                    data.get('Subj', ''),
-                    data.get('Num', ''),
-                    data.get('Sec', '')
+        conditional_headers = self.conditional_headers(term)
+        cancel = threading.Event()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(proxies))
+        pending = set()
+        try:
+            for index, proxy in enumerate(proxies):
+                self.stdout.write(f"Racing proxy {proxy.ip}:{proxy.port}...")
+                pending.add(executor.submit(self.race_attempt, proxy, term, conditional_headers, cancel))
+                is_last = index == len(proxies) - 1
+                winner = self.wait_for_winner(pending, None if is_last else self.hedge_stagger)
+                if winner:
+                    return winner
+            return None
+        finally:
+            # losers see the flag between chunks and record their own outcome
+            cancel.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def wait_for_winner(self, pending, timeout):
+        """Wait up to `timeout` seconds (None: until all finish) for a successful racer."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            done, _ = concurrent.futures.wait(
+                pending, timeout=remaining, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                pending.discard(future)
+                if future.result():
+                    return future.result()
+        return None
+
+    def race_attempt(self, proxy, term, conditional_headers, cancel):
+        """One racer: fetch through `proxy`, record the outcome on its row, return a RaceResult or None."""
+        proxy_address = f"{proxy.ip}:{proxy.port}"
+        start_time = time.time()
+        working = False
+        stats = {}
+        try:
+            response = self.fetch_with_requests(
+                proxy_address, term, conditional_headers=conditional_headers, stream=True
+            )
+            with response:
+                stats['latency'] = time.time() - start_time
+                if response.status_code == 304:
+                    working = True
+                    return None if cancel.is_set() else RaceResult(
+                        proxy_address, 304, None, '', '', time.time() - start_time
+                    )
+
+                def chunks():
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if cancel.is_set():
+                            raise RaceCancelled
+                        yield chunk
+
+                page = self.read_page(chunks(), response.encoding or 'utf-8')
+                working = True
+                stats = {'latency': time.time() - start_time, 'nbytes': page.nbytes}
+                if cancel.is_set():
+                    return None
+                return RaceResult(
+                    proxy_address,
+                    200,
+                    page,
+                    response.headers.get('ETag', ''),
+                    response.headers.get('Last-Modified', ''),
+                    time.time() - start_time,
                 )
+        except RaceCancelled:
+            # lost the race while answering; that still counts as working
+            working = True
+            return None
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Racing proxy {proxy_address} failed: {e}"))
+            stats = {'error': describe_error(e)}
+            return None
+        finally:
+            try:
+                self.record_proxy(proxy_address, 'requests', working, **stats)
+            finally:
+                # racers run on their own threads, each with its own connection
+                connection.close()
+
+    def discover_subjects(self, proxies):
+        """Subjects offered by the timetable's subject search form, via the first proxy that answers."""
+        for proxy in [*proxies, None]:
+            try:
+                response = http_transport.get(
+                    SUBJECT_SEARCH_URL, proxy=proxy, headers=self.proxy_manager.get_random_headers(), timeout=30
+                )
+                response.raise_for_status()
+                subjects = parse_subjects(response.text)
+                if subjects:
+                    return subjects
+                raise Exception("No subjects on the subject search page")
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"Subject discovery via {proxy or 'direct'} failed: {e}"))
+        return []
+
+    def shard_subjects(self, term, proxies=()):
+        """
+        Subject groups for a sharded scrape of `term`: --subjects, or the
+        timetable's subject list plus any subject already stored for the term
+        (so a subject dropped from the list is still fetched and can vanish).
+        """
+        subjects = self.subjects
+        if not subjects:
+            stored = Class.objects.filter(term=term).order_by().values_list('class_code', flat=True).distinct()
+            subjects = sorted(set(self.discover_subjects(proxies)) | set(stored))
+        return [subjects[i:i + self.shard_size] for i in range(0, len(subjects), self.shard_size)]
+
+    def fetch_shard(self, term, subjects, proxies, offset):
+        """Fetch one shard, retrying on the next proxy so a bad proxy only costs this shard."""
+        last_error = None
+        for attempt in range(self.shard_retries + 1):
+            proxy = proxies[(offset + attempt) % len(proxies)] if proxies else None
+            start_time = time.time()
+            try:
+                with self.fetch_with_requests(proxy, term, subjects, stream=True) as response:
+                    page = self.read_page(response.iter_content(chunk_size=CHUNK_SIZE), response.encoding or 'utf-8')
+                seconds = time.time() - start_time
+                self.record_shard_outcome(proxy, True, latency=seconds, nbytes=page.nbytes)
+                return page, seconds
+            except Exception as e:
+                last_error = e
+                self.record_shard_outcome(proxy, False, error=describe_error(e))
+                self.stdout.write(self.style.WARNING(
+                    f"Shard {','.join(subjects)} failed via {proxy or 'direct'} (attempt {attempt + 1}): {e}"
+                ))
+        raise Exception(f"Shard {','.join(subjects)} failed after {self.shard_retries + 1} attempts: {last_error}")
+
+    def record_shard_outcome(self, proxy, success, **stats):
+        try:
+            self.record_proxy(proxy, 'requests', success, **stats)
+        finally:
+            # shards run on their own threads, each with its own connection
+            connection.close()
+
+    def scrape_sharded(self, term, proxies):
+        """
+        Fetch a term as concurrent per-subject shards and apply them as a single
+        upsert. Returns False, having fetched nothing, when no subjects are known.
+        """
+        shards = self.shard_subjects(term, proxies[:self.shard_retries + 1])
+        if not shards:
+            self.stdout.write(self.style.WARNING(f"No subjects known for term {term}, scraping it unsharded."))
+            return False
+
+        self.stdout.write(f"Fetching {len(shards)} shards with {min(self.workers, len(shards))} workers...")
+        start_time = time.time()
+        pages = [None] * len(shards)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            future_to_index = {
+                executor.submit(self.fetch_shard, term, subjects, proxies, index): index
+                for index, subjects in enumerate(shards)
+            }
+            for future in concurrent.futures.as_completed(future_to_index):
+                pages[future_to_index[future]] = future.result()
+        wall_seconds = time.time() - start_time
+
+        serial_seconds = sum(seconds for _, seconds in pages)
+        self.stdout.write(self.style.SUCCESS(
+            f"Fetched {len(shards)} shards in {wall_seconds:.2f}s wall-clock "
+            f"({serial_seconds:.2f}s of requests, {serial_seconds / wall_seconds:.1f}x concurrency)"
+        ))
+        state = ScrapeState.objects.filter(term=term).first()
+        if state and state.single_fetch_seconds:
+            self.stdout.write(self.style.SUCCESS(
+                f"Speedup vs last single-request fetch ({state.single_fetch_seconds:.2f}s): "
+                f"{state.single_fetch_seconds / wall_seconds:.1f}x"
+            ))
+
+        # only the fetched subjects can vanish, the rest of the term wasn't looked at
+        self.process_pages(
+            term, [page for page, _ in pages],
+            subjects=[subject for shard in shards for subject in shard],
+        )
+        return True
+
+    def conditional_headers(self, term):
+        """If-None-Match/If-Modified-Since validators from the last successful run."""
+        state = ScrapeState.objects.filter(term=term).first()
+        headers = {}
+        if state and state.payload_digest:
+            if state.etag:
+                headers['If-None-Match'] = state.etag
+            if state.last_modified:
+                headers['If-Modified-Since'] = state.last_modified
+        return headers
+
+    def mark_checked(self, term):
+        ScrapeState.objects.filter(term=term).update(last_checked=timezone.now())
+
+    def process_pages(self, term, pages, etag='', last_modified='', subjects=None):
+        """
+        Apply parsed timetable pages of a term, unless their row digest matches
+        the last successful run, in which case the DB write is skipped. `pages`
+        is a list of ParsedPages, one per shard; `subjects` limits the sync to
+        those subjects when only they were fetched.
+        """
+        digests = [page.digest for page in pages]
+        if len(digests) == 1:
+            digest = digests[0]
+        else:
+            digest = hashlib.sha256(''.join(digests).encode()).hexdigest()
+
+        state, _ = ScrapeState.objects.get_or_create(term=term)
+        now = timezone.now()
+
+        if digest == state.payload_digest:
+            self.stdout.write(self.style.SUCCESS("Timetable unchanged since the last run, skipping."))
+            state.etag = etag or state.etag
+            state.last_modified = last_modified or state.last_modified
+            state.last_checked = now
+            state.save(update_fields=['etag', 'last_modified', 'last_checked'])
+            return None
+
+        with transaction.atomic():
+            result = self.scrape_courses(term, pages, subjects=subjects)
+            state.payload_digest = digest
+            state.etag = etag
+            state.last_modified = last_modified
+            state.last_success = now
+            state.last_checked = now
+            state.save()
+            if result.has_changes:
+                bump_data_version(term)
+        return result
+
+    def scrape_courses(self, term, pages, subjects=None):
+        start_time = time.time()
+        try:
+            rows = chain.from_iterable(page.rows for page in pages)
+            result = sync_classes(term, (class_data_from_row(data) for data in rows), subjects=subjects)
 
-                class_data = {
-                    'class_code': data.get('Subj', ''),
-                    'course_number': data.get('Num', ''),
-                    'section': data.get('Sec', ''),
-                    'title': data.get('Title', ''),
-                    'instructor': data.get('Instructor', ''),
-                    'term': data.get('Term', ''),
-                    'limit': int(data.get('Lim', '0') or '0'),
-                    'enrollment': int(data.get('Enrl', '0') or '0'),
-                    'distrib': data.get('Dist', ''),
-                    'world_culture': data.get('WC', ''),
-                    'period': data.get('Period', ''),
-                    'period_code': data.get('Period Code', ''),
-                    'status': data.get('Status', ''),
-                    'text': data.get('Text', ''),
-                    'xlist': data.get('Xlist', ''),
-                    'crn': data.get('CRN', ''),
-                }
-
-                existing_class = existing_classes_dict.get(class_key)
-
-                if existing_class:
-                    # check if enrollment has changed
-                    if existing_class.enrollment != class_data['enrollment']:
-                        # update enrollment
-                        existing_class.enrollment = class_data['enrollment']
-                    
-                    # update other fields
-                    for field, value in class_data.items():
-                        setattr(existing_class, field, value)
-                    classes_to_update.append(existing_class)
-                else:
-                    new_class = Class(**class_data)
-                    classes_to_create.append(new_class)
-
-            # make bulk operations atomic
-            with transaction.atomic():
-                if classes_to_create:
-                    Class.objects.bulk_create(classes_to_create)
-                    self.stdout.write(self.style.SUCCESS(f'Added {len(classes_to_create)} new classes.'))
-
-                if classes_to_update:
-                    update_fields = [
-                        'title', 'instructor', 'limit', 'enrollment', 'distrib', 'world_culture',
-                        'period', 'period_code', 'status', 'text', 'xlist', 'crn', 'last_updated'
-                    ]
-                    Class.objects.bulk_update(classes_to_update, update_fields)
-                    self.stdout.write(self.style.SUCCESS(f'Updated {len(classes_to_update)} existing classes.'))
+            self.stdout.write(self.style.SUCCESS(f"Classes: {result.summary()}."))
 
             end_time = time.time()
             self.stdout.write(self.style.SUCCESS(f"TIME FOR SCRAPE: {end_time - start_time} seconds"))
-            
+            return result
+
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error while scraping courses: {e}'))
             raise e
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Proxy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip', models.GenericIPAddressField()),
+                ('port', models.PositiveIntegerField()),
+                ('is_working', models.BooleanField(default=False)),
+                ('last_verified', models.DateTimeField(blank=True, null=True)),
+                ('is_working_requests', models.BooleanField(default=False)),
+                ('last_verified_requests', models.DateTimeField(blank=True, null=True)),
+                ('is_working_selenium', models.BooleanField(default=False)),
+                ('last_verified_selenium', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Class',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('class_code', models.CharField(max_length=10)),
+                ('course_number', models.CharField(max_length=10)),
+                ('section', models.CharField(blank=True, max_length=10, null=True)),
+                ('title', models.CharField(max_length=255)),
+                ('instructor', models.CharField(blank=True, max_length=255, null=True)),
+                ('term', models.CharField(max_length=50)),
+                ('limit', models.IntegerField()),
+                ('enrollment', models.IntegerField()),
+                ('distrib', models.CharField(blank=True, max_length=50, null=True)),
+                ('world_culture', models.CharField(blank=True, max_length=50, null=True)),
+                ('period', models.CharField(blank=True, max_length=50, null=True)),
+                ('period_code', models.CharField(blank=True, max_length=50, null=True)),
+                ('status', models.CharField(blank=True, max_length=50, null=True)),
+                ('text', models.CharField(blank=True, max_length=255, null=True)),
+                ('xlist', models.CharField(blank=True, max_length=255, null=True)),
+                ('crn', models.CharField(blank=True, max_length=20, null=True)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('class_code', 'course_number', 'section', 'term')},
+            },
+        ),
+    ]
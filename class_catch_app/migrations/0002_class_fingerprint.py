@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0002_class_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50, unique=True)),
+                ('payload_digest', models.CharField(blank=True, default='', max_length=64)),
+                ('etag', models.CharField(blank=True, default='', max_length=255)),
+                ('last_modified', models.CharField(blank=True, default='', max_length=64)),
+                ('last_success', models.DateTimeField(blank=True, null=True)),
+                ('last_checked', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
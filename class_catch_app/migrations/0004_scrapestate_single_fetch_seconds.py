@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0003_scrapestate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapestate',
+            name='single_fetch_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0004_scrapestate_single_fetch_seconds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proxy',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='proxy',
+            name='bytes_per_sec',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proxy',
+            name='consecutive_failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='proxy',
+            name='last_attempt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proxy',
+            name='last_error',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='proxy',
+            name='latency_ewma',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proxy',
+            name='success_rate',
+            field=models.FloatField(default=0.5),
+        ),
+    ]
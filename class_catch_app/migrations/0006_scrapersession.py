@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0005_proxy_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScraperSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proxy', models.CharField(blank=True, default='', max_length=64)),
+                ('user_agent', models.CharField(blank=True, default='', max_length=512)),
+                ('cookies', models.JSONField(default=dict)),
+                ('form_fields', models.JSONField(default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
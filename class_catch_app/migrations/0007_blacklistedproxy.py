@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0006_scrapersession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlacklistedProxy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip', models.GenericIPAddressField()),
+                ('port', models.PositiveIntegerField()),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, default='', max_length=100)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'unique_together': {('ip', 'port')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0007_blacklistedproxy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proxy',
+            name='circuit_open_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proxy',
+            name='circuit_trips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0008_proxy_circuit_breaker'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('class_code', models.CharField(max_length=10)),
+                ('recorded_at', models.DateTimeField()),
+                ('enrollment', models.IntegerField()),
+                ('limit', models.IntegerField()),
+                ('status', models.CharField(blank=True, max_length=50, null=True)),
+                ('resolution', models.CharField(choices=[('raw', 'Raw'), ('hour', 'Hourly'), ('day', 'Daily')], default='raw', max_length=4)),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment_history', to='class_catch_app.class')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['section', 'recorded_at'], name='class_catch_section_9ffa49_idx'), models.Index(fields=['term', 'class_code', 'recorded_at'], name='class_catch_term_0adc24_idx'), models.Index(fields=['resolution', 'recorded_at'], name='class_catch_resolut_23ce0d_idx')],
+            },
+        ),
+    ]
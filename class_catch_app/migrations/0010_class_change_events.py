@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0009_enrollmentsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='ClassChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('seat_opened', 'Seat opened'), ('seat_filled', 'Seat filled'), ('limit_changed', 'Limit changed'), ('instructor_changed', 'Instructor changed'), ('section_added', 'Section added'), ('section_removed', 'Section removed')], max_length=20)),
+                ('term', models.CharField(max_length=50)),
+                ('class_code', models.CharField(max_length=10)),
+                ('course_number', models.CharField(max_length=10)),
+                ('section_number', models.CharField(blank=True, max_length=10, null=True)),
+                ('data', models.JSONField(default=dict)),
+                ('created', models.DateTimeField()),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='change_events', to='class_catch_app.class')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'event_type', 'id'], name='class_catch_term_0a72b5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0010_class_change_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Watch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('class_code', models.CharField(max_length=10)),
+                ('course_number', models.CharField(max_length=10)),
+                ('section', models.CharField(blank=True, max_length=10, null=True)),
+                ('term', models.CharField(max_length=50)),
+                ('event_types', models.CharField(default='seat_opened', max_length=255)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='watches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'class_code', 'course_number', 'section'], name='class_catch_term_022c2a_idx')],
+                'unique_together': {('email', 'class_code', 'course_number', 'section', 'term')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0011_watch_outboxcursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapestate',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
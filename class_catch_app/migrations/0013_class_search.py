@@ -0,0 +1,60 @@
+# Generated by Django 5.1.3 on 2026-10-17 16:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+class PostgresAddIndex(migrations.AddIndex):
+    """AddIndex that only touches the schema on PostgreSQL (GIN/trigram indexes)."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def populate_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Class = apps.get_model('class_catch_app', 'Class')
+    Class.objects.update(search_vector=(
+        SearchVector('class_code', 'course_number', weight='A', config='simple')
+        + SearchVector('title', weight='A', config='english')
+        + SearchVector('instructor', weight='B', config='simple')
+        + SearchVector('text', weight='C', config='english')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0012_scrapestate_version'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='class',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        PostgresAddIndex(
+            model_name='class',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='class_search_vector_gin'),
+        ),
+        PostgresAddIndex(
+            model_name='class',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='class_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        PostgresAddIndex(
+            model_name='class',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['instructor'], name='class_instructor_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.3 on 2026-10-17 17:05
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0013_class_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(fields=['term', 'class_code', 'course_number', 'section'], include=('id', 'fingerprint', 'enrollment', 'limit', 'status', 'instructor', 'is_active'), name='class_term_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['term', 'id'], name='class_active_term_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(models.F('term'), django.db.models.functions.text.Upper('class_code'), condition=models.Q(('is_active', True)), name='class_active_subject_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(condition=models.Q(('is_active', True), models.Q(('enrollment__lt', models.F('limit')), ('limit', 0), _connector='OR')), fields=['term', 'id'], name='class_open_seats_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proxy',
+            index=models.Index(fields=['ip', 'port'], name='proxy_ip_port_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proxy',
+            index=models.Index(condition=models.Q(('is_working_requests', True)), fields=['last_verified_requests'], name='proxy_working_requests_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proxy',
+            index=models.Index(condition=models.Q(('is_working_selenium', True)), fields=['last_verified_selenium'], name='proxy_working_selenium_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proxy',
+            index=models.Index(condition=models.Q(('circuit_open_until__isnull', False)), fields=['circuit_open_until'], name='proxy_circuit_idx'),
+        ),
+    ]
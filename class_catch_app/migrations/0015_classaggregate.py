@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-17 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0014_class_proxy_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('class_code', models.CharField(max_length=10)),
+                ('distrib', models.CharField(blank=True, default='', max_length=50)),
+                ('sections', models.PositiveIntegerField(default=0)),
+                ('open_sections', models.PositiveIntegerField(default=0)),
+                ('enrollment', models.PositiveIntegerField(default=0)),
+                ('capacity', models.PositiveIntegerField(default=0)),
+                ('capped_enrollment', models.PositiveIntegerField(default=0)),
+                ('oversubscribed_sections', models.PositiveIntegerField(default=0)),
+                ('top_oversubscribed', models.JSONField(default=list)),
+                ('updated', models.DateTimeField()),
+            ],
+            options={
+                'unique_together': {('term', 'class_code', 'distrib')},
+            },
+        ),
+    ]
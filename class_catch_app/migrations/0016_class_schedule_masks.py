@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-17 18:10
+
+from django.db import migrations, models
+
+
+def populate_schedule_masks(apps, schema_editor):
+    from class_catch_app.schedule import encode_mask, period_masks
+    Class = apps.get_model('class_catch_app', 'Class')
+    classes = []
+    for cls in Class.objects.only('period_code', 'period').iterator():
+        schedule_mask, xhour_mask = period_masks(cls.period_code, cls.period)
+        cls.schedule_mask, cls.xhour_mask = encode_mask(schedule_mask), encode_mask(xhour_mask)
+        classes.append(cls)
+    Class.objects.bulk_update(classes, ['schedule_mask', 'xhour_mask'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0015_classaggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='schedule_mask',
+            field=models.CharField(blank=True, default='', max_length=80),
+        ),
+        migrations.AddField(
+            model_name='class',
+            name='xhour_mask',
+            field=models.CharField(blank=True, default='', max_length=80),
+        ),
+        migrations.RunPython(populate_schedule_masks, migrations.RunPython.noop),
+    ]
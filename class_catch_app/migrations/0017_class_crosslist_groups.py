@@ -0,0 +1,59 @@
+# Generated by Django 5.1.3 on 2026-10-17 18:45
+
+from django.db import migrations, models
+
+
+def populate_crosslist_groups(apps, schema_editor):
+    from class_catch_app.crosslists import GROUP_FIELDS, resolve_groups
+    Class = apps.get_model('class_catch_app', 'Class')
+    terms = Class.objects.order_by().values_list('term', flat=True).distinct()
+    for term in terms:
+        classes = Class.objects.filter(term=term, is_active=True)
+        resolved = resolve_groups(classes.values_list(
+            'pk', 'class_code', 'course_number', 'section', 'xlist', 'enrollment', 'limit'
+        ))
+        Class.objects.bulk_update([
+            Class(pk=pk, **dict(zip(GROUP_FIELDS, fields))) for pk, fields in resolved.items()
+        ], GROUP_FIELDS, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0016_class_schedule_masks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='xlist_group',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='class',
+            name='group_enrollment',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='class',
+            name='group_limit',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RemoveIndex(
+            model_name='class',
+            name='class_term_sync_idx',
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(fields=['term', 'class_code', 'course_number', 'section'], include=('id', 'fingerprint', 'enrollment', 'limit', 'status', 'instructor', 'xlist', 'is_active'), name='class_term_sync_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='class',
+            name='class_open_seats_idx',
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(condition=models.Q(('is_active', True), models.Q(('group_enrollment__lt', models.F('group_limit')), ('group_limit', 0), _connector='OR')), fields=['term', 'id'], name='class_open_seats_idx'),
+        ),
+        migrations.RunPython(populate_crosslist_groups, migrations.RunPython.noop),
+    ]
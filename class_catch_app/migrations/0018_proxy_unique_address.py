@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+def remove_duplicate_proxies(apps, schema_editor):
+    Proxy = apps.get_model('class_catch_app', 'Proxy')
+    seen = set()
+    duplicates = []
+    for pk, ip, port in Proxy.objects.order_by('pk').values_list('pk', 'ip', 'port').iterator():
+        if (ip, port) in seen:
+            duplicates.append(pk)
+        else:
+            seen.add((ip, port))
+    Proxy.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0017_class_crosslist_groups'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_proxies, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='proxy',
+            name='proxy_ip_port_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='proxy',
+            constraint=models.UniqueConstraint(fields=('ip', 'port'), name='proxy_ip_port_uniq'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-17 22:05
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def record_vanished_points(apps, schema_editor):
+    """Close the history of sections that vanished before terminal points were written."""
+    Class = apps.get_model('class_catch_app', 'Class')
+    EnrollmentSnapshot = apps.get_model('class_catch_app', 'EnrollmentSnapshot')
+    latest = EnrollmentSnapshot.objects.filter(section_id=OuterRef('pk')).order_by('-recorded_at')
+    sections = Class.objects.filter(is_active=False).annotate(
+        last_recorded_at=Subquery(latest.values('recorded_at')[:1]),
+        last_status=Subquery(latest.values('status')[:1]),
+    ).exclude(last_recorded_at=None).exclude(last_status='Vanished')
+    EnrollmentSnapshot.objects.bulk_create([
+        EnrollmentSnapshot(
+            section_id=pk, term=term, class_code=class_code, enrollment=0, limit=0, status='Vanished',
+            # the section was marked inactive no earlier than its last point
+            recorded_at=max(last_updated, last_recorded_at),
+        )
+        for pk, term, class_code, last_updated, last_recorded_at in sections.values_list(
+            'pk', 'term', 'class_code', 'last_updated', 'last_recorded_at'
+        ).iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0018_proxy_unique_address'),
+    ]
+
+    operations = [
+        migrations.RunPython(record_vanished_points, migrations.RunPython.noop),
+    ]
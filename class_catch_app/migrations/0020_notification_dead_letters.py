@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-17 22:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0019_enrollment_vanished_points'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxcursor',
+            name='gap_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='FailedNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('emails', models.JSONField(default=list)),
+                ('status_code', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+                ('retryable', models.BooleanField(default=False)),
+                ('attempts', models.PositiveIntegerField(default=1)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='failed_notifications', to='class_catch_app.classchangeevent')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('retryable', True)), fields=['next_attempt_at'], name='failed_notification_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-17 22:50
+
+from django.db import migrations
+
+
+def recompute_schedule_masks(apps, schema_editor):
+    # the evening x-hours of the standard periods were decoded as morning times
+    from class_catch_app.schedule import encode_mask, period_masks
+    Class = apps.get_model('class_catch_app', 'Class')
+    classes = []
+    for cls in Class.objects.only('period_code', 'period', 'schedule_mask', 'xhour_mask').iterator():
+        masks = tuple(encode_mask(mask) for mask in period_masks(cls.period_code, cls.period))
+        if masks != (cls.schedule_mask, cls.xhour_mask):
+            cls.schedule_mask, cls.xhour_mask = masks
+            classes.append(cls)
+    Class.objects.bulk_update(classes, ['schedule_mask', 'xhour_mask'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('class_catch_app', '0020_notification_dead_letters'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_schedule_masks, migrations.RunPython.noop),
+    ]
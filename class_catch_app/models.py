@@ -1,5 +1,10 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
+from django.db.models import F, Q
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 class Class(models.Model):
     class_code = models.CharField(max_length=10)
@@ -18,14 +23,199 @@ class Class(models.Model):
     text = models.CharField(max_length=255, blank=True, null=True)
     xlist = models.CharField(max_length=255, blank=True, null=True)
     crn = models.CharField(max_length=20, blank=True, null=True)
+    # weekly quarter-hour bitmasks of the class meetings and x-hour, as hex (see schedule.py)
+    schedule_mask = models.CharField(max_length=80, blank=True, default='')
+    xhour_mask = models.CharField(max_length=80, blank=True, default='')
+    # cross-list group (lowest pk among the sections sharing a seat pool) and its pooled seats
+    xlist_group = models.BigIntegerField(null=True, blank=True, db_index=True)
+    group_enrollment = models.IntegerField(null=True, blank=True)
+    group_limit = models.IntegerField(null=True, blank=True)
+    # hash of the scraped fields, used to skip rewriting unchanged rows
+    fingerprint = models.CharField(max_length=32, blank=True, default='')
+    # false once a scrape of the term no longer lists the section
+    is_active = models.BooleanField(default=True)
+    # weighted full-text vector, refreshed by class_sync after each bulk write (PostgreSQL only)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
     last_updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('class_code', 'course_number', 'section', 'term')
+        indexes = [
+            GinIndex(fields=['search_vector'], name='class_search_vector_gin'),
+            GinIndex(fields=['title'], name='class_title_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['instructor'], name='class_instructor_trgm', opclasses=['gin_trgm_ops']),
+            # scrape diff index (class_sync.load_fingerprint_index), answered from the index alone
+            models.Index(
+                fields=['term', 'class_code', 'course_number', 'section'], name='class_term_sync_idx',
+                include=['id', 'fingerprint', 'enrollment', 'limit', 'status', 'instructor', 'xlist', 'is_active'],
+            ),
+            # API lists: active sections of a term in id (cursor) order, optionally by subject
+            models.Index(fields=['term', 'id'], name='class_active_term_idx', condition=Q(is_active=True)),
+            models.Index(F('term'), Upper('class_code'), name='class_active_subject_idx', condition=Q(is_active=True)),
+            models.Index(
+                fields=['term', 'id'], name='class_open_seats_idx',
+                condition=Q(is_active=True) & (Q(group_enrollment__lt=F('group_limit')) | Q(group_limit=0)),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.class_code} {self.course_number} {self.section} ({self.term})"
 
+class ClassAggregate(models.Model):
+    """
+    Per-term summary of the active sections of one department and distrib,
+    rebuilt for the departments a scrape changed. Department and distrib
+    totals are sums over these rows.
+    """
+    term = models.CharField(max_length=50)
+    class_code = models.CharField(max_length=10)
+    distrib = models.CharField(max_length=50, blank=True, default='')
+    sections = models.PositiveIntegerField(default=0)
+    open_sections = models.PositiveIntegerField(default=0)
+    enrollment = models.PositiveIntegerField(default=0)
+    # sums over capped sections only (a limit of 0 means uncapped), for fill rates
+    capacity = models.PositiveIntegerField(default=0)
+    capped_enrollment = models.PositiveIntegerField(default=0)
+    oversubscribed_sections = models.PositiveIntegerField(default=0)
+    # the most oversubscribed sections, as [class_code, course_number, section, title, enrollment, limit]
+    top_oversubscribed = models.JSONField(default=list)
+    updated = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('term', 'class_code', 'distrib')
+
+    def __str__(self):
+        return f"{self.class_code} {self.distrib or '-'} ({self.term}): {self.sections} sections"
+
+class ClassChangeEvent(models.Model):
+    """
+    Outbox of changes detected by a scrape, written in the same transaction as
+    the class rows. Consumers read it in id order.
+    """
+    SEAT_OPENED = 'seat_opened'
+    SEAT_FILLED = 'seat_filled'
+    LIMIT_CHANGED = 'limit_changed'
+    INSTRUCTOR_CHANGED = 'instructor_changed'
+    SECTION_ADDED = 'section_added'
+    SECTION_REMOVED = 'section_removed'
+    EVENT_TYPE_CHOICES = [
+        (SEAT_OPENED, 'Seat opened'),
+        (SEAT_FILLED, 'Seat filled'),
+        (LIMIT_CHANGED, 'Limit changed'),
+        (INSTRUCTOR_CHANGED, 'Instructor changed'),
+        (SECTION_ADDED, 'Section added'),
+        (SECTION_REMOVED, 'Section removed'),
+    ]
+
+    section = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='change_events')
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES)
+    # denormalized so consumers can route events without loading the class
+    term = models.CharField(max_length=50)
+    class_code = models.CharField(max_length=10)
+    course_number = models.CharField(max_length=10)
+    section_number = models.CharField(max_length=10, blank=True, null=True)
+    # old/new values plus the enrollment and limit at the time of the event
+    data = models.JSONField(default=dict)
+    created = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'event_type', 'id']),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.event_type} {self.class_code} {self.course_number} {self.section_number} ({self.term})"
+
+class Watch(models.Model):
+    """A subscription to changes of one section, looked up by class key when events fan out."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='watches')
+    email = models.EmailField()
+    class_code = models.CharField(max_length=10)
+    course_number = models.CharField(max_length=10)
+    section = models.CharField(max_length=10, blank=True, null=True)
+    term = models.CharField(max_length=50)
+    # ClassChangeEvent types to notify about, comma separated
+    event_types = models.CharField(max_length=255, default='seat_opened')
+    is_active = models.BooleanField(default=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('email', 'class_code', 'course_number', 'section', 'term')
+        indexes = [
+            models.Index(fields=['term', 'class_code', 'course_number', 'section']),
+        ]
+
+    def __str__(self):
+        return f"{self.email}: {self.class_code} {self.course_number} {self.section} ({self.term})"
+
+class OutboxCursor(models.Model):
+    """How far a named consumer has read the ClassChangeEvent outbox."""
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    # when the id gap right after last_event_id was first seen (see change_events.consumable)
+    gap_seen_at = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
+
+class FailedNotification(models.Model):
+    """
+    A batch of an event's notifications the provider did not accept. The
+    outbox cursor moves on regardless; retryable batches are re-sent with
+    backoff until they succeed or run out of attempts.
+    """
+    event = models.ForeignKey(ClassChangeEvent, on_delete=models.CASCADE, related_name='failed_notifications')
+    emails = models.JSONField(default=list)
+    status_code = models.PositiveIntegerField(null=True, blank=True)  # None when the provider was unreachable
+    error = models.CharField(max_length=255, blank=True, default='')
+    retryable = models.BooleanField(default=False)
+    attempts = models.PositiveIntegerField(default=1)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='failed_notification_due_idx',
+                         condition=Q(retryable=True)),
+        ]
+
+    def __str__(self):
+        return f"event #{self.event_id}: {len(self.emails)} recipients ({self.error})"
+
+class EnrollmentSnapshot(models.Model):
+    """
+    Append-only enrollment history. A point is only written when a section's
+    (enrollment, limit, status) changes, so each point holds until the next
+    one: unchanged periods are never stored.
+    """
+    RAW = 'raw'
+    HOURLY = 'hour'
+    DAILY = 'day'
+    RESOLUTION_CHOICES = [(RAW, 'Raw'), (HOURLY, 'Hourly'), (DAILY, 'Daily')]
+    # status of the point written when a section stops being listed
+    VANISHED = 'Vanished'
+
+    section = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='enrollment_history')
+    # denormalized from the section so department curves don't need a join
+    term = models.CharField(max_length=50)
+    class_code = models.CharField(max_length=10)
+    recorded_at = models.DateTimeField()
+    enrollment = models.IntegerField()
+    limit = models.IntegerField()
+    status = models.CharField(max_length=50, blank=True, null=True)
+    resolution = models.CharField(max_length=4, choices=RESOLUTION_CHOICES, default=RAW)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['section', 'recorded_at']),
+            models.Index(fields=['term', 'class_code', 'recorded_at']),
+            models.Index(fields=['resolution', 'recorded_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.section_id} @ {self.recorded_at}: {self.enrollment}/{self.limit}"
+
 class Proxy(models.Model):
     ip = models.GenericIPAddressField()
     port = models.PositiveIntegerField()
@@ -38,5 +228,164 @@ class Proxy(models.Model):
     is_working_selenium = models.BooleanField(default=False)
     last_verified_selenium = models.DateTimeField(null=True, blank=True)
 
+    # rolling statistics from verification checks and real scrape attempts
+    latency_ewma = models.FloatField(null=True, blank=True)  # seconds
+    success_rate = models.FloatField(default=0.5)  # EWMA of successes, starts neutral
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    bytes_per_sec = models.FloatField(null=True, blank=True)
+    last_error = models.CharField(max_length=100, blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    last_attempt = models.DateTimeField(null=True, blank=True)
+
+    # circuit breaker: open (skipped) until circuit_open_until, then half-open for one probe
+    circuit_open_until = models.DateTimeField(null=True, blank=True)
+    circuit_trips = models.PositiveIntegerField(default=0)
+
+    # weight of the newest observation in the EWMAs
+    EWMA_ALPHA = 0.3
+    # a proxy is only marked not working after this many failures in a row
+    MAX_CONSECUTIVE_FAILURES = 3
+    # latency assumed for proxies that have never completed a request
+    DEFAULT_LATENCY = 5.0
+    # first circuit cooldown, doubled each time a half-open probe fails
+    CIRCUIT_COOLDOWN = timezone.timedelta(minutes=2)
+    MAX_CIRCUIT_COOLDOWN = timezone.timedelta(hours=1)
+
+    STATS_FIELDS = [
+        'latency_ewma', 'success_rate', 'consecutive_failures', 'bytes_per_sec',
+        'last_error', 'attempts', 'last_attempt', 'circuit_open_until', 'circuit_trips',
+    ]
+
+    class Meta:
+        indexes = [
+            # ProxyManager.rank_proxies: recently verified working proxies, per kind
+            models.Index(fields=['last_verified_requests'], name='proxy_working_requests_idx',
+                         condition=Q(is_working_requests=True)),
+            models.Index(fields=['last_verified_selenium'], name='proxy_working_selenium_idx',
+                         condition=Q(is_working_selenium=True)),
+            # proxy health service: circuits due a half-open probe
+            models.Index(fields=['circuit_open_until'], name='proxy_circuit_idx',
+                         condition=Q(circuit_open_until__isnull=False)),
+        ]
+        constraints = [
+            # one row per address, so verification outcomes can be upserted
+            models.UniqueConstraint(fields=['ip', 'port'], name='proxy_ip_port_uniq'),
+        ]
+
     def __str__(self):
         return f"{self.ip}:{self.port}"
+
+    def record_attempt(self, kind, success, latency=None, nbytes=None, error=''):
+        """
+        Fold one observation into the rolling stats and the `kind` ('requests' or
+        'selenium') working flag. Does not save; returns the fields to update.
+        """
+        alpha = self.EWMA_ALPHA
+        now = timezone.now()
+        self.attempts += 1
+        self.last_attempt = now
+        self.success_rate = (1 - alpha) * self.success_rate + alpha * (1.0 if success else 0.0)
+        if latency is not None:
+            self.latency_ewma = latency if self.latency_ewma is None else (
+                (1 - alpha) * self.latency_ewma + alpha * latency
+            )
+        if nbytes and latency:
+            rate = nbytes / latency
+            self.bytes_per_sec = rate if self.bytes_per_sec is None else (
+                (1 - alpha) * self.bytes_per_sec + alpha * rate
+            )
+
+        if success:
+            self.consecutive_failures = 0
+            self.last_error = ''
+            self.circuit_open_until = None
+            self.circuit_trips = 0
+            setattr(self, f'is_working_{kind}', True)
+            setattr(self, f'last_verified_{kind}', now)
+        else:
+            self.consecutive_failures += 1
+            self.last_error = (error or 'Error')[:100]
+            # decay instead of dropping the proxy on a single bad data point
+            if self.consecutive_failures >= self.MAX_CONSECUTIVE_FAILURES:
+                setattr(self, f'is_working_{kind}', False)
+                self.trip_circuit(now)
+
+        return self.STATS_FIELDS + [f'is_working_{kind}', f'last_verified_{kind}']
+
+    def trip_circuit(self, now):
+        """Open the circuit, or re-open it for longer after a failed half-open probe."""
+        self.circuit_trips += 1
+        cooldown = min(self.CIRCUIT_COOLDOWN * 2 ** (self.circuit_trips - 1), self.MAX_CIRCUIT_COOLDOWN)
+        self.circuit_open_until = now + cooldown
+
+    def circuit_state(self, now=None):
+        """'closed', 'open' (skip it) or 'half_open' (cooldown over, due one trial probe)."""
+        if self.circuit_open_until is None:
+            return 'closed'
+        return 'open' if self.circuit_open_until > (now or timezone.now()) else 'half_open'
+
+    def score(self):
+        """Expected useful throughput: success rate per second of latency, halved per recent failure."""
+        latency = self.latency_ewma if self.latency_ewma is not None else self.DEFAULT_LATENCY
+        return self.success_rate / (1.0 + latency) * 0.5 ** self.consecutive_failures
+
+class ScrapeState(models.Model):
+    """Per-term record of the last successfully applied timetable payload."""
+    term = models.CharField(max_length=50, unique=True)
+    payload_digest = models.CharField(max_length=64, blank=True, default='')
+    # HTTP validators from the last 200 response, sent back as conditional headers
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=64, blank=True, default='')
+    last_success = models.DateTimeField(null=True, blank=True)
+    last_checked = models.DateTimeField(null=True, blank=True)
+    # duration of the last unsharded fetch, the baseline for sharded-mode speedup
+    single_fetch_seconds = models.FloatField(null=True, blank=True)
+    # bumped whenever a scrape changes the term's classes; API ETags derive from it
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.term} ({self.payload_digest[:12]})"
+
+class ScraperSession(models.Model):
+    """
+    Cookies and hidden form fields collected by one browser visit, replayed by
+    the plain requests path until they expire.
+    """
+    proxy = models.CharField(max_length=64, blank=True, default='')  # ip:port the session was made through
+    user_agent = models.CharField(max_length=512, blank=True, default='')
+    cookies = models.JSONField(default=dict)
+    form_fields = models.JSONField(default=dict)
+    created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.proxy or 'direct'} (expires {self.expires_at})"
+
+    @classmethod
+    def current(cls):
+        """The newest unexpired session, if any."""
+        return cls.objects.filter(expires_at__gt=timezone.now()).order_by('-created').first()
+
+class BlacklistedProxy(models.Model):
+    """
+    Negative cache of proxies that recently failed verification. Each repeat
+    failure doubles how long the proxy is skipped, up to MAX_TTL.
+    """
+    ip = models.GenericIPAddressField()
+    port = models.PositiveIntegerField()
+    failures = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=100, blank=True, default='')
+    expires_at = models.DateTimeField(db_index=True)
+
+    BASE_TTL = timezone.timedelta(hours=1)
+    MAX_TTL = timezone.timedelta(days=7)
+
+    class Meta:
+        unique_together = ('ip', 'port')
+
+    def __str__(self):
+        return f"{self.ip}:{self.port} (x{self.failures}, until {self.expires_at})"
+
+    @classmethod
+    def ttl(cls, failures):
+        return min(cls.BASE_TTL * 2 ** max(failures - 1, 0), cls.MAX_TTL)
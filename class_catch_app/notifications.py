@@ -0,0 +1,246 @@
+import concurrent.futures
+import logging
+import random
+import threading
+import time
+from urllib.error import URLError
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from python_http_client.exceptions import HTTPError
+from sendgrid import SendGridAPIClient
+from class_catch_app.change_events import consumable
+from class_catch_app.models import ClassChangeEvent, FailedNotification, OutboxCursor, Watch
+
+# logging
+logger = logging.getLogger(__name__)
+
+
+def is_retryable(status):
+    # rate limited or a provider error; any other 4xx will fail the same way again
+    return status == 429 or status >= 500
+
+SUBJECTS = {
+    ClassChangeEvent.SEAT_OPENED: "A seat opened in {name}",
+    ClassChangeEvent.SEAT_FILLED: "{name} is now full",
+    ClassChangeEvent.LIMIT_CHANGED: "The enrollment limit of {name} changed",
+    ClassChangeEvent.INSTRUCTOR_CHANGED: "The instructor of {name} changed",
+    ClassChangeEvent.SECTION_ADDED: "{name} is listed in the timetable",
+    ClassChangeEvent.SECTION_REMOVED: "{name} was removed from the timetable",
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` calls per second, bursting up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SendFailed(Exception):
+    """Raised when a batch could not be delivered to the provider."""
+
+    def __init__(self, message, status_code=None, retryable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+
+class NotificationDispatcher:
+    """
+    Consumes the ClassChangeEvent outbox and emails the watchers of each event.
+
+    Recipients of an event are found with one indexed Watch lookup and sent
+    as batches of personalizations, one provider call per batch, from a
+    bounded thread pool behind a shared token bucket. Transient errors (429,
+    5xx, network) are retried with backoff; batches that still fail are kept
+    as FailedNotification rows, so one bad batch never holds the outbox cursor
+    back. Failures that may succeed later are re-sent by `retry_failed` up to
+    `max_attempts` times.
+    """
+    CURSOR_NAME = 'notifications'
+
+    def __init__(self, client=None, batch_size=None, workers=None, rate=None, max_retries=5, backoff=0.5,
+                 from_email=None, max_attempts=None, retry_delay=None):
+        self.client = client or SendGridAPIClient(
+            api_key=settings.SENDGRID_API_KEY,
+            host=getattr(settings, 'SENDGRID_API_HOST', 'https://api.sendgrid.com'),
+        )
+        self.batch_size = batch_size or getattr(settings, 'NOTIFICATION_BATCH_SIZE', 1000)
+        self.bucket = TokenBucket(rate or getattr(settings, 'NOTIFICATION_RATE_LIMIT', 10))
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers or getattr(settings, 'NOTIFICATION_WORKERS', 4)
+        )
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.from_email = from_email or settings.DEFAULT_FROM_EMAIL
+        self.max_attempts = max_attempts or getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+        self.retry_delay = timezone.timedelta(
+            seconds=retry_delay if retry_delay is not None else getattr(settings, 'NOTIFICATION_RETRY_DELAY', 60)
+        )
+        self.stats = {'events': 0, 'recipients': 0, 'calls': 0, 'retries': 0, 'failures': 0, 'redelivered': 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, stat, n=1):
+        with self.stats_lock:
+            self.stats[stat] += n
+
+    def recipients(self, event):
+        """Emails watching the event's section for this event type."""
+        watches = Watch.objects.filter(
+            term=event.term,
+            class_code=event.class_code,
+            course_number=event.course_number,
+            section=event.section_number,
+            is_active=True,
+        ).values_list('email', 'event_types')
+        return [email for email, event_types in watches if event.event_type in event_types.split(',')]
+
+    def build_message(self, event, emails):
+        name = f"{event.class_code} {event.course_number}"
+        if event.section_number:
+            name += f" section {event.section_number}"
+        data = event.data
+        lines = [f"{name} ({event.term}): {event.get_event_type_display().lower()}."]
+        if 'enrollment' in data and 'limit' in data:
+            lines.append(f"Enrollment is now {data['enrollment']}/{data['limit']}.")
+        if 'old' in data and 'new' in data:
+            lines.append(f"Changed from {data['old']} to {data['new']}.")
+        return {
+            # one personalization per recipient, so watchers don't see each other
+            'personalizations': [{'to': [{'email': email}]} for email in emails],
+            'from': {'email': self.from_email},
+            'subject': SUBJECTS.get(event.event_type, "Update for {name}").format(name=name),
+            'content': [{'type': 'text/plain', 'value': '\n'.join(lines)}],
+        }
+
+    def send_batch(self, message):
+        """One provider call, retried with exponential backoff and jitter on transient errors."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                self.count('calls')
+                self.client.client.mail.send.post(request_body=message)
+                return len(message['personalizations'])
+            except HTTPError as e:
+                status = getattr(e, 'status_code', None)
+                retryable = status is not None and is_retryable(status)
+                if not retryable or attempt == self.max_retries:
+                    raise SendFailed(f"Provider returned HTTP {status}", status, retryable) from e
+            except (URLError, OSError) as e:
+                if attempt == self.max_retries:
+                    raise SendFailed(f"Provider unreachable: {e}", retryable=True) from e
+            self.count('retries')
+            time.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+    def dispatch_pending(self, limit=500):
+        """
+        Send the notifications of up to `limit` events past the cursor.
+        Returns the number of events the cursor moved over.
+        """
+        cursor, _ = OutboxCursor.objects.get_or_create(name=self.CURSOR_NAME)
+        now = timezone.now()
+        events = list(ClassChangeEvent.objects.filter(id__gt=cursor.last_event_id).order_by('id')[:limit])
+        # an id gap may be a scrape that hasn't committed yet: wait for it before reading past
+        count, gap_seen_at = consumable([event.pk for event in events], cursor.last_event_id, cursor.gap_seen_at, now)
+        events = events[:count]
+
+        # fan out every event first so batches of different events send concurrently
+        futures = []
+        for event in events:
+            emails = self.recipients(event)
+            self.count('recipients', len(emails))
+            futures.append((event, [
+                (batch, self.executor.submit(self.send_batch, self.build_message(event, batch)))
+                for batch in (emails[i:i + self.batch_size] for i in range(0, len(emails), self.batch_size))
+            ]))
+
+        failed = []
+        for event, batches in futures:
+            for emails, future in batches:
+                try:
+                    future.result()
+                except SendFailed as e:
+                    logger.error("Notifying watchers of event %s failed: %s", event.pk, e)
+                    self.count('failures')
+                    failed.append(FailedNotification(
+                        event=event, emails=emails, status_code=e.status_code, error=str(e)[:255],
+                        retryable=e.retryable, next_attempt_at=now + self.retry_delay if e.retryable else None,
+                    ))
+            self.count('events')
+
+        if events or gap_seen_at != cursor.gap_seen_at:
+            with transaction.atomic():
+                FailedNotification.objects.bulk_create(failed)
+                if events:
+                    cursor.last_event_id = events[-1].pk
+                cursor.gap_seen_at = gap_seen_at
+                cursor.save(update_fields=['last_event_id', 'gap_seen_at', 'updated'])
+        return len(events)
+
+    def retry_failed(self, limit=100):
+        """
+        Re-send up to `limit` retryable failed batches that are due, backing off
+        exponentially between attempts. Returns the number delivered.
+        """
+        now = timezone.now()
+        due = list(
+            FailedNotification.objects.filter(retryable=True, next_attempt_at__lte=now)
+            .select_related('event').order_by('next_attempt_at')[:limit]
+        )
+        futures = [
+            (failed, self.executor.submit(self.send_batch, self.build_message(failed.event, failed.emails)))
+            for failed in due
+        ]
+
+        delivered = []
+        still_failing = []
+        for failed, future in futures:
+            try:
+                future.result()
+                delivered.append(failed.pk)
+            except SendFailed as e:
+                failed.attempts += 1
+                failed.status_code = e.status_code
+                failed.error = str(e)[:255]
+                failed.retryable = e.retryable and failed.attempts < self.max_attempts
+                failed.next_attempt_at = (
+                    now + self.retry_delay * 2 ** (failed.attempts - 1) if failed.retryable else None
+                )
+                still_failing.append(failed)
+                if not failed.retryable:
+                    logger.error("Giving up on notifying watchers of event %s: %s", failed.event_id, e)
+
+        with transaction.atomic():
+            FailedNotification.objects.filter(pk__in=delivered).delete()
+            FailedNotification.objects.bulk_update(
+                still_failing, ['attempts', 'status_code', 'error', 'retryable', 'next_attempt_at']
+            )
+        self.count('redelivered', len(delivered))
+        return len(delivered)
+
+    def summary(self):
+        return (
+            f"{self.stats['events']} events, {self.stats['recipients']} recipients, "
+            f"{self.stats['calls']} provider calls, {self.stats['retries']} retries, "
+            f"{self.stats['failures']} failed batches, {self.stats['redelivered']} redelivered"
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=True)
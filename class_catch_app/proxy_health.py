@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import statistics
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from class_catch_app.models import Proxy
+from class_catch_app.proxy_manager import ProxyManager, ProxyOutcomeBuffer
+
+# logging
+logger = logging.getLogger(__name__)
+
+
+class ProxyHealthService:
+    """
+    Long-running asyncio service that keeps a pool of verified proxies warm.
+
+    Each tick it re-probes the pool members that are due (well-scoring proxies
+    less often, weak ones more often), gives half-open circuits their trial
+    probe, and refills from the proxy sources in the background whenever the
+    healthy pool drops below `low_watermark`. Results land in the Proxy table,
+    where the scraper's `rank_proxies()` reads them without waiting on checks.
+    """
+
+    def __init__(self, target_size=20, low_watermark=10, probe_interval=300, selenium_probe_interval=1800,
+                 concurrency=8, tick=5.0, refill_cooldown=60, max_trips=5, report_interval=60):
+        self.target_size = target_size
+        self.low_watermark = min(low_watermark, target_size)
+        self.probe_interval = probe_interval
+        self.selenium_probe_interval = selenium_probe_interval
+        self.concurrency = concurrency
+        self.tick = tick
+        self.refill_cooldown = refill_cooldown
+        self.max_trips = max_trips
+        self.report_interval = report_interval
+
+        # probe outcomes are buffered and flushed once per tick
+        self.prober = ProxyManager()
+        self.prober.outcome_buffer = ProxyOutcomeBuffer()
+        self.in_flight = set()
+        self.tasks = set()
+        self.refill_task = None
+        self.last_refill = None
+        self.last_report = None
+        self.healthy = 0
+        self.stats = {'probes': 0, 'refills': 0}
+
+    def load_members(self):
+        """Pool members: working proxies, best first, plus circuits due a trial probe."""
+        now = timezone.now()
+        working = Proxy.objects.filter(
+            Q(is_working_requests=True) | Q(is_working_selenium=True)
+        ).exclude(circuit_open_until__isnull=False)
+        half_open = Proxy.objects.filter(circuit_open_until__lte=now, circuit_trips__lt=self.max_trips)
+
+        members = sorted(working, key=lambda proxy: proxy.score(), reverse=True)
+        # keep some spares beyond the target so a failing member has a warm replacement
+        return members[:self.target_size * 2] + list(half_open)
+
+    def urgency(self, proxy, now, median_score):
+        """How overdue a probe is; >= 1 means due. Higher scores stretch the interval."""
+        if proxy.circuit_state(now) == 'half_open':
+            return float('inf')
+        if proxy.last_attempt is None:
+            return float('inf')
+        weight = min(max(proxy.score() / median_score, 0.25), 4.0) if median_score else 1.0
+        age = (now - proxy.last_attempt).total_seconds()
+        return age / (self.probe_interval * weight)
+
+    def probe_kinds(self, proxy, now):
+        """
+        Checks for a due proxy: only the kinds it currently works for, since every
+        failed check counts towards the proxy's one circuit. Browser checks of a
+        proxy that also works for requests wait for `selenium_probe_interval`.
+        """
+        kinds = ['requests'] if proxy.is_working_requests else []
+        if proxy.is_working_selenium and (
+            not kinds
+            or proxy.last_verified_selenium is None
+            or (now - proxy.last_verified_selenium).total_seconds() >= self.selenium_probe_interval
+        ):
+            kinds.append('selenium')
+        if not kinds:
+            # a half-open circuit that took both flags down: trial the kind that worked last
+            selenium_last = proxy.last_verified_selenium is not None and (
+                proxy.last_verified_requests is None or proxy.last_verified_selenium > proxy.last_verified_requests
+            )
+            kinds = ['selenium' if selenium_last else 'requests']
+        return kinds
+
+    async def probe(self, proxy, kinds):
+        proxy_info = {'ip': proxy.ip, 'port': proxy.port}
+        try:
+            async with self.probe_slots:
+                for kind in kinds:
+                    check = getattr(self.prober, f'verify_proxy_on_target_{kind}')
+                    await asyncio.to_thread(check, proxy_info)
+                    self.stats['probes'] += 1
+        except Exception as e:
+            logger.warning("Probing %s failed: %s", proxy, e)
+        finally:
+            self.in_flight.discard(proxy.pk)
+
+    def refill(self, deficit):
+        """Fetch fresh candidates and run them through the verification funnel (blocking)."""
+        try:
+            manager = ProxyManager()
+            # only a fraction of candidates pass the funnel, so over-fetch
+            manager.fetch_proxies(limit=deficit * 4)
+            if manager.proxies:
+                manager.verify_proxies()
+        finally:
+            connection.close()
+
+    async def tick_once(self):
+        # flush before loading so finished probes aren't scheduled again off stale rows
+        await sync_to_async(self.prober.outcome_buffer.flush)()
+        now = timezone.now()
+        members = await sync_to_async(self.load_members)()
+
+        healthy = [proxy for proxy in members if proxy.circuit_state(now) == 'closed']
+        self.healthy = len(healthy)
+        median_score = statistics.median(proxy.score() for proxy in healthy) if healthy else 0
+
+        due = [
+            (self.urgency(proxy, now, median_score), proxy)
+            for proxy in members if proxy.pk not in self.in_flight
+        ]
+        due.sort(key=lambda item: item[0], reverse=True)
+        for urgency, proxy in due:
+            if urgency < 1:
+                break
+            self.in_flight.add(proxy.pk)
+            task = asyncio.create_task(self.probe(proxy, self.probe_kinds(proxy, now)))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        refill_idle = self.refill_task is None or self.refill_task.done()
+        cooled_down = self.last_refill is None or (now - self.last_refill).total_seconds() >= self.refill_cooldown
+        if self.healthy < self.low_watermark and refill_idle and cooled_down:
+            deficit = self.target_size - self.healthy
+            logger.info("Healthy pool at %d/%d, refilling %d...", self.healthy, self.target_size, deficit)
+            self.last_refill = now
+            self.stats['refills'] += 1
+            self.refill_task = asyncio.create_task(asyncio.to_thread(self.refill, deficit))
+
+        # the verified lists only matter for one-shot refreshes
+        self.prober.requests_verified_proxies.clear()
+        self.prober.selenium_verified_proxies.clear()
+
+        if self.last_report is None or (now - self.last_report).total_seconds() >= self.report_interval:
+            self.last_report = now
+            logger.info(self.summary())
+
+    def summary(self):
+        return (
+            f"{self.healthy}/{self.target_size} healthy proxies, {len(self.in_flight)} probes in flight, "
+            f"{self.stats['probes']} probes and {self.stats['refills']} refills so far"
+        )
+
+    async def run(self, stop_event):
+        """Tick until `stop_event` is set, then let in-flight probes finish."""
+        self.probe_slots = asyncio.Semaphore(self.concurrency)
+        while not stop_event.is_set():
+            try:
+                await self.tick_once()
+            except Exception:
+                logger.exception("Proxy health tick failed")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.tick)
+            except asyncio.TimeoutError:
+                pass
+
+        pending = list(self.tasks) + ([self.refill_task] if self.refill_task else [])
+        await asyncio.gather(*pending, return_exceptions=True)
+        await sync_to_async(self.prober.outcome_buffer.flush)()
@@ -1,25 +1,120 @@
-import requests
 import concurrent.futures
+import math
 import socket
-import re
 from class_catch_app.models import Proxy
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 import threading
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from fake_useragent import UserAgent
+from class_catch_app.driver_pool import get_driver_pool
+from class_catch_app import http_transport
+from class_catch_app.proxy_sources import ProxyBlacklist, default_sources, fetch_from_sources
 import time
 import logging
 
 # logging
 logger = logging.getLogger(__name__)
 
+
+def describe_error(e):
+    """Short error class for Proxy.last_error."""
+    return f"{type(e).__name__}: {e}"[:100]
+
+
+class ProxyOutcomeBuffer:
+    """
+    Verification outcomes collected in memory and written back as one bulk
+    upsert per batch instead of a get_or_create round-trip per check.
+    """
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.outcomes = []
+        self.flushes = 0
+
+    def __len__(self):
+        with self.lock:
+            return len(self.outcomes)
+
+    def add(self, ip, port, kind, success, latency=None, nbytes=None, error=''):
+        with self.lock:
+            self.outcomes.append((ip, int(port), kind, success, latency, nbytes, error))
+
+    @property
+    def full(self):
+        return len(self) >= self.batch_size
+
+    def flush(self):
+        """
+        Apply the buffered outcomes in order; returns the number written. If the
+        write fails the outcomes go back to the front of the buffer.
+        """
+        with self.lock:
+            outcomes, self.outcomes = self.outcomes, []
+        if not outcomes:
+            return 0
+        try:
+            self.write(outcomes)
+        except BaseException:
+            with self.lock:
+                self.outcomes[:0] = outcomes
+            raise
+        self.flushes += 1
+        return len(outcomes)
+
+    def write(self, outcomes):
+        keys = {(ip, port) for ip, port, *_ in outcomes}
+        with transaction.atomic():
+            existing = {}
+            candidates = Proxy.objects.select_for_update().filter(
+                ip__in={ip for ip, _ in keys}, port__in={port for _, port in keys}
+            )
+            for proxy in candidates:
+                key = (proxy.ip, proxy.port)
+                if key in keys:
+                    existing[key] = proxy
+
+            to_create = {}
+            touched = set()
+            update_fields = set()
+            for ip, port, kind, success, latency, nbytes, error in outcomes:
+                key = (ip, port)
+                proxy = existing.get(key) or to_create.get(key)
+                if proxy is None:
+                    proxy = to_create[key] = Proxy(ip=ip, port=port)
+                update_fields.update(
+                    proxy.record_attempt(kind, success, latency=latency, nbytes=nbytes, error=error)
+                )
+                touched.add(key)
+
+            if to_create:
+                # a proxy another writer added since the select takes these outcomes' stats
+                Proxy.objects.bulk_create(
+                    to_create.values(), update_conflicts=True, unique_fields=['ip', 'port'],
+                    update_fields=sorted(update_fields),
+                )
+            to_update = [proxy for key, proxy in existing.items() if key in touched]
+            if to_update:
+                Proxy.objects.bulk_update(to_update, sorted(update_fields))
+
+
 class ProxyManager:
+    # concurrent checks per funnel stage
+    STAGE_WORKERS = {'test_url': 10, 'requests': 5, 'selenium': 5}
+    # verification outcomes written per bulk upsert
+    OUTCOME_BATCH_SIZE = 100
+    # first funnel stage: any page that answers through the proxy
+    TEST_URL = 'https://httpbin.org/ip'
+
     def __init__(self):
         self.proxies = []
         self.lock = threading.Lock()
         self.requests_verified_proxies = []
         self.selenium_verified_proxies = []
+        # set while verify_proxies runs, so outcomes are batched instead of written one by one
+        self.outcome_buffer = None
+        self.blacklist = ProxyBlacklist()
 
     def validate_ip(self, ip):
         try:
@@ -35,59 +130,32 @@ class ProxyManager:
         return False
 
     def get_random_headers(self):
-        ua = UserAgent()
         headers = {
-            'User-Agent': ua.random,
+            'User-Agent': http_transport.user_agents.next(),
         }
         return headers
 
-    def fetch_proxies(self, limit=5, protocol='http', timeout=5000, country='all', ssl='yes', anonymity='elite'):
-        """Fetch proxies from the ProxyScrape API with specified criteria."""
-        url = 'https://api.proxyscrape.com/v2/'
-        params = {
-            'request': 'getproxies',
-            'protocol': protocol,
-            'timeout': timeout,
-            'country': country,
-            'ssl': ssl,
-            'anonymity': anonymity
-        }
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code == 200:
-                proxy_text = response.text.strip()
-                for line in proxy_text.split('\n'):
-                    if len(self.proxies) >= limit:
-                        break
-                    line = line.strip()
-                    if re.match(r'^\d+\.\d+\.\d+\.\d+:\d+$', line):
-                        ip, port = line.split(':')
-                        if self.validate_ip(ip) and self.validate_port(port):
-                            self.proxies.append({'ip': ip, 'port': int(port)})
-                if not self.proxies and ssl == 'yes':
-                    print(f"No proxies found with ssl='{ssl}'. Trying ssl='no'.")
-                    self.fetch_proxies(
-                        limit=limit,
-                        protocol=protocol,
-                        timeout=timeout,
-                        country=country,
-                        ssl='no',
-                        anonymity=anonymity
-                    )
-                elif not self.proxies and ssl == 'no':
-                    print(f"No proxies found with ssl='{ssl}'. Trying ssl='all'.")
-                    self.fetch_proxies(
-                        limit=limit,
-                        protocol=protocol,
-                        timeout=timeout,
-                        country=country,
-                        ssl='all',
-                        anonymity=anonymity
-                    )
-            else:
-                print(f"Error fetching proxies: Status code {response.status_code}")
-        except Exception as e:
-            print(f"Error fetching proxies: {e}")
+    def fetch_proxies(self, limit=5, protocol='http', timeout=5000, country='all', ssl='yes', anonymity='elite',
+                      sources=None):
+        """
+        Fetch candidate proxies from all sources concurrently, de-duplicated and
+        minus the ones still blacklisted after a recent failure.
+        """
+        if sources is None:
+            sources = default_sources(protocol, timeout, country, ssl, anonymity)
+        fetched = fetch_from_sources(sources)
+
+        self.blacklist = ProxyBlacklist.load()
+        known = {(proxy['ip'], proxy['port']) for proxy in self.proxies}
+        candidates = [proxy for proxy in self.blacklist.filter(fetched) if proxy not in known]
+        print(f"Fetched {len(fetched)} proxies from {len(sources)} sources, "
+              f"skipped {len(fetched) - len(candidates)} blacklisted or duplicate")
+
+        for ip, port in candidates:
+            if len(self.proxies) >= limit:
+                break
+            if self.validate_ip(ip) and self.validate_port(port):
+                self.proxies.append({'ip': ip, 'port': int(port)})
 
     def verify_proxy_on_test_url(self, proxy_info):
         """First-level proxy verification using a general test URL."""
@@ -95,18 +163,12 @@ class ProxyManager:
         port = proxy_info['port']
         proxy = f"{ip}:{port}"
         try:
-            test_url = 'https://httpbin.org/ip'
-            proxies = {
-                'http': f'http://{proxy}',
-                'https': f'http://{proxy}',
-            }
             headers = self.get_random_headers()
-            response = requests.get(
-                test_url,
-                proxies=proxies,
+            response = http_transport.get(
+                self.TEST_URL,
+                proxy=proxy,
                 headers=headers,
-                timeout=10,
-                verify=False
+                timeout=10
             )
             if response.status_code == 200:
                 return True
@@ -120,12 +182,9 @@ class ProxyManager:
         ip = proxy_info['ip']
         port = proxy_info['port']
         proxy = f"{ip}:{port}"
+        start_time = time.time()
         try:
             test_url = 'https://oracle-www.dartmouth.edu/dart/groucho/timetable.display_courses'
-            proxies = {
-                'http': f'http://{proxy}',
-                'https': f'http://{proxy}',
-            }
             headers = self.get_random_headers()
             headers["Referer"] = "https://oracle-www.dartmouth.edu/dart/groucho/timetable.subject_search"
 
@@ -135,45 +194,27 @@ class ProxyManager:
                 "terms": "202501",
             }
 
-            response = requests.post(
+            response = http_transport.post(
                 test_url,
+                proxy=proxy,
                 data=payload,
                 headers=headers,
-                proxies=proxies,
-                timeout=10,
-                verify=False
+                timeout=10
             )
+            latency = time.time() - start_time
 
             if response.status_code == 200 and "data-table" in response.text:
                 # Save or update the proxy in the database for requests
-                Proxy.objects.update_or_create(
-                    ip=ip,
-                    port=port,
-                    defaults={
-                        'last_verified_requests': timezone.now(),
-                        'is_working_requests': True
-                    }
-                )
+                self.record_outcome(ip, port, 'requests', True, latency=latency, nbytes=len(response.content))
                 with self.lock:
                     self.requests_verified_proxies.append(proxy)
                 return True
             else:
-                Proxy.objects.update_or_create(
-                    ip=ip,
-                    port=port,
-                    defaults={
-                        'is_working_requests': False
-                    }
-                )
+                error = f"HTTP {response.status_code}" if response.status_code != 200 else "No data-table"
+                self.record_outcome(ip, port, 'requests', False, latency=latency, error=error)
                 return False
-        except Exception:
-            Proxy.objects.update_or_create(
-                ip=ip,
-                port=port,
-                defaults={
-                    'is_working_requests': False
-                }
-            )
+        except Exception as e:
+            self.record_outcome(ip, port, 'requests', False, error=describe_error(e))
             return False
 
 
@@ -183,87 +224,127 @@ class ProxyManager:
         port = proxy_info['port']
         proxy = f"{ip}:{port}"
         try:
-            chrome_options = Options()
-            chrome_options.add_argument('--headless=new')
-            chrome_options.add_argument(f'--proxy-server={proxy}')
-            driver = webdriver.Chrome(options=chrome_options)
-            driver.set_page_load_timeout(10)
-            driver.get('https://oracle-www.dartmouth.edu/dart/groucho/timetable.main')
-            driver.quit()
+            # reuse a warm pooled browser, switched onto this proxy
+            with get_driver_pool().session(proxy, page_load_timeout=10) as driver:
+                start_time = time.time()
+                driver.get('https://oracle-www.dartmouth.edu/dart/groucho/timetable.main')
+                latency = time.time() - start_time
             # Save or update the proxy in the database for Selenium
-            Proxy.objects.update_or_create(
-                ip=ip,
-                port=port,
-                defaults={
-                    'last_verified_selenium': timezone.now(),
-                    'is_working_selenium': True
-                }
-            )
+            self.record_outcome(ip, port, 'selenium', True, latency=latency)
             with self.lock:
                 self.selenium_verified_proxies.append(proxy)
             return True
-        except Exception:
-            Proxy.objects.update_or_create(
-                ip=ip,
-                port=port,
-                defaults={
-                    'is_working_selenium': False
-                }
-            )
+        except Exception as e:
+            self.record_outcome(ip, port, 'selenium', False, error=describe_error(e))
             return False
 
+    def record_outcome(self, ip, port, kind, success, latency=None, nbytes=None, error=''):
+        """Fold the outcome of a verification or scrape attempt into the proxy's rolling stats."""
+        if self.outcome_buffer is not None:
+            self.outcome_buffer.add(ip, port, kind, success, latency=latency, nbytes=nbytes, error=error)
+            return None
+        with transaction.atomic():
+            proxy, _ = Proxy.objects.select_for_update().get_or_create(ip=ip, port=port)
+            update_fields = proxy.record_attempt(kind, success, latency=latency, nbytes=nbytes, error=error)
+            proxy.save(update_fields=update_fields)
+        return proxy
+
+    def rank_proxies(self, kind=None, max_age=timezone.timedelta(hours=1), exploration=0.1):
+        """
+        Proxies recently verified for `kind` ('requests', 'selenium' or None for
+        either), best first. Ranked by `Proxy.score()` plus a UCB-style bonus that
+        shrinks with the number of attempts, so untried proxies still get picked.
+        """
+        time_threshold = timezone.now() - max_age
+        query = Q()
+        for k in ([kind] if kind else ['requests', 'selenium']):
+            query |= Q(**{f'is_working_{k}': True, f'last_verified_{k}__gte': time_threshold})
+
+        # open circuits are cooling down after repeated failures
+        proxies = list(Proxy.objects.filter(query).exclude(circuit_open_until__gt=timezone.now()))
+        total_attempts = sum(proxy.attempts for proxy in proxies)
+
+        def ranking(proxy):
+            bonus = exploration * math.sqrt(math.log(total_attempts + 1) / (proxy.attempts + 1))
+            return proxy.score() + bonus
+
+        return sorted(proxies, key=ranking, reverse=True)
+
     def verify_proxies(self):
         """Verify proxies using the funnel system."""
-        # First-level verification on a general test URL
-        print("Starting first-level proxy verification...")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_proxy = {
-                executor.submit(self.verify_proxy_on_test_url, proxy): proxy
+        start_time = time.time()
+        try:
+            self.run_verification_funnel()
+        finally:
+            elapsed = time.time() - start_time
+            print(f"Verified {len(self.proxies)} candidate proxies in {elapsed:.2f}s "
+                  f"({len(self.proxies) / elapsed if elapsed else 0:.1f} proxies/sec)")
+
+    def run_verification_funnel(self):
+        """
+        Stream proxies through the funnel: each proxy moves on to the target
+        checks as soon as it passes the test URL, with a separate worker limit
+        per stage. Outcomes are buffered and flushed in bulk from this thread.
+        """
+        print("Starting pipelined proxy verification...")
+        self.outcome_buffer = ProxyOutcomeBuffer(batch_size=self.OUTCOME_BATCH_SIZE)
+        executors = {
+            stage: concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+            for stage, workers in self.STAGE_WORKERS.items()
+        }
+        passed = {'test_url': 0, 'requests': 0, 'selenium': 0}
+        # test URL outcomes feed the blacklist: dead proxies are skipped next time
+        dead = {}
+        alive = set()
+        try:
+            pending = {
+                executors['test_url'].submit(self.verify_proxy_on_test_url, proxy): ('test_url', proxy)
                 for proxy in self.proxies
             }
-            for future in concurrent.futures.as_completed(future_to_proxy):
-                proxy = future_to_proxy[future]
-                try:
-                    result = future.result()
-                    proxy['test_url_passed'] = result
-                except Exception as e:
-                    print(f"Error verifying proxy {proxy['ip']}:{proxy['port']} on test URL: {e}")
-                    proxy['test_url_passed'] = False
-
-        # Filter proxies that passed the first-level verification
-        verified_proxies = [proxy for proxy in self.proxies if proxy.get('test_url_passed')]
-
-        if not verified_proxies:
-            print("No proxies passed the first-level verification.")
-            return
-
-        # Second-level verification on the target URL for requests
-        print("Starting second-level proxy verification for requests...")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            executor.map(self.verify_proxy_on_target_requests, verified_proxies)
-
-        # Second-level verification on the target URL for Selenium
-        print("Starting second-level proxy verification for Selenium...")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            executor.map(self.verify_proxy_on_target_selenium, verified_proxies)
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, timeout=1.0, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    stage, proxy = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error verifying proxy {proxy['ip']}:{proxy['port']} ({stage}): {e}")
+                        result = False
+                    key = (proxy['ip'], proxy['port'])
+                    if not result:
+                        if stage == 'test_url':
+                            dead[key] = 'Test URL check failed'
+                        continue
+                    passed[stage] += 1
+                    if stage == 'test_url':
+                        alive.add(key)
+                        proxy['test_url_passed'] = True
+                        pending[executors['requests'].submit(self.verify_proxy_on_target_requests, proxy)] = ('requests', proxy)
+                        pending[executors['selenium'].submit(self.verify_proxy_on_target_selenium, proxy)] = ('selenium', proxy)
+
+                if self.outcome_buffer.full:
+                    self.outcome_buffer.flush()
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+            buffer, self.outcome_buffer = self.outcome_buffer, None
+            buffer.flush()
+            ProxyBlacklist.record_failures(dead)
+            ProxyBlacklist.clear(alive)
+
+        print(f"{passed['test_url']} passed the test URL, {passed['requests']} verified for requests, "
+              f"{passed['selenium']} verified for Selenium ({buffer.flushes} database flushes, "
+              f"{len(dead)} blacklisted)")
 
     def get_working_proxies_requests(self):
-        """Get proxies verified for requests within the last hour."""
-        one_hour_ago = timezone.now() - timezone.timedelta(hours=1)
-        working_proxies = Proxy.objects.filter(
-            is_working_requests=True,
-            last_verified_requests__gte=one_hour_ago
-        )
-        return [f"{proxy.ip}:{proxy.port}" for proxy in working_proxies]
+        """Get proxies verified for requests within the last hour, best first."""
+        return [f"{proxy.ip}:{proxy.port}" for proxy in self.rank_proxies('requests')]
 
     def get_working_proxies_selenium(self):
-        """Get proxies verified for Selenium within the last hour."""
-        one_hour_ago = timezone.now() - timezone.timedelta(hours=1)
-        working_proxies = Proxy.objects.filter(
-            is_working_selenium=True,
-            last_verified_selenium__gte=one_hour_ago
-        )
-        return [f"{proxy.ip}:{proxy.port}" for proxy in working_proxies]
+        """Get proxies verified for Selenium within the last hour, best first."""
+        return [f"{proxy.ip}:{proxy.port}" for proxy in self.rank_proxies('selenium')]
 
     def refresh_proxies(self):
         """Fetch and verify proxies."""
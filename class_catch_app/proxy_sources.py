@@ -0,0 +1,215 @@
+import concurrent.futures
+import ipaddress
+import logging
+import re
+from itertools import chain, zip_longest
+from django.db import transaction
+from django.utils import timezone
+from class_catch_app import http_transport
+from class_catch_app.models import BlacklistedProxy
+
+# logging
+logger = logging.getLogger(__name__)
+
+PROXY_LINE_RE = re.compile(r'^\s*(\d{1,3}(?:\.\d{1,3}){3}):(\d{1,5})\s*$', re.MULTILINE)
+
+
+def parse_proxy_list(text):
+    """(ip, port) pairs from a plain `ip:port` per line list, skipping invalid entries."""
+    proxies = []
+    for ip, port in PROXY_LINE_RE.findall(text):
+        port = int(port)
+        try:
+            ipaddress.IPv4Address(ip)
+        except ValueError:
+            continue
+        if 0 < port <= 65535:
+            proxies.append((ip, port))
+    return proxies
+
+
+class ProxySource:
+    """A provider of candidate proxies; subclasses implement `fetch()`."""
+    name = 'source'
+
+    def fetch(self):
+        raise NotImplementedError
+
+    def __str__(self):
+        return self.name
+
+
+class ProxyScrapeSource(ProxySource):
+    """The ProxyScrape API, relaxing the ssl filter when a query comes back empty."""
+    name = 'proxyscrape'
+    url = 'https://api.proxyscrape.com/v2/'
+    SSL_LADDER = ['yes', 'no', 'all']
+
+    def __init__(self, protocol='http', timeout=5000, country='all', ssl='yes', anonymity='elite'):
+        self.protocol = protocol
+        self.timeout = timeout
+        self.country = country
+        self.ssl = ssl
+        self.anonymity = anonymity
+
+    def fetch(self):
+        ladder = self.SSL_LADDER[self.SSL_LADDER.index(self.ssl):] if self.ssl in self.SSL_LADDER else [self.ssl]
+        for ssl in ladder:
+            params = {
+                'request': 'getproxies',
+                'protocol': self.protocol,
+                'timeout': self.timeout,
+                'country': self.country,
+                'ssl': ssl,
+                'anonymity': self.anonymity
+            }
+            response = http_transport.get(self.url, params=params, timeout=10)
+            response.raise_for_status()
+            proxies = parse_proxy_list(response.text)
+            if proxies:
+                return proxies
+            logger.info("No proxies found with ssl='%s'", ssl)
+        return []
+
+
+class PlainListSource(ProxySource):
+    """A published `ip:port` per line proxy list."""
+
+    def __init__(self, url, name=None):
+        self.url = url
+        self.name = name or url
+
+    def fetch(self):
+        response = http_transport.get(self.url, timeout=10)
+        response.raise_for_status()
+        return parse_proxy_list(response.text)
+
+
+DEFAULT_LIST_URLS = [
+    'https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/http.txt',
+    'https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/http.txt',
+]
+
+
+def default_sources(protocol='http', timeout=5000, country='all', ssl='yes', anonymity='elite', list_urls=None):
+    sources = [ProxyScrapeSource(protocol, timeout, country, ssl, anonymity)]
+    sources += [PlainListSource(url) for url in (DEFAULT_LIST_URLS if list_urls is None else list_urls)]
+    return sources
+
+
+def fetch_from_sources(sources):
+    """
+    Fetch every source concurrently and merge the results without duplicates.
+    Sources are interleaved so a limit applied later samples all of them.
+    """
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(sources), 1)) as executor:
+        future_to_source = {executor.submit(source.fetch): source for source in sources}
+        for future in concurrent.futures.as_completed(future_to_source):
+            source = future_to_source[future]
+            try:
+                results[source] = future.result()
+                logger.info("%s returned %d proxies", source, len(results[source]))
+            except Exception as e:
+                logger.warning("Fetching proxies from %s failed: %s", source, e)
+                results[source] = []
+
+    merged = []
+    seen = set()
+    interleaved = chain.from_iterable(zip_longest(*(results[source] for source in sources)))
+    for proxy in interleaved:
+        if proxy is not None and proxy not in seen:
+            seen.add(proxy)
+            merged.append(proxy)
+    return merged
+
+
+def pack_proxy(ip, port):
+    """An IPv4 proxy packed into a single int (address << 16 | port)."""
+    return int(ipaddress.IPv4Address(ip)) << 16 | int(port)
+
+
+class ProxyBlacklist:
+    """
+    In-memory view of the unexpired BlacklistedProxy rows, held as a set of
+    packed ints so membership checks stay cheap as the blacklist grows.
+    """
+
+    def __init__(self, packed=()):
+        self.packed = set(packed)
+
+    @classmethod
+    def load(cls):
+        rows = BlacklistedProxy.objects.filter(expires_at__gt=timezone.now()).values_list('ip', 'port')
+        packed = []
+        for ip, port in rows.iterator():
+            try:
+                packed.append(pack_proxy(ip, port))
+            except ValueError:
+                # not an IPv4 address, can't come back from the sources anyway
+                continue
+        return cls(packed)
+
+    def __len__(self):
+        return len(self.packed)
+
+    def __contains__(self, proxy):
+        ip, port = proxy
+        try:
+            return pack_proxy(ip, port) in self.packed
+        except ValueError:
+            return False
+
+    def filter(self, proxies):
+        return [proxy for proxy in proxies if proxy not in self]
+
+    @staticmethod
+    def record_failures(failures):
+        """
+        Blacklist (or extend the ban of) proxies that failed, given as
+        {(ip, port): error}. Returns the number of entries written.
+        """
+        if not failures:
+            return 0
+        now = timezone.now()
+        with transaction.atomic():
+            existing = {}
+            candidates = BlacklistedProxy.objects.select_for_update().filter(
+                ip__in={ip for ip, _ in failures}, port__in={port for _, port in failures}
+            )
+            for entry in candidates:
+                if (entry.ip, entry.port) in failures:
+                    existing[(entry.ip, entry.port)] = entry
+
+            to_create = []
+            for (ip, port), error in failures.items():
+                entry = existing.get((ip, port))
+                if entry is None:
+                    entry = BlacklistedProxy(ip=ip, port=port)
+                    to_create.append(entry)
+                entry.failures += 1
+                entry.last_error = (error or 'Error')[:100]
+                entry.expires_at = now + BlacklistedProxy.ttl(entry.failures)
+
+            if to_create:
+                BlacklistedProxy.objects.bulk_create(to_create)
+            if existing:
+                BlacklistedProxy.objects.bulk_update(
+                    existing.values(), ['failures', 'last_error', 'expires_at']
+                )
+        return len(failures)
+
+    @staticmethod
+    def clear(proxies):
+        """Forget the failure history of proxies that passed again."""
+        if not proxies:
+            return 0
+        ips = {ip for ip, _ in proxies}
+        ports = {port for _, port in proxies}
+        stale = [
+            pk for pk, ip, port in BlacklistedProxy.objects.filter(ip__in=ips, port__in=ports)
+            .values_list('pk', 'ip', 'port') if (ip, port) in proxies
+        ]
+        if stale:
+            BlacklistedProxy.objects.filter(pk__in=stale).delete()
+        return len(stale)
@@ -0,0 +1,399 @@
+import asyncio
+import json
+import logging
+import re
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from corsheaders.conf import conf as cors_conf
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from class_catch_app.change_events import consumable
+from class_catch_app.crosslists import crosslist_key
+from class_catch_app.models import ClassChangeEvent
+
+# logging
+logger = logging.getLogger(__name__)
+
+# outbox columns a published event is built from
+EVENT_FIELDS = ['id', 'event_type', 'term', 'class_code', 'course_number', 'section_number', 'data']
+# most events replayed to an SSE client resuming from Last-Event-ID
+REPLAY_LIMIT = 10000
+
+
+def section_topic(term, class_code, course_number, section):
+    # '001'/'01' and '1'/'1' name the same section, whichever way the timetable or the client writes them
+    class_code, course_number, section = crosslist_key(class_code, course_number, section)
+    return f'section:{term}:{class_code}:{course_number}:{section}'
+
+
+def department_topic(term, class_code):
+    return f'dept:{term}:{class_code.upper()}'
+
+
+def parse_topics(term, sections=(), departments=()):
+    """
+    Topics for a subscription to `sections` ('SUBJ:NUM:SEC' strings) and
+    `departments` (subject codes) of a term.
+    """
+    topics = set()
+    for spec in sections:
+        parts = spec.split(':')
+        if len(parts) == 3 and all(parts[:2]):
+            topics.add(section_topic(term, *parts))
+    for class_code in departments:
+        if class_code:
+            topics.add(department_topic(term, class_code))
+    return topics
+
+
+class Subscriber:
+    """
+    One connected client. Deltas for the same section that arrive before the
+    client reads them are coalesced into one message carrying the latest
+    values and every event type seen, in event id order.
+    """
+
+    def __init__(self, max_pending=1000):
+        self.topics = set()
+        self.pending = {}
+        self.max_pending = max_pending
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, key, delta):
+        queued = self.pending.get(key)
+        if queued is None:
+            if len(self.pending) >= self.max_pending:
+                # a client that stopped reading can't grow without bound
+                self.dropped += 1
+                return
+            self.pending[key] = dict(delta, events=[delta['event']])
+        elif delta.get('id', 0) < queued.get('id', 0):
+            # a replayed event behind one that already came in live keeps the newer values
+            queued['events'] = [delta['event']] + queued['events']
+        else:
+            events = queued['events'] + [delta['event']]
+            queued.update(delta)
+            queued['events'] = events
+        self.wakeup.set()
+
+    async def next_batch(self, timeout=None):
+        """Wait for coalesced deltas; an empty list on timeout."""
+        if not self.pending:
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        batch, self.pending = list(self.pending.values()), {}
+        return batch
+
+
+class Broker:
+    """In-process pub/sub with a topic -> subscribers index."""
+
+    def __init__(self):
+        self.index = {}
+        self.published = 0
+
+    @property
+    def subscriber_count(self):
+        return len({id(sub) for subs in self.index.values() for sub in subs})
+
+    def subscribe(self, subscriber, topics):
+        for topic in topics - subscriber.topics:
+            self.index.setdefault(topic, set()).add(subscriber)
+        subscriber.topics |= topics
+
+    def unsubscribe(self, subscriber, topics=None):
+        for topic in list(subscriber.topics if topics is None else topics):
+            subscribers = self.index.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.index[topic]
+            subscriber.topics.discard(topic)
+
+    def publish(self, topics, key, delta):
+        """Deliver `delta` once to every subscriber of any of `topics`."""
+        recipients = set()
+        for topic in topics:
+            recipients.update(self.index.get(topic, ()))
+        for subscriber in recipients:
+            subscriber.push(key, delta)
+        self.published += 1
+        return len(recipients)
+
+    def publish_event(self, event):
+        """Fan a ClassChangeEvent (or an equivalent dict) out to its section and department topics."""
+        topics, key, delta = event_message(event)
+        return self.publish(topics, key, delta)
+
+
+def event_message(event):
+    """(topics, coalescing key, delta) for a ClassChangeEvent or an equivalent dict."""
+    if not isinstance(event, dict):
+        event = {field: getattr(event, field) for field in EVENT_FIELDS}
+    key = (event['term'], event['class_code'], event['course_number'], event['section_number'])
+    delta = {
+        'id': event['id'],
+        'event': event['event_type'],
+        'term': event['term'],
+        'class_code': event['class_code'],
+        'course_number': event['course_number'],
+        'section': event['section_number'],
+        **{name: value for name, value in event['data'].items() if name in ('enrollment', 'limit')},
+    }
+    return [section_topic(*key), department_topic(event['term'], event['class_code'])], key, delta
+
+
+def replay_events(topics, after_id, upto_id, limit=REPLAY_LIMIT):
+    """
+    Outbox events in (`after_id`, `upto_id`] for any of `topics`, oldest
+    first, for a client resuming a stream. Only the newest `limit` are read.
+    """
+    subjects = Q(pk__in=[])
+    for topic in topics:
+        _, term, class_code, *_ = topic.split(':')
+        subjects |= Q(term=term, class_code=class_code)
+    events = ClassChangeEvent.objects.filter(subjects, id__gt=after_id, id__lte=upto_id).order_by('-id')
+    return [
+        event for event in reversed(list(events.values(*EVENT_FIELDS)[:limit]))
+        if topics.intersection(event_message(event)[0])
+    ]
+
+
+class OutboxPoller:
+    """
+    Feeds the broker from the ClassChangeEvent outbox. Events are visible once
+    the scrape's transaction commits, so each poll publishes what the last
+    commits produced, in id order, holding back at an id gap a concurrent
+    scrape may still fill (see `change_events.consumable`).
+    """
+
+    def __init__(self, broker, interval=1.0, batch_size=1000):
+        self.broker = broker
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_event_id = None
+        self.gap_seen_at = None
+        self.task = None
+
+    def latest_id(self):
+        event = ClassChangeEvent.objects.order_by('-id').values_list('id', flat=True).first()
+        return event or 0
+
+    def fetch(self):
+        """The next events that are safe to publish, and whether more may be waiting."""
+        events = list(
+            ClassChangeEvent.objects.filter(id__gt=self.last_event_id).order_by('id').values(
+                *EVENT_FIELDS
+            )[:self.batch_size]
+        )
+        count, self.gap_seen_at = consumable(
+            [event['id'] for event in events], self.last_event_id, self.gap_seen_at, timezone.now()
+        )
+        return events[:count], count == self.batch_size
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def position(self):
+        """The last published event id, starting from the newest event if the poller hasn't started."""
+        if self.last_event_id is None:
+            latest = await sync_to_async(self.latest_id)()
+            # an SSE client resuming a stream may have positioned the poller meanwhile
+            if self.last_event_id is None:
+                self.last_event_id = latest
+        return self.last_event_id
+
+    async def run(self):
+        # subscribers only get changes from the moment the stream starts
+        await self.position()
+        while True:
+            try:
+                events, more = await sync_to_async(self.fetch)()
+                for event in events:
+                    self.broker.publish_event(event)
+                    self.last_event_id = event['id']
+                if more:
+                    continue
+            except Exception:
+                logger.exception("Polling the change event outbox failed")
+            await asyncio.sleep(self.interval)
+
+
+broker = Broker()
+poller = OutboxPoller(broker, interval=getattr(settings, 'PUSH_POLL_INTERVAL', 1.0))
+
+
+def allowed_origin(origin):
+    """Whether a browser at `origin` may use the push endpoints, by the django-cors-headers settings."""
+    if not origin:
+        return False
+    return (
+        cors_conf.CORS_ALLOW_ALL_ORIGINS
+        or origin in cors_conf.CORS_ALLOWED_ORIGINS
+        or any(re.match(regex, origin) for regex in cors_conf.CORS_ALLOWED_ORIGIN_REGEXES)
+    )
+
+
+def request_header(scope, name):
+    for header, value in scope.get('headers', []):
+        if header == name:
+            return value.decode('latin-1')
+    return ''
+
+
+def cors_headers(scope, preflight=False):
+    """
+    CORS response headers for the raw ASGI endpoints, which don't pass
+    through CorsMiddleware.
+    """
+    headers = [(b'vary', b'origin')]
+    origin = request_header(scope, b'origin')
+    if not allowed_origin(origin):
+        return headers
+    headers.append((b'access-control-allow-origin', origin.encode('latin-1')))
+    if cors_conf.CORS_ALLOW_CREDENTIALS:
+        headers.append((b'access-control-allow-credentials', b'true'))
+    if preflight:
+        allow_headers = [*cors_conf.CORS_ALLOW_HEADERS, 'last-event-id']
+        headers += [
+            (b'access-control-allow-methods', b'GET, OPTIONS'),
+            (b'access-control-allow-headers', ', '.join(allow_headers).encode()),
+            (b'access-control-max-age', str(cors_conf.CORS_PREFLIGHT_MAX_AGE).encode()),
+        ]
+    return headers
+
+
+def last_event_id(scope):
+    """The Last-Event-ID an EventSource sends when it reconnects, or None."""
+    try:
+        return int(request_header(scope, b'last-event-id'))
+    except ValueError:
+        return None
+
+
+def subscription_from_query(query_string):
+    params = parse_qs(query_string.decode())
+    term = (params.get('term') or [''])[0]
+    sections = [spec for value in params.get('sections', []) for spec in value.split(',')]
+    departments = [code for value in params.get('departments', []) for code in value.split(',')]
+    return parse_topics(term, sections, departments) if term else set()
+
+
+async def sse_app(scope, receive, send, heartbeat=15.0):
+    """
+    Server-sent events: GET /api/stream/?term=202501&sections=COSC:1:01,...&departments=MATH
+    streams coalesced change deltas as `data:` JSON lines. A reconnecting
+    client's Last-Event-ID gets it the events it missed from the outbox first.
+    """
+    if scope.get('method') == 'OPTIONS':
+        await send({'type': 'http.response.start', 'status': 200, 'headers': cors_headers(scope, preflight=True)})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    topics = subscription_from_query(scope.get('query_string', b''))
+    if not topics:
+        await send({'type': 'http.response.start', 'status': 400,
+                    'headers': [(b'content-type', b'text/plain'), *cors_headers(scope)]})
+        await send({'type': 'http.response.body', 'body': b'term and sections or departments are required'})
+        return
+
+    subscriber = Subscriber()
+    broker.subscribe(subscriber, topics)
+    poller.start()
+    resume_from = last_event_id(scope)
+    if resume_from is not None:
+        # everything after the poller's position reaches the subscriber live
+        upto = await poller.position()
+        if resume_from < upto:
+            missed = await sync_to_async(replay_events)(topics, resume_from, upto)
+            for event in missed:
+                _, key, delta = event_message(event)
+                subscriber.push(key, delta)
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    disconnected = asyncio.ensure_future(wait_disconnect())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            *cors_headers(scope),
+        ]})
+        await send({'type': 'http.response.body', 'body': b': subscribed\n\n', 'more_body': True})
+        while not disconnected.done():
+            batch_task = asyncio.ensure_future(subscriber.next_batch(heartbeat))
+            await asyncio.wait([batch_task, disconnected], return_when=asyncio.FIRST_COMPLETED)
+            if not batch_task.done():
+                batch_task.cancel()
+                break
+            batch = batch_task.result()
+            body = ''.join(f"id: {delta['id']}\ndata: {json.dumps(delta)}\n\n" for delta in batch) or ': keep-alive\n\n'
+            await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+    except OSError:
+        pass
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(subscriber)
+
+
+async def websocket_app(scope, receive, send):
+    """
+    WebSocket at /ws/classes/: the client sends
+    {"term": ..., "sections": [...], "departments": [...], "action": "subscribe"|"unsubscribe"}
+    and receives JSON arrays of coalesced change deltas.
+    """
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    # browsers don't apply CORS to WebSockets, so check the origin here; other clients send none
+    origin = request_header(scope, b'origin')
+    if origin and not allowed_origin(origin):
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+    await send({'type': 'websocket.accept'})
+
+    subscriber = Subscriber()
+    topics = subscription_from_query(scope.get('query_string', b''))
+    if topics:
+        broker.subscribe(subscriber, topics)
+    poller.start()
+
+    async def read_messages():
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            try:
+                request = json.loads(message.get('text') or message.get('bytes') or '{}')
+                topics = parse_topics(
+                    request.get('term', ''), request.get('sections', []), request.get('departments', [])
+                )
+            except (ValueError, AttributeError, TypeError):
+                await send({'type': 'websocket.send', 'text': json.dumps({'error': 'invalid subscription'})})
+                continue
+            if request.get('action') == 'unsubscribe':
+                broker.unsubscribe(subscriber, topics)
+            else:
+                broker.subscribe(subscriber, topics)
+            await send({'type': 'websocket.send', 'text': json.dumps({'subscribed': sorted(subscriber.topics)})})
+
+    reader = asyncio.ensure_future(read_messages())
+    try:
+        while not reader.done():
+            batch_task = asyncio.ensure_future(subscriber.next_batch())
+            await asyncio.wait([batch_task, reader], return_when=asyncio.FIRST_COMPLETED)
+            if not batch_task.done():
+                batch_task.cancel()
+                break
+            await send({'type': 'websocket.send', 'text': json.dumps(batch_task.result())})
+    finally:
+        reader.cancel()
+        broker.unsubscribe(subscriber)
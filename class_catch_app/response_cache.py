@@ -0,0 +1,153 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from class_catch_app.data_version import get_data_version
+
+
+class LRUCache:
+    """Thread-safe in-process LRU bounded by entry count and total payload bytes."""
+
+    def __init__(self, max_entries=512, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self.lock:
+            blob = self.entries.get(key)
+            if blob is None:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return blob
+
+    def set(self, key, blob):
+        if len(blob) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self.entries[key] = blob
+            self.bytes += len(blob)
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def metrics(self):
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.bytes)
+
+
+class VersionedResponseCache:
+    """
+    Two-tier cache of API response data keyed by (term, normalized query
+    params, data version): an in-process LRU in front of Django's shared cache.
+
+    Entries never need explicit invalidation: a scrape that changes a term
+    bumps its data version, so new requests build new keys and old entries
+    age out. On a miss, one thread per process (single flight) and one
+    process across workers (a short shared lock) rebuild the entry while the
+    others wait briefly for it.
+    """
+
+    def __init__(self, local=None, timeout=3600, lock_timeout=10, wait_timeout=5, poll_interval=0.05):
+        self.local = local or LRUCache()
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+        self.stats = {'shared_hits': 0, 'computed': 0, 'waited': 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, stat):
+        with self.stats_lock:
+            self.stats[stat] += 1
+
+    def make_key(self, namespace, params, term=None, extra=''):
+        normalized = '&'.join(
+            f'{name}={value}' for name, values in sorted(params.lists()) for value in sorted(values)
+        )
+        digest = hashlib.blake2b(f'{normalized}|{extra}'.encode(), digest_size=16).hexdigest()
+        return f'class_catch:response:{namespace}:{term or "*"}:{get_data_version(term)}:{digest}'
+
+    def get_or_compute(self, key, compute):
+        """Cached data for `key`, computing it with `compute()` on a miss. Returns (data, source)."""
+        blob = self.local.get(key)
+        if blob is not None:
+            return pickle.loads(blob), 'local'
+
+        # single flight within the process
+        with self.inflight_lock:
+            key_lock = self.inflight.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                blob = self.local.get(key)
+                if blob is not None:
+                    return pickle.loads(blob), 'local'
+                data, source = self.fetch_shared(key, compute)
+                return data, source
+            finally:
+                with self.inflight_lock:
+                    self.inflight.pop(key, None)
+
+    def fetch_shared(self, key, compute):
+        blob = shared_cache.get(key)
+        if blob is not None:
+            self.count('shared_hits')
+            self.local.set(key, blob)
+            return pickle.loads(blob), 'shared'
+
+        lock_key = f'{key}:lock'
+        if not shared_cache.add(lock_key, 1, timeout=self.lock_timeout):
+            # another worker is rebuilding this entry, give it a moment
+            self.count('waited')
+            deadline = time.monotonic() + self.wait_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                blob = shared_cache.get(key)
+                if blob is not None:
+                    self.count('shared_hits')
+                    self.local.set(key, blob)
+                    return pickle.loads(blob), 'shared'
+            lock_key = None
+
+        try:
+            data = compute()
+            blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            shared_cache.set(key, blob, timeout=self.timeout)
+            self.local.set(key, blob)
+            self.count('computed')
+            return data, 'miss'
+        finally:
+            if lock_key:
+                shared_cache.delete(lock_key)
+
+    def metrics(self):
+        with self.stats_lock:
+            return dict(self.stats, **{f'local_{name}': value for name, value in self.local.metrics().items()})
+
+
+response_cache = VersionedResponseCache(
+    local=LRUCache(
+        max_entries=getattr(settings, 'RESPONSE_CACHE_MAX_ENTRIES', 512),
+        max_bytes=getattr(settings, 'RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+    ),
+    timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 3600),
+)
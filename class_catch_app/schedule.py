@@ -0,0 +1,159 @@
+import re
+import threading
+from collections import defaultdict
+from django.db.models import BooleanField, ExpressionWrapper
+from class_catch_app.crosslists import HAS_ROOM
+from class_catch_app.data_version import get_data_version
+from class_catch_app.models import Class
+
+# weekly grid: Monday to Friday, 64 quarter hours a day from 7:00 to 23:00
+DAYS = 'MTWRF'
+DAY_START = 7 * 60
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 64
+MASK_HEX_WIDTH = len(DAYS) * SLOTS_PER_DAY // 4
+
+DAY_RE = re.compile(r'Th|Tu|Su|Sa|M|T|W|R|F|S|U')
+DAY_ALIASES = {'Tu': 'T', 'Th': 'R'}
+MEETING_RE = re.compile(
+    r'([MTWRFSU][uha]?(?:[MTWRFSU][uha]?)*)\s+(\d{1,2}):(\d{2})\s*([ap])?\.?m?\.?\s*-\s*(\d{1,2}):(\d{2})\s*([ap])?',
+    re.IGNORECASE,
+)
+
+# Dartmouth's standard periods in 24-hour times: (class meetings, x-hour)
+PERIODS = {
+    '8': ('MTThF 7:45-8:35', ''),
+    '9L': ('MWF 8:50-9:55', 'Th 9:05-9:55'),
+    '9S': ('MTThF 9:05-9:55', ''),
+    '10': ('MWF 10:10-11:15', 'Th 12:15-13:05'),
+    '10A': ('TTh 10:10-12:00', 'W 15:30-16:20'),
+    '11': ('MWF 11:30-12:35', 'Tu 12:15-13:05'),
+    '12': ('MWF 12:50-13:55', 'Tu 13:20-14:10'),
+    '2': ('MWF 14:10-15:15', 'Th 13:20-14:10'),
+    '2A': ('TTh 14:25-16:15', 'W 16:35-17:25'),
+    '3A': ('MW 15:30-17:20', 'Tu 16:30-17:20'),
+    '3B': ('TTh 16:30-18:20', 'F 15:30-16:20'),
+    '6A': ('MTh 18:30-20:20', 'Tu 18:30-19:20'),
+    '6B': ('W 18:30-21:30', 'Tu 19:30-20:20'),
+}
+
+
+def to_minutes(hour, minute, meridiem='', twelve_hour=True):
+    hour = int(hour)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    # the timetable's own times rarely have am/pm: 1 to 6 o'clock is in the afternoon
+    elif twelve_hour and 1 <= hour <= 6:
+        hour += 12
+    return hour * 60 + int(minute)
+
+
+def meetings_mask(text, twelve_hour=True):
+    """
+    Bitmask of the weekday quarter hours touched by meetings like
+    'MWF 10:10-11:15'. Times are read as the timetable prints them, in 12-hour
+    time with an optional am/pm, unless `twelve_hour` is False.
+    """
+    mask = 0
+    for days, start_hour, start_minute, start_meridiem, end_hour, end_minute, end_meridiem in \
+            MEETING_RE.findall(text or ''):
+        # a bare start takes the end's am/pm when it would not come after it ('6:30-9:30pm')
+        if end_meridiem and not start_meridiem and to_minutes(start_hour, start_minute, end_meridiem) \
+                < to_minutes(end_hour, end_minute, end_meridiem):
+            start_meridiem = end_meridiem
+        start = to_minutes(start_hour, start_minute, start_meridiem, twelve_hour)
+        end = to_minutes(end_hour, end_minute, end_meridiem, twelve_hour)
+        if twelve_hour and end <= start:
+            end += 12 * 60
+        first = max((start - DAY_START) // SLOT_MINUTES, 0)
+        last = min(-(-(end - DAY_START) // SLOT_MINUTES), SLOTS_PER_DAY)
+        if last <= first:
+            continue
+        slots = ((1 << (last - first)) - 1) << first
+        for day in DAY_RE.findall(days):
+            day = DAY_ALIASES.get(day, day)
+            if day in DAYS:
+                mask |= slots << (DAYS.index(day) * SLOTS_PER_DAY)
+    return mask
+
+
+def period_masks(period_code, period=''):
+    """
+    (meetings, x-hour) bitmasks of a section, from the meeting times in
+    `period` when it has any, else from the standard period `period_code`.
+    Both are 0 for arranged or unknown periods.
+    """
+    meetings, xhour = PERIODS.get((period_code or '').strip().upper(), ('', ''))
+    return meetings_mask(period) or meetings_mask(meetings, twelve_hour=False), meetings_mask(xhour, twelve_hour=False)
+
+
+def encode_mask(mask):
+    """Fixed-width hex for the database; '' for no known meetings."""
+    return format(mask, f'0{MASK_HEX_WIDTH}x') if mask else ''
+
+
+def decode_mask(value):
+    return int(value, 16) if value else 0
+
+
+class ScheduleIndex:
+    """
+    Active sections of one term grouped by schedule. Sections mostly follow a
+    handful of standard periods, so a conflict check tests each distinct mask
+    once instead of every section.
+    """
+
+    def __init__(self, rows):
+        # (meetings, x-hour) mask -> [(pk, has_room)]
+        self.groups = defaultdict(list)
+        self.crns = {}
+        for pk, crn, schedule_mask, xhour_mask, has_room in rows:
+            masks = (decode_mask(schedule_mask), decode_mask(xhour_mask))
+            self.groups[masks].append((pk, has_room))
+            if crn:
+                self.crns[crn] = masks
+
+    @classmethod
+    def load(cls, term):
+        return cls(
+            Class.objects.filter(term=term, is_active=True).annotate(
+                has_room=ExpressionWrapper(HAS_ROOM, output_field=BooleanField())
+            ).values_list('pk', 'crn', 'schedule_mask', 'xhour_mask', 'has_room').iterator()
+        )
+
+    def busy_mask(self, crns, xhours=False):
+        """Union of the slots taken by the sections with these CRNs; unknown CRNs are skipped."""
+        busy = 0
+        for crn in crns:
+            meetings, xhour = self.crns.get(crn, (0, 0))
+            busy |= meetings | (xhour if xhours else 0)
+        return busy
+
+    def compatible(self, busy, xhours=False, open_only=True):
+        """
+        Pks of the sections that don't meet during `busy`, and with `open_only`
+        whose seat pool has room; sections without known times always fit.
+        """
+        pks = []
+        for (meetings, xhour), sections in self.groups.items():
+            if (meetings | (xhour if xhours else 0)) & busy:
+                continue
+            pks.extend(pk for pk, has_room in sections if has_room or not open_only)
+        return pks
+
+
+indexes = {}
+indexes_lock = threading.Lock()
+
+
+def schedule_index(term):
+    """The term's ScheduleIndex, rebuilt when the term's data version moves."""
+    version = get_data_version(term)
+    with indexes_lock:
+        cached = indexes.get(term)
+    if cached and cached[0] == version:
+        return cached[1]
+    index = ScheduleIndex.load(term)
+    with indexes_lock:
+        indexes[term] = (version, index)
+    return index
@@ -0,0 +1,103 @@
+import re
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from class_catch_app.models import Class
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+# the fields search_vector() reads
+SEARCH_FIELDS = {'class_code', 'course_number', 'title', 'instructor', 'text'}
+# text search configurations used in search_vector(); queries are built in each of them
+SEARCH_CONFIGS = ['simple', 'english']
+
+
+def search_vector():
+    """Weighted vector over the searchable fields: codes and titles first, then instructors, then notes."""
+    return (
+        SearchVector('class_code', 'course_number', weight='A', config='simple')
+        + SearchVector('title', weight='A', config='english')
+        + SearchVector('instructor', weight='B', config='simple')
+        + SearchVector('text', weight='C', config='english')
+    )
+
+
+def search_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def refresh_search_vectors(pks, batch_size=1000):
+    """Recompute the search vector of the given classes (after bulk writes, which skip it)."""
+    if not search_enabled():
+        return 0
+    pks = list(pks)
+    for start in range(0, len(pks), batch_size):
+        Class.objects.filter(pk__in=pks[start:start + batch_size]).update(search_vector=search_vector())
+    return len(pks)
+
+
+def prefix_query(text):
+    """
+    A tsquery matching every word of `text` as a prefix ('calc' finds
+    'calculus'). The words are parsed in each configuration of the vector, so
+    'introduction' finds the stemmed 'introduct' of an English-indexed title,
+    English stopwords are dropped, and codes and names still match unstemmed.
+    """
+    tokens = TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return None
+    raw = ' & '.join(f'{token}:*' for token in tokens)
+    query = None
+    for config in SEARCH_CONFIGS:
+        parsed = SearchQuery(raw, search_type='raw', config=config)
+        query = parsed if query is None else query | parsed
+    return query
+
+
+def is_text_query(text):
+    """
+    Whether `text` is worth a full-text search: it has a word with letters.
+    Bare numbers (terms, CRNs, course numbers) are better matched on their
+    own fields.
+    """
+    return any(not token.isdigit() for token in TOKEN_RE.findall(text))
+
+
+def filter_search(queryset, text):
+    """
+    Restrict `queryset` to classes matching `text`, without ordering. On
+    PostgreSQL this is served by the GIN indexes: prefix full-text matches on
+    the search vector, or trigram word similarity on titles and instructors
+    so typos still match. Other databases fall back to icontains.
+    """
+    text = text.strip()
+    if not text:
+        return queryset.none()
+    if not search_enabled():
+        return queryset.filter(
+            Q(class_code__icontains=text) | Q(course_number__icontains=text)
+            | Q(title__icontains=text) | Q(instructor__icontains=text)
+        )
+    matches = Q(title__trigram_word_similar=text) | Q(instructor__trigram_word_similar=text)
+    query = prefix_query(text)
+    if query is not None:
+        matches |= Q(search_vector=query)
+    return queryset.filter(matches)
+
+
+def search_classes(text, queryset=None, limit=50):
+    """Classes matching `text` (see `filter_search`), best first."""
+    queryset = filter_search(Class.objects.all() if queryset is None else queryset, text)
+    if not search_enabled():
+        return queryset.order_by('class_code', 'course_number', 'section')[:limit]
+
+    text = text.strip()
+    rank = Greatest(TrigramWordSimilarity(text, 'title'), TrigramWordSimilarity(text, 'instructor'))
+    query = prefix_query(text)
+    if query is not None:
+        rank = rank + SearchRank(F('search_vector'), query)
+    return queryset.annotate(rank=rank).order_by('-rank', 'class_code', 'course_number', 'section')[:limit]
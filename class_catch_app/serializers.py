@@ -0,0 +1,16 @@
+from rest_framework import serializers
+from .models import Class
+
+# fields exposed by the class API, also used for the list projection
+CLASS_FIELDS = (
+    'id', 'class_code', 'course_number', 'section', 'title', 'instructor', 'term', 'limit',
+    'enrollment', 'distrib', 'world_culture', 'period', 'period_code', 'status', 'text',
+    'xlist', 'crn', 'xlist_group', 'group_enrollment', 'group_limit', 'is_active', 'last_updated',
+)
+
+
+class ClassSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Class
+        fields = CLASS_FIELDS
+        read_only_fields = CLASS_FIELDS
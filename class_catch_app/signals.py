@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from class_catch_app.data_version import bump_all_data_versions, bump_data_version
+from class_catch_app.models import Class
+from class_catch_app.search import SEARCH_FIELDS, refresh_search_vectors
+
+# Scrapes bump the data version themselves; these cover the other writers.
+
+
+@receiver([post_save, post_delete], sender=Class)
+def class_changed(sender, instance, **kwargs):
+    """Single-object writes, e.g. edits in the admin."""
+    bump_data_version(instance.term)
+
+
+@receiver(post_save, sender=Class)
+def refresh_search_vector(sender, instance, update_fields=None, **kwargs):
+    """The search vector is computed in the database, so saves leave it stale."""
+    if update_fields is None or SEARCH_FIELDS.intersection(update_fields):
+        refresh_search_vectors([instance.pk])
+
+
+def migrated(sender, **kwargs):
+    """Migrations may have backfilled or rewritten class data."""
+    bump_all_data_versions()
@@ -0,0 +1,92 @@
+from django.db import connection
+from class_catch_app.models import Class
+
+STAGING_TABLE = 'class_staging'
+# columns loaded through the staging table: the scraped and derived fields plus the fingerprint
+STAGED_FIELDS = (
+    'class_code', 'course_number', 'section', 'title', 'instructor', 'term', 'limit',
+    'enrollment', 'distrib', 'world_culture', 'period', 'period_code', 'status', 'text',
+    'xlist', 'crn', 'schedule_mask', 'xhour_mask', 'fingerprint',
+)
+CONFLICT_FIELDS = ('class_code', 'course_number', 'section', 'term')
+
+# COPY text format: backslash first so the other escapes aren't doubled
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).translate(COPY_ESCAPES)
+
+
+class CopyStream:
+    """
+    Read-only file over COPY text lines for `rows` (Class instances), built as
+    COPY asks for data so the whole load is never held as one string.
+    """
+
+    def __init__(self, rows):
+        self.lines = (
+            '\t'.join(copy_value(getattr(row, field)) for field in STAGED_FIELDS) + '\n'
+            for row in rows
+        )
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def column(field_name):
+    return connection.ops.quote_name(Class._meta.get_field(field_name).column)
+
+
+def merge_classes(rows, now):
+    """
+    Write new and changed classes with COPY into a temporary staging table and
+    one INSERT ... ON CONFLICT DO UPDATE into the class table, instead of
+    bulk_create plus bulk_update's per-column CASE WHEN statements. Conflicting
+    rows are only rewritten if their fingerprint differs or they were inactive.
+
+    Must run inside a transaction (the staging table is dropped on commit).
+    Returns {(class_code, course_number, section): pk} of the rows written.
+    """
+    quote = connection.ops.quote_name
+    table = quote(Class._meta.db_table)
+    staging = quote(STAGING_TABLE)
+    staged = ', '.join(column(field) for field in STAGED_FIELDS)
+    updated = [field for field in STAGED_FIELDS if field not in CONFLICT_FIELDS]
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {staging}')
+        # same column types as the class table, none of its constraints or indexes
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS '
+            f'SELECT {staged} FROM {table} WITH NO DATA'
+        )
+        cursor.copy_expert(f'COPY {staging} ({staged}) FROM STDIN', CopyStream(rows))
+        cursor.execute(
+            f'INSERT INTO {table} ({staged}, {column("is_active")}, {column("last_updated")}) '
+            f'SELECT {staged}, TRUE, %s FROM {staging} '
+            f'ON CONFLICT ({", ".join(column(field) for field in CONFLICT_FIELDS)}) DO UPDATE SET '
+            + ', '.join(f'{column(field)} = EXCLUDED.{column(field)}' for field in updated)
+            + f', {column("is_active")} = TRUE, {column("last_updated")} = EXCLUDED.{column("last_updated")} '
+            f'WHERE {table}.{column("fingerprint")} IS DISTINCT FROM EXCLUDED.{column("fingerprint")} '
+            f'OR NOT {table}.{column("is_active")} '
+            f'RETURNING {column("id")}, {column("class_code")}, {column("course_number")}, {column("section")}',
+            [now],
+        )
+        return {(class_code, course_number, section): pk for pk, class_code, course_number, section in cursor.fetchall()}
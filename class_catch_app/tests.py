@@ -1,3 +1,1979 @@
-from django.test import TestCase
+import asyncio
+import json
+from io import StringIO
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock, skipUnless
+from asgiref.sync import sync_to_async
+from django.contrib.admin.sites import site as admin_site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from selenium.common.exceptions import (
+    InvalidSessionIdException, SessionNotCreatedException, TimeoutException, WebDriverException,
+)
+from sendgrid import SendGridAPIClient
+from . import push
+from .aggregates import refresh_aggregates, term_aggregates
+from .change_events import consumable, diff_events, seat_event
+from .class_sync import SyncResult, class_data_from_row, class_fingerprint, fingerprint_index_rows, sync_classes
+from .crosslists import parse_xlist, resolve_groups
+from .data_version import bump_data_version, get_data_version
+from .driver_pool import DriverPool, is_blocked
+from .enrollment_history import department_fill_curve
+from .http_transport import SessionPool
+from .management.commands import scrape_classes
+from .filters import ClassFilter
+from .models import (
+    BlacklistedProxy, Class, ClassAggregate, ClassChangeEvent, EnrollmentSnapshot, FailedNotification, OutboxCursor,
+    Proxy, ScrapeState, ScraperSession, Watch,
+)
+from .notifications import NotificationDispatcher
+from .proxy_health import ProxyHealthService
+from .proxy_manager import ProxyManager, ProxyOutcomeBuffer
+from .proxy_sources import ProxyBlacklist, ProxySource, fetch_from_sources, pack_proxy, parse_proxy_list
+from .response_cache import response_cache
+from .schedule import (
+    DAY_START, DAYS, PERIODS, SLOT_MINUTES, SLOTS_PER_DAY, indexes as schedule_indexes, meetings_mask, period_masks,
+)
+from .search import is_text_query, prefix_query, search_classes
+from .staging_merge import merge_classes
+from .timetable_parser import (
+    TimetableNotFound, iter_timetable_rows, iter_timetable_rows_bs4, parse_subjects, read_timetable,
+)
 
-# Create your tests here.
+TEST_DATA = Path(__file__).resolve().parent / 'test_data'
+
+
+@skipUnless(connection.vendor == 'postgresql', 'query plans are PostgreSQL specific')
+class HotQueryPlanTests(TestCase):
+    """
+    The hot Class and Proxy queries must stay servable by an index. Sequential
+    scans are disabled so the plan shows whether an index can answer the query
+    at all, whatever the size of the test tables.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        Class.objects.bulk_create([
+            Class(
+                class_code=subject, course_number=f'{number:03d}', section='01', title='Title',
+                term='202509', limit=40, enrollment=number % 41, is_active=number % 5 != 0,
+            )
+            for subject in ('COSC', 'MATH', 'PHYS')
+            for number in range(60)
+        ])
+        Proxy.objects.bulk_create([
+            Proxy(
+                ip=f'10.0.0.{i}', port=8080, is_working_requests=i % 2 == 0, last_verified_requests=now,
+                is_working_selenium=i % 3 == 0, last_verified_selenium=now,
+                circuit_open_until=now if i % 7 == 0 else None,
+            )
+            for i in range(60)
+        ])
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE class_catch_app_class')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan)
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def test_sharded_scrape_fingerprint_index(self):
+        # term and subject lead class_term_sync_idx, but the unique key index may win on small tables
+        plan = fingerprint_index_rows('202509', ['COSC', 'MATH']).explain()
+        self.assertNotIn('Seq Scan', plan)
+        self.assertIn('Index', plan)
+
+    def test_api_subject_filter(self):
+        queryset = ClassFilter(
+            {'term': '202509', 'subject': 'cosc'}, queryset=Class.objects.filter(is_active=True)
+        ).qs.order_by('id')
+        self.assertUsesIndex(queryset, 'class_active_subject_idx', 'class_active_term_idx')
+
+    def test_api_open_seats_filter(self):
+        queryset = ClassFilter(
+            {'term': '202509', 'open_seats': True}, queryset=Class.objects.filter(is_active=True)
+        ).qs.order_by('id')
+        self.assertUsesIndex(queryset, 'class_open_seats_idx', 'class_active_term_idx')
+
+    def test_ranked_working_proxies(self):
+        threshold = timezone.now() - timezone.timedelta(hours=1)
+        query = Q(is_working_requests=True, last_verified_requests__gte=threshold) | Q(
+            is_working_selenium=True, last_verified_selenium__gte=threshold
+        )
+        queryset = Proxy.objects.filter(query).exclude(circuit_open_until__gt=timezone.now())
+        self.assertUsesIndex(queryset, 'proxy_working_requests_idx')
+        self.assertUsesIndex(queryset, 'proxy_working_selenium_idx')
+
+    def test_half_open_proxies(self):
+        queryset = Proxy.objects.filter(circuit_open_until__lte=timezone.now(), circuit_trips__lt=5)
+        self.assertUsesIndex(queryset, 'proxy_circuit_idx')
+
+    def test_proxy_lookup_by_address(self):
+        self.assertUsesIndex(Proxy.objects.filter(ip='10.0.0.1', port=8080), 'proxy_ip_port_uniq')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'query plans are PostgreSQL specific')
+class ScrapeIndexPlanTests(TransactionTestCase):
+    """
+    The unsharded scrape reads a whole term from class_term_sync_idx without
+    touching the table. Index-only scans need the visibility map, which only
+    VACUUM sets and which can't run inside TestCase's transaction.
+    """
+
+    def setUp(self):
+        Class.objects.bulk_create([
+            Class(
+                class_code=subject, course_number=f'{number:03d}', section='01', title='Title',
+                term=term, limit=40, enrollment=number % 41, fingerprint=f'{subject}{number}',
+            )
+            for term in ('202509', '202601')
+            for subject in ('COSC', 'MATH', 'PHYS')
+            for number in range(60)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM ANALYZE class_catch_app_class')
+            cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def test_scrape_fingerprint_index(self):
+        plan = fingerprint_index_rows('202509').explain()
+        self.assertIn('Index Only Scan using class_term_sync_idx', plan)
+
+
+class CoveringIndexTests(SimpleTestCase):
+
+    def test_sync_index_covers_the_fingerprint_query(self):
+        def column(name):
+            return (Class._meta.pk if name == 'pk' else Class._meta.get_field(name)).column
+
+        index = next(index for index in Class._meta.indexes if index.name == 'class_term_sync_idx')
+        columns = {column(field) for field in [*index.fields, *index.include]}
+        query = fingerprint_index_rows('202509', ['COSC']).query
+        selected = {column(name) for name in query.values_select}
+        filtered = {lookup.lhs.target.column for lookup in query.where.children}
+        self.assertLessEqual(selected | filtered, columns)
+        self.assertEqual(index.fields[:2], ['term', 'class_code'])
+
+
+class CrossListTests(SimpleTestCase):
+
+    def test_parse_xlist(self):
+        self.assertEqual(parse_xlist('LACS 021 02, WGSS-065', '01'), [('LACS', '21', '2'), ('WGSS', '65', '1')])
+
+    def test_resolve_groups(self):
+        resolved = resolve_groups([
+            (1, 'AAAS', '021', '01', 'LACS 021 01', 10, 30),
+            (2, 'LACS', '021', '01', '', 5, 30),
+            (3, 'WGSS', '21', '1', 'AAAS 21', 2, 30),
+            (4, 'COSC', '001', '01', 'MATH 999', 3, 0),
+        ])
+        # AAAS and WGSS both name LACS' pool; references to unknown sections are ignored
+        self.assertEqual(resolved, {
+            1: (1, 17, 30), 2: (1, 17, 30), 3: (1, 17, 30), 4: (4, 3, 0),
+        })
+
+
+class ScheduleMaskTests(SimpleTestCase):
+
+    @staticmethod
+    def meetings(mask):
+        """'Day HH:MM-HH:MM' of each weekday a mask touches, at quarter-hour resolution."""
+        meetings = []
+        for day_index, day in enumerate(DAYS):
+            slots = mask >> (day_index * SLOTS_PER_DAY) & ((1 << SLOTS_PER_DAY) - 1)
+            if slots:
+                start = DAY_START + ((slots & -slots).bit_length() - 1) * SLOT_MINUTES
+                end = DAY_START + slots.bit_length() * SLOT_MINUTES
+                meetings.append(f'{day} {start // 60}:{start % 60:02d}-{end // 60}:{end % 60:02d}')
+        return meetings
+
+    def test_every_period_code(self):
+        expected = {
+            '8': (['M 7:45-8:45', 'T 7:45-8:45', 'R 7:45-8:45', 'F 7:45-8:45'], []),
+            '9L': (['M 8:45-10:00', 'W 8:45-10:00', 'F 8:45-10:00'], ['R 9:00-10:00']),
+            '9S': (['M 9:00-10:00', 'T 9:00-10:00', 'R 9:00-10:00', 'F 9:00-10:00'], []),
+            '10': (['M 10:00-11:15', 'W 10:00-11:15', 'F 10:00-11:15'], ['R 12:15-13:15']),
+            '10A': (['T 10:00-12:00', 'R 10:00-12:00'], ['W 15:30-16:30']),
+            '11': (['M 11:30-12:45', 'W 11:30-12:45', 'F 11:30-12:45'], ['T 12:15-13:15']),
+            '12': (['M 12:45-14:00', 'W 12:45-14:00', 'F 12:45-14:00'], ['T 13:15-14:15']),
+            '2': (['M 14:00-15:15', 'W 14:00-15:15', 'F 14:00-15:15'], ['R 13:15-14:15']),
+            '2A': (['T 14:15-16:15', 'R 14:15-16:15'], ['W 16:30-17:30']),
+            '3A': (['M 15:30-17:30', 'W 15:30-17:30'], ['T 16:30-17:30']),
+            '3B': (['T 16:30-18:30', 'R 16:30-18:30'], ['F 15:30-16:30']),
+            '6A': (['M 18:30-20:30', 'R 18:30-20:30'], ['T 18:30-19:30']),
+            '6B': (['W 18:30-21:30'], ['T 19:30-20:30']),
+        }
+        self.assertEqual(set(expected), set(PERIODS))
+        for code, (meetings, xhour) in expected.items():
+            with self.subTest(code=code):
+                self.assertEqual(tuple(map(self.meetings, period_masks(code))), (meetings, xhour))
+
+    def test_timetable_times(self):
+        # the timetable prints 12-hour times, usually without am/pm
+        self.assertEqual(self.meetings(meetings_mask('W 6:30-9:30')), ['W 18:30-21:30'])
+        self.assertEqual(self.meetings(meetings_mask('MWF 11:30-12:35')),
+                         ['M 11:30-12:45', 'W 11:30-12:45', 'F 11:30-12:45'])
+        self.assertEqual(self.meetings(meetings_mask('Tu 7:30-8:20pm')), ['T 19:30-20:30'])
+        self.assertEqual(self.meetings(meetings_mask('Th 11:00am-1:00pm')), ['R 11:00-13:00'])
+        self.assertEqual(self.meetings(meetings_mask('M 8:00 AM-9:05 AM')), ['M 8:00-9:15'])
+        # a period's own meeting times win over its standard period
+        self.assertEqual(self.meetings(period_masks('6B', 'W 7:00-9:00pm')[0]), ['W 19:00-21:00'])
+
+
+class TimetableParserTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.page = (TEST_DATA / 'timetable.html').read_bytes()
+
+    def chunks(self, size):
+        return [self.page[i:i + size] for i in range(0, len(self.page), size)]
+
+    def test_stream_matches_bs4(self):
+        expected = list(iter_timetable_rows_bs4(self.page.decode('utf-8')))
+        self.assertEqual(len(expected), 3)
+        self.assertEqual(expected[1]['Title'], 'Introduction to Programming \u00e9\u00e9')
+        # chunk boundaries fall inside tags, entities and multi-byte characters
+        for size in (1, 7, 64, len(self.page)):
+            self.assertEqual(list(iter_timetable_rows(self.chunks(size))), expected, size)
+
+    def test_read_timetable(self):
+        page = read_timetable(iter(self.chunks(100)))
+        self.assertEqual(page.nbytes, len(self.page))
+        self.assertEqual(len(page.rows), 3)
+        self.assertEqual(read_timetable(self.page, parser='bs4'), page)
+
+    def test_digest_ignores_page_chrome(self):
+        digest = read_timetable(self.page).digest
+        restyled = self.page.replace(b'09:41:07', b'10:02:55').replace(b'<td>105</td>', b'<td >105</td>')
+        self.assertEqual(read_timetable(restyled).digest, digest)
+        self.assertNotEqual(read_timetable(self.page.replace(b'<td>41</td>', b'<td>42</td>')).digest, digest)
+
+    def test_parse_subjects(self):
+        select = (
+            '<form><select name="depts" multiple><option value="no_value">--</option>'
+            '<option value="AAAS">African and African American Studies</option>'
+            '<option value="COSC">Computer Science</option></select>'
+            '<select name="terms"><option value="202501">Winter</option></select></form>'
+        )
+        self.assertEqual(parse_subjects(select), ['AAAS', 'COSC'])
+        checkboxes = '<input type="checkbox" name="depts" value="MATH"><input type="checkbox" name="depts" value="MATH">'
+        self.assertEqual(parse_subjects(checkboxes), ['MATH'])
+
+    def test_page_without_data_table(self):
+        with self.assertRaises(TimetableNotFound):
+            read_timetable(iter([b'<html><body><table><tr><th>Error</th></tr></table></body></html>']))
+
+
+class BlockedResourceTests(SimpleTestCase):
+
+    def test_static_resources_are_blocked(self):
+        for url in (
+            'https://oracle-www.dartmouth.edu/css/style.css',
+            'https://oracle-www.dartmouth.edu/css/style.css?v=3',
+            'https://oracle-www.dartmouth.edu/img/logo.PNG#top',
+            'https://fonts.example.com/font.woff2?display=swap&v=1',
+        ):
+            self.assertTrue(is_blocked(url), url)
+
+    def test_pages_load(self):
+        for url in (
+            'https://oracle-www.dartmouth.edu/dart/groucho/timetable.main',
+            'https://oracle-www.dartmouth.edu/dart/groucho/timetable.display_courses?sortorder=dept',
+            'https://oracle-www.dartmouth.edu/js/app.cssx',
+        ):
+            self.assertFalse(is_blocked(url), url)
+
+
+class FakeDriver:
+    """Stands in for a pooled Chrome: records commands, and fails the reset once told to."""
+
+    def __init__(self, proxy_server):
+        self.proxy_server = proxy_server
+        self.commands = []
+        self.fail_reset = False
+        self.quit_called = False
+
+    def execute_cdp_cmd(self, command, params):
+        if self.fail_reset and command == 'Network.clearBrowserCookies':
+            raise WebDriverException('chrome not reachable')
+        self.commands.append(command)
+
+    def get(self, url):
+        self.commands.append(url)
+
+    def set_page_load_timeout(self, seconds):
+        self.page_load_timeout = seconds
+
+    def quit(self):
+        self.quit_called = True
+
+
+class DriverPoolTests(SimpleTestCase):
+
+    def pool(self, **kwargs):
+        self.drivers = []
+
+        def driver_factory(proxy_server):
+            driver = FakeDriver(proxy_server)
+            self.drivers.append(driver)
+            return driver
+
+        pool = DriverPool(driver_factory=driver_factory, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_warm_browser_is_reused_after_a_reset(self):
+        pool = self.pool(size=1, page_load_timeout=7)
+        with pool.session('10.0.0.1:8080') as driver:
+            self.assertEqual(driver.page_load_timeout, 7)
+        pooled = pool.idle.queue[0]
+        self.assertEqual(pooled.forwarder.upstream, '10.0.0.1:8080')
+        self.assertEqual(driver.proxy_server, pooled.forwarder.address)
+        self.assertEqual(driver.commands, [
+            'Network.clearBrowserCookies', 'Network.clearBrowserCache', 'Storage.clearDataForOrigin', 'about:blank',
+        ])
+        with pool.session() as again:
+            self.assertIs(again, driver)
+            self.assertIsNone(pooled.forwarder.upstream)
+        self.assertEqual(pool.metrics(), {'hits': 1, 'launches': 1, 'recycles': 0, 'resets': 2, 'idle': 1})
+
+    def test_page_errors_keep_the_browser(self):
+        pool = self.pool(size=1)
+        for error in (TimeoutException('table never loaded'), ValueError('parse error')):
+            with self.assertRaises(type(error)):
+                with pool.session():
+                    raise error
+        self.assertEqual(len(self.drivers), 1)
+        self.assertFalse(self.drivers[0].quit_called)
+        self.assertEqual(pool.metrics()['recycles'], 0)
+
+    def test_driver_failures_recycle_the_browser(self):
+        pool = self.pool(size=1)
+        for error in (WebDriverException('chrome not reachable'), InvalidSessionIdException('gone')):
+            with self.assertRaises(type(error)):
+                with pool.session():
+                    raise error
+        self.assertEqual([driver.quit_called for driver in self.drivers], [True, True])
+        self.assertEqual(pool.metrics(), {'hits': 0, 'launches': 2, 'recycles': 2, 'resets': 0, 'idle': 0})
+
+    def test_failed_reset_recycles(self):
+        pool = self.pool(size=1)
+        with self.assertLogs('class_catch_app.driver_pool', 'WARNING'):
+            with pool.session() as driver:
+                driver.fail_reset = True
+        self.assertTrue(driver.quit_called)
+        self.assertEqual(pool.metrics()['recycles'], 1)
+
+    def test_recycled_after_max_uses(self):
+        pool = self.pool(size=1, max_uses=2)
+        for _ in range(3):
+            with pool.session():
+                pass
+        self.assertEqual([driver.quit_called for driver in self.drivers], [True, False])
+        self.assertEqual(pool.metrics(), {'hits': 1, 'launches': 2, 'recycles': 1, 'resets': 2, 'idle': 1})
+
+    def test_acquire_waits_for_a_free_slot(self):
+        pool = self.pool(size=1)
+        busy = pool.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertEqual(acquired, [])
+        pool.release(busy)
+        waiter.join(5)
+        self.assertEqual(acquired, [busy])
+        pool.release(busy)
+
+    def test_failed_launch_frees_its_slot(self):
+        pool = self.pool(size=1)
+        factory = pool.driver_factory
+        pool.driver_factory = mock.Mock(side_effect=SessionNotCreatedException('no chrome'))
+        with self.assertRaises(SessionNotCreatedException):
+            pool.acquire()
+        pool.driver_factory = factory
+        with pool.session() as driver:
+            self.assertIsInstance(driver, FakeDriver)
+        pool.close()
+        self.assertTrue(driver.quit_called)
+
+
+class SessionPoolTests(SimpleTestCase):
+
+    def test_evicted_session_closed_on_release(self):
+        pool = SessionPool(max_sessions=1)
+        busy = pool.acquire('10.0.0.1:8080')
+        with mock.patch.object(busy, 'close') as close:
+            idle = pool.acquire('10.0.0.2:8080')
+            # evicted while a request through it is still running
+            close.assert_not_called()
+            pool.release(busy)
+            close.assert_called_once_with()
+        pool.release(idle)
+        self.assertIs(pool.acquire('10.0.0.2:8080'), idle)
+
+    def test_idle_session_closed_on_eviction(self):
+        pool = SessionPool(max_sessions=1)
+        idle = pool.acquire('10.0.0.1:8080')
+        pool.release(idle)
+        with mock.patch.object(idle, 'close') as close:
+            pool.acquire('10.0.0.2:8080')
+            close.assert_called_once_with()
+
+    def test_streamed_response_holds_session_until_closed(self):
+        pool = SessionPool(max_sessions=1)
+        response = mock.Mock()
+        original_close = response.close
+        with mock.patch('requests.Session.request', return_value=response):
+            streamed = pool.request('GET', 'https://example.com/', proxy='10.0.0.1:8080', stream=True)
+            session = pool.sessions['10.0.0.1:8080']
+            self.assertEqual(pool.checkouts[session], 1)
+            streamed.close()
+            streamed.close()
+            self.assertEqual(pool.checkouts[session], 0)
+            self.assertEqual(original_close.call_count, 2)
+
+
+def timetable_row(subject='COSC', number='001', section='01', **fields):
+    row = {
+        'Term': '202509', 'Subj': subject, 'Num': number, 'Sec': section, 'Title': 'Title',
+        'Instructor': 'Instructor', 'Lim': '30', 'Enrl': '10', 'Period Code': '10', 'Status': 'Active',
+    }
+    row.update(fields)
+    return class_data_from_row(row)
+
+
+class ClassSyncTests(TestCase):
+
+    def sync(self, *rows, **kwargs):
+        return sync_classes('202509', list(rows), use_copy=False, **kwargs)
+
+    def test_first_sync_creates(self):
+        result = self.sync(timetable_row(), timetable_row(number='010'))
+        self.assertEqual(result.created, [('COSC', '001', '01'), ('COSC', '010', '01')])
+        self.assertTrue(result.has_changes)
+        self.assertEqual(Class.objects.filter(term='202509', is_active=True).count(), 2)
+
+    def test_unchanged_rows_are_not_written(self):
+        self.sync(timetable_row(), timetable_row(number='010'))
+        stamps = dict(Class.objects.values_list('pk', 'last_updated'))
+        result = self.sync(timetable_row(), timetable_row(number='010'))
+        self.assertEqual(len(result.unchanged), 2)
+        self.assertFalse(result.has_changes)
+        self.assertEqual(dict(Class.objects.values_list('pk', 'last_updated')), stamps)
+
+    def test_changed_and_vanished_rows(self):
+        self.sync(timetable_row(), timetable_row(number='010'), timetable_row(subject='MATH'))
+        result = self.sync(timetable_row(Enrl='11'), timetable_row(subject='MATH'))
+        self.assertEqual(result.changed, [('COSC', '001', '01')])
+        self.assertEqual(result.unchanged, [('MATH', '001', '01')])
+        self.assertEqual(result.vanished, [('COSC', '010', '01')])
+        self.assertEqual(Class.objects.get(course_number='001', class_code='COSC').enrollment, 11)
+        self.assertFalse(Class.objects.get(course_number='010').is_active)
+        self.assertTrue(result.summary().startswith('0 created, 1 changed, 1 unchanged, 1 vanished'))
+
+    def test_vanished_section_listed_again(self):
+        self.sync(timetable_row(), timetable_row(number='010'))
+        self.sync(timetable_row())
+        result = self.sync(timetable_row(), timetable_row(number='010'))
+        # same fingerprint, but it has to be reactivated
+        self.assertEqual(result.changed, [('COSC', '010', '01')])
+        self.assertTrue(Class.objects.get(course_number='010').is_active)
+
+    def test_sharded_sync_only_vanishes_its_subjects(self):
+        self.sync(timetable_row(), timetable_row(subject='MATH'))
+        result = self.sync(timetable_row(Enrl='12'), subjects=['COSC'])
+        self.assertEqual(result.vanished, [])
+        self.assertTrue(Class.objects.get(class_code='MATH').is_active)
+
+    def groups(self):
+        return {
+            f'{class_code} {number}': (group, enrollment, limit)
+            for class_code, number, group, enrollment, limit in Class.objects.filter(is_active=True).values_list(
+                'class_code', 'course_number', 'xlist_group', 'group_enrollment', 'group_limit'
+            )
+        }
+
+    def test_new_and_vanished_sections_regroup_their_components(self):
+        aaas = timetable_row(subject='AAAS', number='021', Enrl='5', Xlist='LACS 021, HIST 021')
+        lacs = timetable_row(subject='LACS', number='021', Enrl='7')
+        cosc = timetable_row(Enrl='1', Xlist='MATH 001')
+        math = timetable_row(subject='MATH', Enrl='2')
+        self.sync(aaas, lacs, cosc, math)
+        groups = self.groups()
+        self.assertEqual(groups['AAAS 021'][1:], (12, 30))
+        self.assertEqual(groups['AAAS 021'], groups['LACS 021'])
+        self.assertEqual(groups['COSC 001'][1:], (3, 30))
+
+        # HIST 021 joins the group referencing it, LACS 021 leaves it; COSC and MATH aren't regrouped
+        with mock.patch('class_catch_app.class_sync.rebuild_crosslists') as rebuild, \
+                mock.patch('class_catch_app.crosslists.resolve_groups', wraps=resolve_groups) as resolve:
+            self.sync(aaas, timetable_row(subject='HIST', number='021', Enrl='4'), cosc, math)
+        rebuild.assert_not_called()
+        self.assertEqual(
+            sorted(row[1] for row in resolve.call_args.args[0]), ['AAAS', 'HIST'],
+        )
+        regrouped = self.groups()
+        self.assertEqual(regrouped['AAAS 021'], (groups['AAAS 021'][0], 9, 30))
+        self.assertEqual(regrouped['HIST 021'], regrouped['AAAS 021'])
+        self.assertEqual(regrouped['COSC 001'], groups['COSC 001'])
+
+    def test_repeated_rows_keep_the_first(self):
+        result = self.sync(timetable_row(), timetable_row(Enrl='20'))
+        self.assertEqual(result.created, [('COSC', '001', '01')])
+        self.assertEqual(Class.objects.get().enrollment, 10)
+
+    def test_empty_result(self):
+        result = SyncResult()
+        self.assertFalse(result.has_changes)
+        self.assertEqual(result.summary(), '0 created, 0 changed, 0 unchanged, 0 vanished, 0 events')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'the COPY staging merge is PostgreSQL specific')
+class StagingMergeTests(TestCase):
+
+    def classes(self, *rows):
+        return [Class(fingerprint=class_fingerprint(row), **row) for row in rows]
+
+    def stored(self):
+        return {
+            (class_code, number): (pk, enrollment, title, is_active, last_updated)
+            for pk, class_code, number, enrollment, title, is_active, last_updated in Class.objects.values_list(
+                'pk', 'class_code', 'course_number', 'enrollment', 'title', 'is_active', 'last_updated'
+            )
+        }
+
+    def test_creates_and_returns_the_new_pks(self):
+        now = timezone.now()
+        pks = merge_classes(self.classes(timetable_row(), timetable_row(subject='MATH')), now)
+        stored = self.stored()
+        self.assertEqual(pks, {
+            ('COSC', '001', '01'): stored[('COSC', '001')][0], ('MATH', '001', '01'): stored[('MATH', '001')][0],
+        })
+        self.assertEqual(stored[('COSC', '001')][1:], (10, 'Title', True, now))
+
+    def test_only_changed_fingerprints_are_written(self):
+        rows = [timetable_row(), timetable_row(subject='MATH')]
+        created = merge_classes(self.classes(*rows), timezone.now())
+        before = self.stored()
+
+        # the same rows again: nothing is rewritten or returned
+        self.assertEqual(merge_classes(self.classes(*rows), timezone.now()), {})
+        self.assertEqual(self.stored(), before)
+
+        later = timezone.now()
+        pks = merge_classes(self.classes(timetable_row(Enrl='11'), timetable_row(subject='MATH')), later)
+        self.assertEqual(pks, {('COSC', '001', '01'): created[('COSC', '001', '01')]})
+        self.assertEqual(self.stored()[('COSC', '001')], (created[('COSC', '001', '01')], 11, 'Title', True, later))
+        self.assertEqual(self.stored()[('MATH', '001')], before[('MATH', '001')])
+
+    def test_inactive_rows_are_reactivated(self):
+        created = merge_classes(self.classes(timetable_row()), timezone.now())
+        Class.objects.update(is_active=False)
+        self.assertEqual(merge_classes(self.classes(timetable_row()), timezone.now()), created)
+        self.assertTrue(Class.objects.get().is_active)
+
+    def test_copy_escapes_round_trip(self):
+        title = 'Tabs\tand\nnewlines \\N and backslashes\\'
+        merge_classes(self.classes(timetable_row(Title=title, Xlist=None)), timezone.now())
+        section = Class.objects.get()
+        self.assertEqual((section.title, section.xlist), (title, None))
+
+    def test_sync_goes_through_the_merge(self):
+        with mock.patch('class_catch_app.class_sync.merge_classes', wraps=merge_classes) as merge:
+            sync_classes('202509', [timetable_row(), timetable_row(subject='MATH')])
+            result = sync_classes('202509', [timetable_row(Enrl='11'), timetable_row(subject='MATH')])
+        self.assertEqual(merge.call_count, 2)
+        self.assertEqual((result.changed, result.unchanged), ([('COSC', '001', '01')], [('MATH', '001', '01')]))
+        self.assertEqual(Class.objects.get(class_code='COSC').enrollment, 11)
+        # created rows got their pks back, so their history and events point at them
+        self.assertEqual(
+            set(EnrollmentSnapshot.objects.values_list('section__class_code', flat=True)), {'COSC', 'MATH'}
+        )
+
+
+def scrape_command():
+    command = scrape_classes.Command(stdout=StringIO(), stderr=StringIO())
+    command.proxy_manager.get_random_headers = lambda: {'User-Agent': 'Test'}
+    return command
+
+
+def http_response(status_code, body=b'', **headers):
+    response = mock.MagicMock(status_code=status_code, headers=headers, encoding='utf-8')
+    response.iter_content.return_value = [body]
+    return response
+
+
+class IncrementalScrapeTests(TestCase):
+    term = '202501'
+
+    def setUp(self):
+        self.body = (TEST_DATA / 'timetable.html').read_bytes()
+        self.page = read_timetable(self.body)
+        self.command = scrape_command()
+
+    def state(self):
+        return ScrapeState.objects.get(term=self.term)
+
+    def test_unchanged_payload_skips_the_sync(self):
+        ScrapeState.objects.create(term=self.term, payload_digest=self.page.digest, etag='"v1"', version=3)
+        with mock.patch.object(scrape_classes, 'sync_classes') as sync:
+            self.assertIsNone(self.command.process_pages(self.term, [self.page], etag='"v2"'))
+        sync.assert_not_called()
+        state = self.state()
+        self.assertEqual((state.version, state.etag), (3, '"v2"'))
+        self.assertIsNotNone(state.last_checked)
+        self.assertIsNone(state.last_success)
+
+    def test_changed_payload_syncs_and_bumps_the_version(self):
+        ScrapeState.objects.create(term=self.term, payload_digest='stale')
+        result = self.command.process_pages(self.term, [self.page], etag='"v2"', last_modified='Mon')
+        self.assertEqual(len(result.created), 3)
+        state = self.state()
+        self.assertEqual(
+            (state.payload_digest, state.etag, state.last_modified, state.version), (self.page.digest, '"v2"', 'Mon', 1)
+        )
+        # the same rows again, e.g. a page whose chrome changed
+        self.assertIsNone(self.command.process_pages(self.term, [self.page]))
+        self.assertEqual(self.state().version, 1)
+
+    def test_validators_are_sent_and_not_modified_skips(self):
+        ScrapeState.objects.create(
+            term=self.term, payload_digest=self.page.digest, etag='"v1"',
+            last_modified='Wed, 01 Oct 2025 12:00:00 GMT', version=3,
+        )
+        with mock.patch.object(scrape_classes.http_transport, 'post', return_value=http_response(304)) as post, \
+                mock.patch.object(scrape_classes, 'sync_classes') as sync:
+            self.command.scrape_with_requests(None, self.term)
+        headers = post.call_args.kwargs['headers']
+        self.assertEqual(headers['If-None-Match'], '"v1"')
+        self.assertEqual(headers['If-Modified-Since'], 'Wed, 01 Oct 2025 12:00:00 GMT')
+        sync.assert_not_called()
+        state = self.state()
+        self.assertEqual(state.version, 3)
+        self.assertIsNotNone(state.last_checked)
+
+    def test_no_validators_before_a_payload_was_applied(self):
+        ScrapeState.objects.create(term=self.term, etag='"v1"')
+        response = http_response(200, self.body, ETag='"v2"', **{'Last-Modified': 'Mon'})
+        with mock.patch.object(scrape_classes.http_transport, 'post', return_value=response) as post:
+            self.command.scrape_with_requests(None, self.term)
+        self.assertNotIn('If-None-Match', post.call_args.kwargs['headers'])
+        state = self.state()
+        self.assertEqual((state.payload_digest, state.etag, state.version), (self.page.digest, '"v2"', 1))
+        self.assertEqual(self.command.conditional_headers(self.term), {
+            'If-None-Match': '"v2"', 'If-Modified-Since': 'Mon',
+        })
+
+
+class HedgedRaceTests(TestCase):
+
+    def setUp(self):
+        self.body = (TEST_DATA / 'timetable.html').read_bytes()
+        self.command = scrape_command()
+        self.command.hedge_stagger = 0.05
+        self.record = mock.patch.object(self.command, 'record_proxy').start()
+        self.addCleanup(mock.patch.stopall)
+        self.fetched = []
+        # a slow racer answers one chunk, then the rest once the gate opens
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+
+    def proxy(self, host):
+        return Proxy(ip=f'10.0.0.{host}', port=8080, is_working_requests=True)
+
+    def fake_fetch(self, behaviours):
+        def fetch(proxy, term, subjects=None, conditional_headers=None, stream=False, session=None):
+            self.fetched.append(proxy)
+            behaviour = behaviours[proxy]
+            if behaviour == 'fail':
+                raise ConnectionError('refused')
+            if behaviour == 'not modified':
+                return http_response(304)
+            response = http_response(200, self.body)
+            if behaviour == 'slow':
+                def chunks():
+                    yield self.body[:100]
+                    self.gate.wait(5)
+                    yield self.body[100:]
+                response.iter_content.side_effect = lambda chunk_size: chunks()
+            return response
+        return mock.patch.object(self.command, 'fetch_with_requests', side_effect=fetch).start()
+
+    def outcomes(self, wait_for=0):
+        """(proxy, success, stats) of the recorded attempts, once at least `wait_for` are in."""
+        deadline = time.monotonic() + 5
+        while self.record.call_count < wait_for and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return sorted((call.args[0], call.args[2], call.kwargs) for call in self.record.call_args_list)
+
+    def test_first_success_wins_and_losers_are_cancelled(self):
+        self.fake_fetch({'10.0.0.1:8080': 'slow', '10.0.0.2:8080': 'fast'})
+        result = self.command.race_proxies('202501', [self.proxy(1), self.proxy(2)])
+        self.assertEqual((result.proxy, result.status_code), ('10.0.0.2:8080', 200))
+        self.assertEqual(len(result.page.rows), 3)
+
+        # the loser stops at its next chunk, but its answer still counts for the proxy
+        self.gate.set()
+        (slow, slow_ok, slow_stats), (fast, fast_ok, fast_stats) = self.outcomes(wait_for=2)
+        self.assertEqual((slow, slow_ok, list(slow_stats)), ('10.0.0.1:8080', True, ['latency']))
+        self.assertEqual((fast, fast_ok, fast_stats['nbytes']), ('10.0.0.2:8080', True, len(self.body)))
+
+    def test_next_racer_waits_for_the_stagger(self):
+        self.fake_fetch({'10.0.0.1:8080': 'fast', '10.0.0.2:8080': 'fast'})
+        self.command.hedge_stagger = 10
+        result = self.command.race_proxies('202501', [self.proxy(1), self.proxy(2)])
+        self.assertEqual(result.proxy, '10.0.0.1:8080')
+        self.assertEqual(self.fetched, ['10.0.0.1:8080'])
+
+    def test_failed_racer_launches_the_next_at_once(self):
+        self.fake_fetch({'10.0.0.1:8080': 'fail', '10.0.0.2:8080': 'fast'})
+        self.command.hedge_stagger = 10
+        start_time = time.monotonic()
+        result = self.command.race_proxies('202501', [self.proxy(1), self.proxy(2)])
+        self.assertLess(time.monotonic() - start_time, 5)
+        self.assertEqual(result.proxy, '10.0.0.2:8080')
+        self.assertEqual(self.outcomes(wait_for=2)[0], ('10.0.0.1:8080', False, {'error': 'ConnectionError: refused'}))
+
+    def test_all_racers_failing(self):
+        self.fake_fetch({'10.0.0.1:8080': 'fail', '10.0.0.2:8080': 'fail'})
+        self.assertIsNone(self.command.race_proxies('202501', [self.proxy(1), self.proxy(2)]))
+        self.assertEqual(self.outcomes(wait_for=2), [
+            ('10.0.0.1:8080', False, {'error': 'ConnectionError: refused'}),
+            ('10.0.0.2:8080', False, {'error': 'ConnectionError: refused'}),
+        ])
+
+    def test_scrape_falls_back_to_the_other_proxies(self):
+        self.fake_fetch({'10.0.0.1:8080': 'fail', '10.0.0.2:8080': 'fail', '10.0.0.3:8080': 'not modified'})
+        self.command.hedge = 2
+        ScrapeState.objects.create(term='202501', payload_digest='applied')
+        proxies = [self.proxy(1), self.proxy(2), self.proxy(3)]
+        with mock.patch.object(self.command.proxy_manager, 'rank_proxies', return_value=proxies):
+            self.assertTrue(self.command.scrape_term('202501'))
+        # the two best proxies race, then the rest are tried one by one
+        self.assertEqual(sorted(self.fetched[:2]), ['10.0.0.1:8080', '10.0.0.2:8080'])
+        self.assertEqual(self.fetched[2:], ['10.0.0.3:8080'])
+        self.assertEqual([outcome[:2] for outcome in self.outcomes(wait_for=3)], [
+            ('10.0.0.1:8080', False), ('10.0.0.2:8080', False), ('10.0.0.3:8080', True),
+        ])
+        self.assertIsNotNone(ScrapeState.objects.get(term='202501').last_checked)
+
+
+class BootstrapDriver(FakeDriver):
+    """A pooled browser showing the subject search form."""
+
+    def find_element(self, by, value):
+        return mock.Mock(**{'is_displayed.return_value': True, 'is_enabled.return_value': True})
+
+    def find_elements(self, by, value):
+        fields = [('ICSID', 'abc'), ('STATE', '42'), ('', 'nameless')]
+        return [
+            mock.Mock(get_attribute=lambda attribute, name=name, value=value: {'name': name, 'value': value}[attribute])
+            for name, value in fields
+        ]
+
+    def get_cookies(self):
+        return [
+            {'name': 'SESSID', 'value': 's1', 'expiry': int(self.cookie_expiry.timestamp())},
+            {'name': 'lang', 'value': 'en'},
+        ]
+
+    def execute_script(self, script):
+        return 'Chrome/130'
+
+
+class ScraperSessionTests(TestCase):
+    term = '202501'
+
+    def setUp(self):
+        self.command = scrape_command()
+        self.record = mock.patch.object(self.command, 'record_proxy').start()
+        self.post = mock.patch.object(scrape_classes.http_transport, 'post', return_value=http_response(304)).start()
+        self.addCleanup(mock.patch.stopall)
+        # only the validators are sent, so every successful fetch is a 304
+        ScrapeState.objects.create(term=self.term, payload_digest='applied', etag='"v1"')
+        self.cookie_expiry = (timezone.now() + timezone.timedelta(minutes=5)).replace(microsecond=0)
+
+        def driver_factory(proxy_server):
+            driver = BootstrapDriver(proxy_server)
+            driver.cookie_expiry = self.cookie_expiry
+            return driver
+
+        self.command.driver_pool = DriverPool(size=1, driver_factory=driver_factory)
+        self.addCleanup(self.command.driver_pool.close)
+
+    def cached_session(self, expires_in=timezone.timedelta(minutes=10), **fields):
+        return ScraperSession.objects.create(expires_at=timezone.now() + expires_in, **fields)
+
+    def test_current_is_the_newest_unexpired_session(self):
+        self.assertIsNone(ScraperSession.current())
+        older = self.cached_session(proxy='10.0.0.1:8080')
+        newer = self.cached_session(proxy='10.0.0.2:8080')
+        self.cached_session(expires_in=-timezone.timedelta(seconds=1))
+        self.assertEqual(ScraperSession.current(), newer)
+        newer.delete()
+        self.assertEqual(ScraperSession.current(), older)
+
+    def test_scrape_reuses_the_cached_session(self):
+        self.cached_session(
+            proxy='10.0.0.1:8080', user_agent='Chrome/130', cookies={'SESSID': 's1'}, form_fields={'ICSID': 'abc'},
+        )
+        with mock.patch.object(self.command.proxy_manager, 'rank_proxies', return_value=[]):
+            self.assertTrue(self.command.scrape_term(self.term))
+        self.post.assert_called_once()
+        kwargs = self.post.call_args.kwargs
+        self.assertEqual(kwargs['proxy'], '10.0.0.1:8080')
+        self.assertEqual(kwargs['cookies'], {'SESSID': 's1'})
+        self.assertEqual(kwargs['data']['ICSID'], 'abc')
+        self.assertEqual(kwargs['headers']['User-Agent'], 'Chrome/130')
+        self.assertEqual(kwargs['headers']['If-None-Match'], '"v1"')
+        self.assertEqual(self.command.driver_pool.metrics()['launches'], 0)
+
+    def test_failing_session_is_discarded(self):
+        session = self.cached_session(proxy='10.0.0.1:8080')
+        self.post.return_value = http_response(403)
+        self.assertFalse(self.command.scrape_with_session(session, self.term))
+        self.assertFalse(ScraperSession.objects.exists())
+
+    def test_expired_session_is_bootstrapped_again_with_selenium(self):
+        self.cached_session(proxy='10.0.0.1:8080', expires_in=-timezone.timedelta(seconds=1))
+        proxy = Proxy(ip='10.0.0.2', port=8080, is_working_selenium=True)
+        with mock.patch.object(self.command.proxy_manager, 'rank_proxies', return_value=[proxy]):
+            self.assertTrue(self.command.scrape_term(self.term))
+
+        session = ScraperSession.current()
+        self.assertEqual((session.proxy, session.user_agent), ('10.0.0.2:8080', 'Chrome/130'))
+        self.assertEqual(session.cookies, {'SESSID': 's1', 'lang': 'en'})
+        self.assertEqual(session.form_fields, {'ICSID': 'abc', 'STATE': '42'})
+        # the session cookie expires before SCRAPER_SESSION_TTL is up
+        self.assertEqual(session.expires_at, self.cookie_expiry)
+
+        kwargs = self.post.call_args.kwargs
+        self.assertEqual((kwargs['proxy'], kwargs['cookies']), ('10.0.0.2:8080', session.cookies))
+        self.assertEqual(self.record.call_args_list[0].args[:3], ('10.0.0.2:8080', 'selenium', True))
+        # the browser only set up the session and went back to the pool
+        self.assertEqual(self.command.driver_pool.metrics(), {
+            'hits': 0, 'launches': 1, 'recycles': 0, 'resets': 1, 'idle': 1,
+        })
+
+    def test_failed_bootstrap_is_recorded(self):
+        with mock.patch.object(BootstrapDriver, 'get', side_effect=WebDriverException('chrome not reachable')):
+            self.assertIsNone(self.command.try_bootstrap_session('10.0.0.2:8080'))
+        self.record.assert_called_once_with(
+            '10.0.0.2:8080', 'selenium', False, error='WebDriverException: Message: chrome not reachable\n',
+        )
+        self.assertFalse(ScraperSession.objects.exists())
+
+
+class ProxyRankingTests(TestCase):
+
+    def test_record_attempt_updates_the_ewmas(self):
+        proxy = Proxy(ip='10.0.0.1', port=8080)
+        proxy.record_attempt('requests', True, latency=2.0, nbytes=1000)
+        self.assertEqual((proxy.latency_ewma, proxy.bytes_per_sec), (2.0, 500.0))
+        self.assertAlmostEqual(proxy.success_rate, 0.65)
+        proxy.record_attempt('requests', True, latency=4.0, nbytes=4000)
+        self.assertAlmostEqual(proxy.latency_ewma, 0.7 * 2.0 + 0.3 * 4.0)
+        self.assertAlmostEqual(proxy.bytes_per_sec, 0.7 * 500 + 0.3 * 1000)
+        self.assertAlmostEqual(proxy.success_rate, 0.7 * 0.65 + 0.3)
+        # a failure without a latency leaves the latency alone
+        proxy.record_attempt('requests', False, error='Timeout')
+        self.assertAlmostEqual(proxy.latency_ewma, 2.6)
+        self.assertAlmostEqual(proxy.success_rate, 0.7 * 0.755)
+        self.assertEqual((proxy.attempts, proxy.consecutive_failures, proxy.last_error), (3, 1, 'Timeout'))
+        self.assertTrue(proxy.is_working_requests)
+
+    def test_repeated_failures_trip_the_circuit(self):
+        proxy = Proxy(ip='10.0.0.1', port=8080, is_working_requests=True)
+        for _ in range(Proxy.MAX_CONSECUTIVE_FAILURES - 1):
+            proxy.record_attempt('requests', False)
+        self.assertEqual(proxy.circuit_state(), 'closed')
+        proxy.record_attempt('requests', False)
+        self.assertFalse(proxy.is_working_requests)
+        self.assertEqual((proxy.circuit_state(), proxy.circuit_trips), ('open', 1))
+        cooldown = proxy.circuit_open_until - proxy.last_attempt
+        self.assertEqual(cooldown, Proxy.CIRCUIT_COOLDOWN)
+        self.assertEqual(proxy.circuit_state(proxy.circuit_open_until), 'half_open')
+
+        # a failed half-open probe doubles the cooldown, a success closes the circuit
+        proxy.record_attempt('requests', False)
+        self.assertEqual(proxy.circuit_open_until - proxy.last_attempt, 2 * Proxy.CIRCUIT_COOLDOWN)
+        proxy.record_attempt('requests', True, latency=1.0)
+        self.assertEqual((proxy.circuit_state(), proxy.circuit_trips, proxy.consecutive_failures), ('closed', 0, 0))
+        self.assertTrue(proxy.is_working_requests)
+
+    def test_score(self):
+        self.assertAlmostEqual(Proxy(success_rate=0.8, latency_ewma=1.0).score(), 0.4)
+        self.assertAlmostEqual(Proxy(success_rate=0.8, latency_ewma=1.0, consecutive_failures=2).score(), 0.1)
+        # untried proxies are scored at the default latency
+        self.assertAlmostEqual(Proxy().score(), 0.5 / (1 + Proxy.DEFAULT_LATENCY))
+
+    def create(self, host, **stats):
+        now = timezone.now()
+        stats.setdefault('is_working_requests', True)
+        return Proxy.objects.create(
+            ip=f'10.0.0.{host}', port=8080, last_verified_requests=now, last_verified_selenium=now, **stats
+        )
+
+    def ranked(self, **kwargs):
+        return [proxy.ip for proxy in ProxyManager().rank_proxies(**kwargs)]
+
+    def test_ranking_explores_untried_proxies(self):
+        self.create(1, success_rate=0.9, latency_ewma=1.0, attempts=100)  # 0.45
+        self.create(2, success_rate=0.5, latency_ewma=0.5, attempts=10)   # 0.33
+        self.create(3)                                                    # untried: 0.08
+        # bonuses of 0.02, 0.07 and 0.22 keep the proven proxies first
+        self.assertEqual(self.ranked(), ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+        # ten times the exploration puts the untried proxy first
+        self.assertEqual(self.ranked(exploration=1.0), ['10.0.0.3', '10.0.0.2', '10.0.0.1'])
+        self.assertEqual(self.ranked(exploration=0), ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+
+    def test_ranking_skips_open_circuits_and_stale_proxies(self):
+        now = timezone.now()
+        self.create(1, success_rate=1.0, latency_ewma=0.1, circuit_open_until=now + timezone.timedelta(minutes=1))
+        self.create(2, circuit_open_until=now - timezone.timedelta(seconds=1), circuit_trips=1)  # half-open
+        self.create(3, is_working_requests=False, is_working_selenium=True)
+        stale = self.create(4)
+        Proxy.objects.filter(pk=stale.pk).update(last_verified_requests=now - timezone.timedelta(hours=2))
+        self.assertEqual(sorted(self.ranked()), ['10.0.0.2', '10.0.0.3'])
+        self.assertEqual(self.ranked(kind='requests'), ['10.0.0.2'])
+        self.assertEqual(self.ranked(kind='selenium'), ['10.0.0.3'])
+
+
+class ProxyOutcomeBufferTests(TestCase):
+
+    def test_flush_upserts_in_order(self):
+        Proxy.objects.create(ip='10.0.0.1', port=8080)
+        buffer = ProxyOutcomeBuffer()
+        buffer.add('10.0.0.1', 8080, 'requests', True, latency=1.0)
+        buffer.add('10.0.0.2', '8080', 'requests', True, latency=2.0)
+        buffer.add('10.0.0.2', 8080, 'requests', False, error='HTTP 403')
+        with self.assertNumQueries(5):
+            # savepoint, select, insert, update, release
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(Proxy.objects.count(), 2)
+        created = Proxy.objects.get(ip='10.0.0.2')
+        self.assertEqual((created.attempts, created.consecutive_failures, created.last_error), (2, 1, 'HTTP 403'))
+        self.assertTrue(Proxy.objects.get(ip='10.0.0.1').is_working_requests)
+
+    def test_failed_flush_keeps_outcomes(self):
+        buffer = ProxyOutcomeBuffer()
+        buffer.add('10.0.0.1', 8080, 'requests', True)
+        with mock.patch.object(Proxy.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        buffer.add('10.0.0.1', 8080, 'requests', False)
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(Proxy.objects.get().attempts, 2)
+        self.assertEqual(buffer.flushes, 1)
+
+
+class StubSource(ProxySource):
+
+    def __init__(self, name, proxies=None, error=None):
+        self.name = name
+        self.proxies = proxies
+        self.error = error
+
+    def fetch(self):
+        if self.error:
+            raise self.error
+        return self.proxies
+
+
+class ProxySourceTests(TestCase):
+
+    def test_sources_are_interleaved_without_duplicates(self):
+        sources = [
+            StubSource('a', [('10.0.0.1', 80), ('10.0.0.2', 80), ('10.0.0.3', 80)]),
+            StubSource('down', error=ConnectionError('refused')),
+            StubSource('b', [('10.0.0.2', 80), ('10.0.1.1', 80)]),
+            StubSource('c', [('10.0.2.1', 80), ('10.0.0.1', 8080)]),
+        ]
+        with self.assertLogs('class_catch_app.proxy_sources', 'WARNING') as logs:
+            proxies = fetch_from_sources(sources)
+        self.assertEqual(proxies, [
+            ('10.0.0.1', 80), ('10.0.0.2', 80), ('10.0.2.1', 80),
+            ('10.0.1.1', 80), ('10.0.0.1', 8080), ('10.0.0.3', 80),
+        ])
+        self.assertIn('down failed: refused', logs.output[0])
+        self.assertEqual(fetch_from_sources([]), [])
+
+    def test_proxy_list_parsing_skips_invalid_entries(self):
+        text = '10.0.0.1:8080\n 10.0.0.2:3128 \n300.0.0.1:80\n10.0.0.3:0\n10.0.0.4:70000\nhost:80\n'
+        self.assertEqual(parse_proxy_list(text), [('10.0.0.1', 8080), ('10.0.0.2', 3128)])
+
+    def test_blacklist_holds_packed_ints(self):
+        self.assertEqual(pack_proxy('10.0.0.1', 8080), (10 << 24 | 1) << 16 | 8080)
+        now = timezone.now()
+        BlacklistedProxy.objects.bulk_create([
+            BlacklistedProxy(ip='10.0.0.1', port=8080, expires_at=now + timezone.timedelta(hours=1)),
+            BlacklistedProxy(ip='10.0.0.2', port=8080, expires_at=now - timezone.timedelta(seconds=1)),
+            BlacklistedProxy(ip='2001:db8::1', port=8080, expires_at=now + timezone.timedelta(hours=1)),
+        ])
+        blacklist = ProxyBlacklist.load()
+        self.assertEqual(blacklist.packed, {pack_proxy('10.0.0.1', 8080)})
+        self.assertIn(('10.0.0.1', 8080), blacklist)
+        self.assertNotIn(('10.0.0.1', 8081), blacklist)
+        self.assertNotIn(('not an ip', 8080), blacklist)
+        self.assertEqual(
+            blacklist.filter([('10.0.0.1', 8080), ('10.0.0.2', 8080)]), [('10.0.0.2', 8080)]
+        )
+
+    def test_repeat_failures_extend_the_ban(self):
+        self.assertEqual(ProxyBlacklist.record_failures({}), 0)
+        ProxyBlacklist.record_failures({('10.0.0.1', 8080): 'ProxyError', ('10.0.0.2', 3128): ''})
+        before = timezone.now()
+        ProxyBlacklist.record_failures({('10.0.0.1', 8080): 'x' * 200, ('10.0.0.1', 3128): 'Timeout'})
+
+        entries = {(entry.ip, entry.port): entry for entry in BlacklistedProxy.objects.all()}
+        self.assertEqual(
+            {key: entry.failures for key, entry in entries.items()},
+            {('10.0.0.1', 8080): 2, ('10.0.0.2', 3128): 1, ('10.0.0.1', 3128): 1},
+        )
+        twice = entries[('10.0.0.1', 8080)]
+        self.assertEqual(twice.last_error, 'x' * 100)
+        self.assertGreaterEqual(twice.expires_at, before + 2 * BlacklistedProxy.BASE_TTL)
+        self.assertEqual(entries[('10.0.0.2', 3128)].last_error, 'Error')
+
+    def test_clear_forgets_only_the_given_proxies(self):
+        ProxyBlacklist.record_failures({
+            ('10.0.0.1', 8080): 'ProxyError', ('10.0.0.2', 3128): 'ProxyError', ('10.0.0.1', 3128): 'ProxyError',
+        })
+        # same ips and ports, but ('10.0.0.2', 8080) was never blacklisted
+        self.assertEqual(ProxyBlacklist.clear({('10.0.0.1', 8080), ('10.0.0.2', 8080)}), 1)
+        self.assertEqual(
+            sorted(BlacklistedProxy.objects.values_list('ip', 'port')), [('10.0.0.1', 3128), ('10.0.0.2', 3128)]
+        )
+        self.assertEqual(ProxyBlacklist.clear(set()), 0)
+
+
+class VerificationFunnelTests(TestCase):
+
+    def test_stages_overlap_and_outcomes_are_flushed(self):
+        manager = ProxyManager()
+        manager.OUTCOME_BATCH_SIZE = 1
+        manager.proxies = [{'ip': '10.0.0.1', 'port': 8080}, {'ip': '10.0.0.2', 'port': 8080}]
+        target_checked = threading.Event()
+        overlapped = []
+
+        def test_url(proxy):
+            if proxy['ip'] == '10.0.0.2':
+                # still on the first stage while the fast proxy is checked against the target
+                overlapped.append(target_checked.wait(timeout=5))
+                return False
+            return True
+
+        def target_requests(proxy):
+            manager.record_outcome(proxy['ip'], proxy['port'], 'requests', True, latency=0.5)
+            target_checked.set()
+            return True
+
+        def target_selenium(proxy):
+            manager.record_outcome(proxy['ip'], proxy['port'], 'selenium', False, error='TimeoutException')
+            return False
+
+        manager.verify_proxy_on_test_url = test_url
+        manager.verify_proxy_on_target_requests = target_requests
+        manager.verify_proxy_on_target_selenium = target_selenium
+        with mock.patch('builtins.print'):
+            manager.run_verification_funnel()
+
+        self.assertEqual(overlapped, [True])
+        self.assertIsNone(manager.outcome_buffer)
+        proxy = Proxy.objects.get()
+        self.assertEqual((proxy.ip, proxy.attempts), ('10.0.0.1', 2))
+        self.assertTrue(proxy.is_working_requests)
+
+
+class ProxyHealthTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.service = ProxyHealthService(target_size=4, low_watermark=2, probe_interval=300)
+        self.checks = []
+        self.results = {}
+
+        def check(kind):
+            def verify(proxy_info):
+                self.checks.append((proxy_info['ip'], kind))
+                success = self.results.get((proxy_info['ip'], kind), True)
+                self.service.prober.record_outcome(
+                    proxy_info['ip'], proxy_info['port'], kind, success,
+                    latency=1.0, error='' if success else 'Timeout',
+                )
+            return verify
+
+        self.service.prober.verify_proxy_on_target_requests = check('requests')
+        self.service.prober.verify_proxy_on_target_selenium = check('selenium')
+        self.refill = mock.patch.object(self.service, 'refill').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def create(self, host, last_attempt=timezone.timedelta(minutes=10), **fields):
+        fields.setdefault('is_working_requests', True)
+        return Proxy.objects.create(
+            ip=f'10.0.0.{host}', port=8080, last_attempt=self.now - last_attempt, latency_ewma=1.0, **fields
+        )
+
+    async def tick(self):
+        self.service.probe_slots = asyncio.Semaphore(self.service.concurrency)
+        await self.service.tick_once()
+        await asyncio.gather(*self.service.tasks)
+        await sync_to_async(self.service.prober.outcome_buffer.flush)()
+
+    def test_probe_kinds_follow_the_working_flags(self):
+        fresh = self.now - timezone.timedelta(minutes=1)
+        stale = self.now - timezone.timedelta(hours=1)
+        kinds = self.service.probe_kinds
+        self.assertEqual(kinds(Proxy(is_working_requests=True), self.now), ['requests'])
+        # a browser-only proxy never gets the requests check it would fail
+        self.assertEqual(kinds(Proxy(is_working_selenium=True, last_verified_selenium=fresh), self.now), ['selenium'])
+        both = Proxy(is_working_requests=True, is_working_selenium=True, last_verified_selenium=fresh)
+        self.assertEqual(kinds(both, self.now), ['requests'])
+        both.last_verified_selenium = stale
+        self.assertEqual(kinds(both, self.now), ['requests', 'selenium'])
+        # a tripped proxy is trialled for the kind that worked last
+        tripped = Proxy(last_verified_requests=stale, last_verified_selenium=fresh)
+        self.assertEqual(kinds(tripped, self.now), ['selenium'])
+        tripped.last_verified_requests = self.now
+        self.assertEqual(kinds(tripped, self.now), ['requests'])
+        self.assertEqual(kinds(Proxy(), self.now), ['requests'])
+
+    def test_urgency_stretches_with_the_score(self):
+        proxy = Proxy(latency_ewma=1.0, last_attempt=self.now - timezone.timedelta(seconds=300))
+        median = proxy.score()
+        self.assertEqual(self.service.urgency(proxy, self.now, median), 1.0)
+        self.assertEqual(self.service.urgency(proxy, self.now, median * 2), 2.0)
+        self.assertEqual(self.service.urgency(proxy, self.now, median / 2), 0.5)
+        # the weight is clamped to [0.25, 4]
+        self.assertEqual(self.service.urgency(proxy, self.now, median / 100), 0.25)
+        self.assertEqual(self.service.urgency(proxy, self.now, 0), 1.0)
+        self.assertEqual(self.service.urgency(Proxy(), self.now, median), float('inf'))
+        proxy.circuit_open_until = self.now - timezone.timedelta(seconds=1)
+        self.assertEqual(self.service.urgency(proxy, self.now, median), float('inf'))
+
+    async def test_only_due_proxies_are_probed(self):
+        await sync_to_async(self.create)(1)
+        await sync_to_async(self.create)(2, last_attempt=timezone.timedelta(seconds=10))
+        await sync_to_async(self.create)(3, is_working_requests=False, is_working_selenium=True,
+                                         last_verified_selenium=self.now)
+        await sync_to_async(self.create)(4, last_attempt=timezone.timedelta(minutes=10),
+                                         circuit_open_until=self.now + timezone.timedelta(minutes=1))
+        await self.tick()
+        self.assertEqual(sorted(self.checks), [('10.0.0.1', 'requests'), ('10.0.0.3', 'selenium')])
+        self.assertEqual(self.service.stats['probes'], 2)
+        # just probed, so nothing is due on the next pass
+        self.checks.clear()
+        await self.tick()
+        self.assertEqual(self.checks, [])
+
+    async def test_refills_below_the_low_watermark(self):
+        await sync_to_async(self.create)(1, last_attempt=timezone.timedelta(seconds=10))
+        with self.assertLogs('class_catch_app.proxy_health', 'INFO') as logs:
+            await self.tick()
+            await self.service.refill_task
+        self.refill.assert_called_once_with(3)
+        self.assertIn('Healthy pool at 1/4, refilling 3...', logs.output[0])
+        # one refill per cooldown
+        await self.tick()
+        self.assertEqual(self.refill.call_count, 1)
+
+        await sync_to_async(self.create)(2, last_attempt=timezone.timedelta(seconds=10))
+        self.service.last_refill = None
+        await self.tick()
+        self.assertEqual(self.refill.call_count, 1)
+
+    async def test_failing_probes_open_the_circuit_and_half_open_retries(self):
+        proxy = await sync_to_async(self.create)(1, consecutive_failures=2, last_verified_requests=self.now)
+        self.results[('10.0.0.1', 'requests')] = False
+        await self.tick()
+        await sync_to_async(proxy.refresh_from_db)()
+        self.assertEqual((proxy.circuit_state(), proxy.circuit_trips, proxy.is_working_requests), ('open', 1, False))
+
+        # skipped while open
+        self.checks.clear()
+        await self.tick()
+        self.assertEqual(self.checks, [])
+
+        # half-open: one trial probe, which fails and doubles the cooldown
+        await Proxy.objects.filter(pk=proxy.pk).aupdate(circuit_open_until=self.now)
+        await self.tick()
+        await sync_to_async(proxy.refresh_from_db)()
+        self.assertEqual(self.checks, [('10.0.0.1', 'requests')])
+        self.assertEqual(proxy.circuit_trips, 2)
+        self.assertGreater(proxy.circuit_open_until, timezone.now() + Proxy.CIRCUIT_COOLDOWN)
+
+        # a successful trial closes it
+        del self.results[('10.0.0.1', 'requests')]
+        await Proxy.objects.filter(pk=proxy.pk).aupdate(circuit_open_until=self.now)
+        await self.tick()
+        await sync_to_async(proxy.refresh_from_db)()
+        self.assertEqual((proxy.circuit_state(), proxy.circuit_trips, proxy.is_working_requests), ('closed', 0, True))
+
+
+class EnrollmentHistoryTests(TestCase):
+
+    def sync(self, *rows, at):
+        with mock.patch('django.utils.timezone.now', return_value=at):
+            sync_classes('202509', list(rows), use_copy=False)
+
+    def setUp(self):
+        self.start = timezone.now().replace(microsecond=0)
+        self.hours = [self.start + timezone.timedelta(hours=i) for i in range(5)]
+        self.sync(timetable_row(), timetable_row(number='010', Enrl='20'), at=self.hours[0])
+        self.sync(timetable_row(Enrl='15'), timetable_row(number='010', Enrl='20'), at=self.hours[1])
+        # COSC 010 stops being listed, then comes back unchanged
+        self.sync(timetable_row(Enrl='15'), at=self.hours[2])
+        self.sync(timetable_row(Enrl='16'), at=self.hours[3])
+        self.sync(timetable_row(Enrl='16'), timetable_row(number='010', Enrl='20'), at=self.hours[4])
+
+    def test_vanished_section_leaves_the_totals(self):
+        vanished = Class.objects.get(course_number='010')
+        self.assertEqual(
+            list(vanished.enrollment_history.order_by('recorded_at').values_list('enrollment', 'status')),
+            [(20, 'Active'), (0, EnrollmentSnapshot.VANISHED), (20, 'Active')],
+        )
+        self.assertEqual(department_fill_curve('202509', 'COSC'), [
+            (self.hours[0], 30, 60),
+            (self.hours[1], 35, 60),
+            (self.hours[2], 15, 30),
+            (self.hours[3], 16, 30),
+            (self.hours[4], 36, 60),
+        ])
+
+    def test_curve_since_starts_from_the_state_in_effect(self):
+        since = self.hours[2] + timezone.timedelta(minutes=30)
+        self.assertEqual(department_fill_curve('202509', 'COSC', since=since), [
+            (self.hours[2], 15, 30),
+            (self.hours[3], 16, 30),
+            (self.hours[4], 36, 60),
+        ])
+        self.assertEqual(department_fill_curve('202509', 'COSC', since=self.hours[1], until=self.hours[2]), [
+            (self.hours[0], 30, 60),
+            (self.hours[1], 35, 60),
+            (self.hours[2], 15, 30),
+        ])
+
+
+class ChangeEventTests(TestCase):
+
+    def seats(self, enrollment, limit, instructor='Instructor'):
+        return {'enrollment': enrollment, 'limit': limit, 'instructor': instructor}
+
+    def test_diff_events(self):
+        self.assertEqual(diff_events(None, self.seats(3, 10)), [
+            (ClassChangeEvent.SECTION_ADDED, {'enrollment': 3, 'limit': 10}),
+        ])
+        self.assertEqual([event for event, _ in diff_events(self.seats(9, 10), self.seats(10, 10, 'Other'))], [
+            ClassChangeEvent.INSTRUCTOR_CHANGED,
+        ])
+        self.assertEqual([event for event, _ in diff_events(self.seats(10, 10), self.seats(10, 0))], [
+            ClassChangeEvent.LIMIT_CHANGED,
+        ])
+        self.assertEqual(diff_events(self.seats(5, 10), self.seats(6, 10)), [])
+
+    def test_seat_event(self):
+        self.assertEqual(seat_event((10, 10), (9, 10)), (
+            ClassChangeEvent.SEAT_OPENED, {'enrollment': 9, 'limit': 10, 'old_enrollment': 10},
+        ))
+        self.assertEqual(seat_event((9, 10), (10, 10))[0], ClassChangeEvent.SEAT_FILLED)
+        # raising the limit of a full pool opens it; an uncapped pool is never full
+        self.assertEqual(seat_event((10, 10), (10, 0))[0], ClassChangeEvent.SEAT_OPENED)
+        self.assertIsNone(seat_event((5, 10), (6, 10)))
+
+    def test_sync_writes_events_in_order(self):
+        sync_classes('202509', [timetable_row(Enrl='30'), timetable_row(number='010')], use_copy=False)
+        result = sync_classes('202509', [timetable_row(Enrl='29', Instructor='Other')], use_copy=False)
+        self.assertEqual(result.events, 3)
+        events = list(ClassChangeEvent.objects.order_by('id').values_list('event_type', 'course_number', 'data'))
+        self.assertEqual([(event, number) for event, number, _ in events], [
+            (ClassChangeEvent.SECTION_ADDED, '001'),
+            (ClassChangeEvent.SECTION_ADDED, '010'),
+            (ClassChangeEvent.INSTRUCTOR_CHANGED, '001'),
+            (ClassChangeEvent.SECTION_REMOVED, '010'),
+            # seat events follow, once the seat pools are up to date
+            (ClassChangeEvent.SEAT_OPENED, '001'),
+        ])
+        self.assertEqual(events[4][2], {'enrollment': 29, 'limit': 30, 'old_enrollment': 30})
+
+    def test_seat_events_follow_the_pool(self):
+        sync_classes('202509', [
+            timetable_row(subject='AAAS', number='021', Enrl='20', Xlist='LACS 021'),
+            timetable_row(subject='LACS', number='021', Enrl='5'),
+        ], use_copy=False)
+        # LACS 021 is unchanged, but it shares the pool that filled
+        sync_classes('202509', [
+            timetable_row(subject='AAAS', number='021', Enrl='25', Xlist='LACS 021'),
+            timetable_row(subject='LACS', number='021', Enrl='5'),
+        ], use_copy=False)
+        self.assertEqual(
+            sorted(ClassChangeEvent.objects.filter(event_type=ClassChangeEvent.SEAT_FILLED).values_list(
+                'class_code', 'data'
+            )),
+            [
+                ('AAAS', {'enrollment': 30, 'limit': 30, 'old_enrollment': 25}),
+                ('LACS', {'enrollment': 30, 'limit': 30, 'old_enrollment': 25}),
+            ],
+        )
+        self.assertEqual(
+            [(group['department'], group['open_sections']) for group in term_aggregates('202509')['groups']],
+            [('AAAS', 0), ('LACS', 0)],
+        )
+
+    def test_events_roll_back_with_the_writes(self):
+        with mock.patch('class_catch_app.class_sync.refresh_search_vectors', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                sync_classes('202509', [timetable_row()], use_copy=False)
+        self.assertFalse(Class.objects.exists())
+        self.assertFalse(ClassChangeEvent.objects.exists())
+
+    def test_unchanged_scrape_writes_no_events(self):
+        sync_classes('202509', [timetable_row()], use_copy=False)
+        self.assertEqual(sync_classes('202509', [timetable_row()], use_copy=False).events, 0)
+        self.assertEqual(ClassChangeEvent.objects.count(), 1)
+
+
+class AggregateTests(TestCase):
+
+    def test_sync_keeps_department_totals(self):
+        sync_classes('202509', [
+            timetable_row(Enrl='35', Dist='SCI'), timetable_row(number='010', Lim='0', Enrl='50'),
+            timetable_row(subject='MATH', Enrl='5', Dist='QDS'),
+        ], use_copy=False)
+        sync_classes('202509', [
+            timetable_row(Enrl='35', Dist='SCI'), timetable_row(number='010', Lim='0', Enrl='50'),
+        ], use_copy=False)
+        aggregates = term_aggregates('202509')
+        self.assertEqual([group['department'] for group in aggregates['groups']], ['COSC'])
+        cosc = aggregates['groups'][0]
+        self.assertEqual(
+            {counter: cosc[counter] for counter in ('sections', 'open_sections', 'enrollment', 'capacity')},
+            {'sections': 2, 'open_sections': 1, 'enrollment': 85, 'capacity': 30},
+        )
+        self.assertEqual(cosc['fill_rate'], 35 / 30)
+        self.assertEqual(aggregates['most_oversubscribed'], [['COSC', '001', '01', 'Title', 35, 30]])
+        self.assertEqual(
+            [group['distrib'] for group in term_aggregates('202509', 'distrib')['groups']], ['', 'SCI']
+        )
+
+    def group(self, name, group_by='department'):
+        return next(group for group in term_aggregates('202509', group_by)['groups'] if group[group_by] == name)
+
+    def test_refresh_only_rebuilds_the_given_departments(self):
+        sync_classes('202509', [timetable_row(), timetable_row(subject='MATH')], use_copy=False)
+        before = dict(ClassAggregate.objects.values_list('class_code', 'updated'))
+        # writes that skip the sync (and so the aggregates)
+        Class.objects.update(enrollment=20)
+        Class.objects.create(class_code='PHYS', course_number='001', section='01', term='202509', title='Title',
+                             limit=30, enrollment=5)
+
+        self.assertEqual(refresh_aggregates('202509', []), 0)
+        self.assertEqual(refresh_aggregates('202509', ['COSC', 'PHYS']), 2)
+        self.assertEqual((self.group('COSC')['enrollment'], self.group('PHYS')['enrollment']), (20, 5))
+        # MATH keeps its row, stale until it is refreshed itself
+        self.assertEqual(self.group('MATH')['enrollment'], 10)
+        self.assertEqual(ClassAggregate.objects.get(class_code='MATH').updated, before['MATH'])
+
+        # a department without active sections left loses its rows
+        Class.objects.filter(class_code='PHYS').update(is_active=False)
+        self.assertEqual(refresh_aggregates('202509', ['PHYS']), 0)
+        self.assertEqual([group['department'] for group in term_aggregates('202509')['groups']], ['COSC', 'MATH'])
+
+    def test_distrib_buckets_span_departments(self):
+        sync_classes('202509', [
+            timetable_row(Dist='SCI', Enrl='10'), timetable_row(number='010', Dist='TLA', Enrl='31'),
+            timetable_row(number='020', Enrl='4'), timetable_row(subject='MATH', Dist='SCI', Enrl='20', Lim='0'),
+        ], use_copy=False)
+        # one row per department and distrib
+        self.assertEqual(
+            sorted(ClassAggregate.objects.values_list('class_code', 'distrib')),
+            [('COSC', ''), ('COSC', 'SCI'), ('COSC', 'TLA'), ('MATH', 'SCI')],
+        )
+        aggregates = term_aggregates('202509', 'distrib')
+        self.assertEqual([group['distrib'] for group in aggregates['groups']], ['', 'SCI', 'TLA'])
+        sci = self.group('SCI', 'distrib')
+        self.assertEqual(
+            {counter: sci[counter] for counter in ('sections', 'enrollment', 'capacity', 'capped_enrollment')},
+            {'sections': 2, 'enrollment': 30, 'capacity': 30, 'capped_enrollment': 10},
+        )
+        self.assertEqual(sci['fill_rate'], 10 / 30)
+        tla = self.group('TLA', 'distrib')
+        self.assertEqual((tla['oversubscribed_sections'], tla['top_oversubscribed']),
+                         (1, [['COSC', '010', '01', 'Title', 31, 30]]))
+        self.assertEqual(aggregates['most_oversubscribed'], tla['top_oversubscribed'])
+
+    def test_open_sections_count_pooled_cross_list_seats(self):
+        def rows(lacs_enrollment):
+            return [
+                # room on its own, but not in the pool it shares with LACS 021
+                timetable_row(subject='AAAS', number='021', Enrl='5', Lim='10', Xlist='LACS 021'),
+                timetable_row(subject='LACS', number='021', Enrl=lacs_enrollment, Lim='10'),
+                # full on its own, but pooled with an uncapped section
+                timetable_row(Enrl='30', Lim='30', Xlist='MATH 001'),
+                timetable_row(subject='MATH', Enrl='3', Lim='0'),
+            ]
+
+        sync_classes('202509', rows('6'), use_copy=False)
+        self.assertEqual(
+            {group['department']: group['open_sections'] for group in term_aggregates('202509')['groups']},
+            {'AAAS': 0, 'LACS': 0, 'COSC': 1, 'MATH': 1},
+        )
+        # two seats freed in LACS open AAAS too, so both departments are refreshed
+        sync_classes('202509', rows('4'), use_copy=False)
+        self.assertEqual((self.group('AAAS')['open_sections'], self.group('LACS')['open_sections']), (1, 1))
+
+
+class StubMailHandler(BaseHTTPRequestHandler):
+    """Stands in for the mail send API: 'bounce' addresses are rejected, 'flaky' ones fail twice first."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        message = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        emails = [p['to'][0]['email'] for p in message['personalizations']]
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            if any(email.startswith('bounce') for email in emails):
+                status = 400
+            elif any(email.startswith('flaky') for email in emails) and server.flaky_failures < 2:
+                server.flaky_failures += 1
+                status = 503
+            else:
+                status = 202
+                server.delivered.extend(emails)
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class NotificationDispatcherTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubMailHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.lock = threading.Lock()
+        self.server.calls = 0
+        self.server.flaky_failures = 0
+        self.server.delivered = []
+        self.dispatcher = NotificationDispatcher(
+            client=SendGridAPIClient(api_key='test', host=f'http://127.0.0.1:{self.server.server_address[1]}'),
+            batch_size=2, workers=2, rate=1000, max_retries=1, backoff=0.001, from_email='alerts@example.com',
+            max_attempts=3, retry_delay=0,
+        )
+        self.addCleanup(self.dispatcher.close)
+        self.section = Class.objects.create(
+            class_code='COSC', course_number='001', section='01', term='202509', title='Title', limit=30, enrollment=29,
+        )
+
+    def watch(self, *emails):
+        Watch.objects.bulk_create([
+            Watch(email=email, class_code='COSC', course_number='001', section='01', term='202509') for email in emails
+        ])
+
+    def event(self, pk):
+        return ClassChangeEvent.objects.create(
+            pk=pk, section=self.section, event_type=ClassChangeEvent.SEAT_OPENED, term='202509',
+            class_code='COSC', course_number='001', section_number='01',
+            data={'enrollment': 29, 'limit': 30}, created=timezone.now(),
+        )
+
+    def test_rejected_batch_does_not_block_the_cursor(self):
+        self.watch('a@example.com', 'bounce@example.com', 'c@example.com')
+        self.event(1)
+        self.event(2)
+        with self.assertLogs('class_catch_app.notifications', 'ERROR'):
+            self.assertEqual(self.dispatcher.dispatch_pending(), 2)
+        # each event: one rejected batch of two, and c@ in its own batch; 4xx isn't retried
+        self.assertEqual(self.server.delivered, ['c@example.com', 'c@example.com'])
+        self.assertEqual(self.server.calls, 4)
+        self.assertEqual(OutboxCursor.objects.get().last_event_id, 2)
+        failed = FailedNotification.objects.order_by('event_id')
+        self.assertEqual(
+            list(failed.values_list('event_id', 'status_code', 'retryable', 'next_attempt_at')),
+            [(1, 400, False, None), (2, 400, False, None)],
+        )
+        self.assertEqual(failed[0].emails, ['a@example.com', 'bounce@example.com'])
+        # nothing is re-sent on the next poll
+        self.assertEqual(self.dispatcher.dispatch_pending(), 0)
+        self.assertEqual(self.dispatcher.retry_failed(), 0)
+        self.assertEqual(self.server.calls, 4)
+
+    def test_transient_failure_is_redelivered(self):
+        self.watch('flaky@example.com')
+        self.event(1)
+        with self.assertLogs('class_catch_app.notifications', 'ERROR'):
+            self.assertEqual(self.dispatcher.dispatch_pending(), 1)
+        failed = FailedNotification.objects.get()
+        self.assertEqual((failed.status_code, failed.retryable, failed.attempts), (503, True, 1))
+        self.assertEqual(self.dispatcher.retry_failed(), 1)
+        self.assertFalse(FailedNotification.objects.exists())
+        self.assertEqual(self.server.delivered, ['flaky@example.com'])
+        self.assertEqual(self.dispatcher.stats['retries'], 1)
+
+    def test_gives_up_after_max_attempts(self):
+        self.watch('flaky@example.com')
+        self.event(1)
+        self.server.flaky_failures = -10
+        with self.assertLogs('class_catch_app.notifications', 'ERROR') as logs:
+            self.dispatcher.dispatch_pending()
+            self.assertEqual(self.dispatcher.retry_failed(), 0)
+            self.assertEqual(self.dispatcher.retry_failed(), 0)
+        self.assertIn('Giving up', logs.output[-1])
+        failed = FailedNotification.objects.get()
+        self.assertEqual((failed.attempts, failed.retryable, failed.next_attempt_at), (3, False, None))
+        self.assertEqual(self.dispatcher.retry_failed(), 0)
+        self.assertEqual(self.server.calls, 6)
+
+    def test_waits_for_uncommitted_events(self):
+        self.watch('a@example.com')
+        self.event(1)
+        self.event(3)
+        start = timezone.now()
+        self.assertEqual(self.dispatcher.dispatch_pending(), 1)
+        cursor = OutboxCursor.objects.get()
+        self.assertEqual(cursor.last_event_id, 1)
+        self.assertIsNotNone(cursor.gap_seen_at)
+        self.assertEqual(self.dispatcher.dispatch_pending(), 0)
+        # id 2 commits late and is still delivered, in order
+        self.event(2)
+        self.assertEqual(self.dispatcher.dispatch_pending(), 2)
+        self.assertEqual(OutboxCursor.objects.get().gap_seen_at, None)
+        self.assertEqual(self.server.calls, 3)
+        # a gap that never fills is a rollback once it has been open long enough
+        self.event(5)
+        self.assertEqual(self.dispatcher.dispatch_pending(), 0)
+        with mock.patch('django.utils.timezone.now', return_value=start + timezone.timedelta(minutes=5)):
+            self.assertEqual(self.dispatcher.dispatch_pending(), 1)
+        self.assertEqual(OutboxCursor.objects.get().last_event_id, 5)
+
+
+class SearchQueryTests(SimpleTestCase):
+
+    def test_is_text_query(self):
+        self.assertTrue(is_text_query('calc'))
+        self.assertTrue(is_text_query('COSC 1'))
+        self.assertFalse(is_text_query('202509'))
+        self.assertFalse(is_text_query(' 10 - 01 '))
+        self.assertFalse(is_text_query(''))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'full-text search is PostgreSQL specific')
+class FullTextSearchTests(TestCase):
+
+    def setUp(self):
+        self.section = Class.objects.create(
+            class_code='COSC', course_number='001', section='01', term='202509',
+            title='Introduction to Programming and Computation', instructor='Alice Jones', limit=30, enrollment=20,
+        )
+
+    def found(self, text):
+        return [cls.pk for cls in search_classes(text)]
+
+    def test_words_match_stemmed_and_unstemmed_fields(self):
+        for text in ('introduction', 'Introductions', 'intro progr', 'cosc programming', 'jones', 'the computation'):
+            with self.subTest(text=text):
+                # the vector alone, without the trigram fallback
+                self.assertTrue(Class.objects.filter(search_vector=prefix_query(text)).exists())
+                self.assertEqual(self.found(text), [self.section.pk])
+        self.assertFalse(Class.objects.filter(search_vector=prefix_query('introduction biology')).exists())
+
+    def test_saves_refresh_the_vector(self):
+        self.section.title = 'Machine Learning'
+        self.section.save()
+        self.assertEqual(self.found('learning'), [self.section.pk])
+        self.assertFalse(Class.objects.filter(search_vector=prefix_query('introduction')).exists())
+        # writes that leave the searched fields alone don't recompute it
+        with mock.patch('class_catch_app.signals.refresh_search_vectors') as refresh:
+            self.section.save(update_fields=['enrollment'])
+        refresh.assert_not_called()
+
+
+class OutboxGapTests(SimpleTestCase):
+
+    def test_consumable(self):
+        now = timezone.now()
+        timeout = timezone.timedelta(seconds=30)
+        self.assertEqual(consumable([1, 2, 3], 0, None, now, timeout), (3, None))
+        self.assertEqual(consumable([1, 2, 4], 0, None, now, timeout), (2, now))
+        self.assertEqual(consumable([4, 5], 2, now - timeout / 2, now, timeout), (0, now - timeout / 2))
+        self.assertEqual(consumable([4, 5], 2, now - timeout, now, timeout), (2, None))
+        # only the gap right after the cursor has been waited on
+        self.assertEqual(consumable([4, 6], 2, now - timeout, now, timeout), (1, now))
+        self.assertEqual(consumable([], 2, now - timeout, now, timeout), (0, None))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ClassApiTests(TestCase):
+
+    def setUp(self):
+        # the caches outlive a test's rollback
+        cache.clear()
+        response_cache.local.clear()
+        schedule_indexes.clear()
+        ScrapeState.objects.create(term='202509')
+        sync_classes('202509', [
+            timetable_row(CRN='1'),
+            timetable_row(number='010', CRN='2'),
+            timetable_row(subject='MATH', Lim='30', Enrl='12', CRN='3', **{'Period Code': '2'}),
+            timetable_row(subject='MATH', number='010', Lim='30', Enrl='30', CRN='4', **{'Period Code': '11'}),
+            timetable_row(subject='PHYS', Lim='0', Enrl='80', CRN='5', **{'Period Code': '10A'}),
+            timetable_row(subject='CHEM', CRN='6', **{'Period Code': '3A'}),
+        ], use_copy=False)
+        Class.objects.filter(crn='2').update(is_active=False)
+
+    def keys(self, rows):
+        return [(row['class_code'], row['course_number']) for row in rows]
+
+    def test_cursor_pagination(self):
+        response = self.client.get('/api/classes/', {'term': '202509', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(self.keys(response.data['results']), [('COSC', '001'), ('MATH', '001')])
+        pages = [response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response.data['results'])
+        self.assertEqual([self.keys(page) for page in pages[1:]], [
+            [('MATH', '010'), ('PHYS', '001')], [('CHEM', '001')],
+        ])
+
+    def test_open_seats_filter(self):
+        response = self.client.get('/api/classes/', {'term': '202509', 'open_seats': 'true'})
+        self.assertEqual(
+            self.keys(response.data['results']), [('COSC', '001'), ('MATH', '001'), ('PHYS', '001'), ('CHEM', '001')]
+        )
+        response = self.client.get('/api/classes/', {'term': '202509', 'open_seats': 'false'})
+        self.assertEqual(self.keys(response.data['results']), [('MATH', '010')])
+
+    def test_conditional_get(self):
+        response = self.client.get('/api/classes/', {'term': '202509'})
+        etag = response['ETag']
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertEqual(self.client.get('/api/classes/', {'term': '202509'})['X-Cache'], 'local')
+
+        not_modified = self.client.get('/api/classes/', {'term': '202509'}, HTTP_IF_NONE_MATCH=f'"other", {etag}')
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+        self.assertFalse(not_modified.content)
+
+        # a scrape that changes the term moves the ETag
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_data_version('202509')
+        response = self.client.get('/api/classes/', {'term': '202509'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['X-Cache'], 'miss')
+
+        detail = self.client.get(f"/api/classes/{response.data['results'][0]['id']}/")
+        self.assertEqual(
+            self.client.get(detail.wsgi_request.path, HTTP_IF_NONE_MATCH=detail['ETag']).status_code, 304
+        )
+
+    def test_search(self):
+        Class.objects.filter(crn='3').update(title='Calculus')
+        for param in ('q', 'search'):
+            response = self.client.get('/api/classes/', {'term': '202509', param: 'calc'})
+            self.assertEqual(self.keys(response.data['results']), [('MATH', '001')], param)
+
+    def test_admin_search(self):
+        model_admin = admin_site._registry[Class]
+        request = RequestFactory().get('/admin/class_catch_app/class/')
+        Class.objects.filter(crn='3').update(term='202601')
+        with mock.patch('class_catch_app.admin.search_enabled', return_value=True), \
+                mock.patch('class_catch_app.admin.filter_search') as filter_search:
+            # a term code isn't in the search vector, so it goes through search_fields
+            queryset, _ = model_admin.get_search_results(request, Class.objects.all(), '202601')
+            self.assertEqual([row.crn for row in queryset], ['3'])
+            filter_search.assert_not_called()
+            model_admin.get_search_results(request, Class.objects.all(), 'calc')
+            filter_search.assert_called_once()
+
+    def test_other_writers_move_the_etag(self):
+        etag = self.client.get('/api/classes/', {'term': '202509'})['ETag']
+        section = Class.objects.get(crn='3')
+        section.title = 'Edited in the admin'
+        with self.captureOnCommitCallbacks(execute=True):
+            section.save()
+        response = self.client.get('/api/classes/', {'term': '202509'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Edited in the admin', [row['title'] for row in response.data['results']])
+
+        version = get_data_version('202509')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('refresh_aggregates', term=['202509'], stdout=StringIO())
+        self.assertEqual(get_data_version('202509'), version + 1)
+
+    def test_bump_without_scrape_state(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_data_version('202601')
+        self.assertEqual(get_data_version('202601'), 1)
+
+    def test_compatible(self):
+        # COSC 001 meets in the 10; MATH 010 (in the 11) is full
+        response = self.client.get('/api/classes/compatible/', {'term': '202509', 'crns': '1'})
+        self.assertEqual(self.keys(response.data), [('CHEM', '001'), ('MATH', '001'), ('PHYS', '001')])
+        response = self.client.get('/api/classes/compatible/', {'term': '202509', 'crns': '1', 'open_only': 'false'})
+        self.assertEqual(
+            self.keys(response.data), [('CHEM', '001'), ('MATH', '001'), ('MATH', '010'), ('PHYS', '001')]
+        )
+        # the 10A's x-hour (W 3:30-4:20) only rules out the 3A (MW 3:30-5:20) when x-hours count
+        response = self.client.get('/api/classes/compatible/', {'term': '202509', 'crns': '5'})
+        self.assertEqual(self.keys(response.data), [('CHEM', '001'), ('COSC', '001'), ('MATH', '001')])
+        response = self.client.get('/api/classes/compatible/', {'term': '202509', 'crns': '5', 'xhours': 'true'})
+        self.assertEqual(self.keys(response.data), [('COSC', '001'), ('MATH', '001')])
+        self.assertEqual(self.client.get('/api/classes/compatible/').status_code, 400)
+
+
+def outbox_event(pk, event_type=ClassChangeEvent.SEAT_OPENED, enrollment=29, subject='COSC'):
+    return {
+        'id': pk, 'event_type': event_type, 'term': '202509', 'class_code': subject,
+        'course_number': '001', 'section_number': '01', 'data': {'enrollment': enrollment, 'limit': 30},
+    }
+
+
+async def eventually(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError('condition not met in time')
+        await asyncio.sleep(0.001)
+
+
+class PushBrokerTests(SimpleTestCase):
+
+    def test_parse_topics(self):
+        self.assertEqual(push.parse_topics('202509', ['cosc:001:01', 'COSC:010:', 'bad', ':1:01'], ['math', '']), {
+            'section:202509:COSC:1:1', 'section:202509:COSC:10:', 'dept:202509:MATH',
+        })
+        self.assertEqual(
+            push.subscription_from_query(b'term=202509&sections=COSC:1:01,MATH:003:2&departments=PHYS'),
+            {'section:202509:COSC:1:1', 'section:202509:MATH:3:2', 'dept:202509:PHYS'},
+        )
+        self.assertEqual(push.subscription_from_query(b'sections=COSC:001:01'), set())
+
+    def test_section_numbers_are_normalized(self):
+        broker = push.Broker()
+        subscriber = push.Subscriber()
+        # the documented form matches the zero-padded numbers the timetable stores
+        broker.subscribe(subscriber, push.subscription_from_query(b'term=202509&sections=COSC:1:01'))
+        self.assertEqual(broker.publish_event(outbox_event(1)), 1)
+        self.assertEqual(broker.publish_event(dict(outbox_event(2), course_number='010')), 0)
+
+    async def test_publish_and_coalesce(self):
+        broker = push.Broker()
+        section, department, other = push.Subscriber(), push.Subscriber(), push.Subscriber()
+        broker.subscribe(section, push.parse_topics('202509', ['COSC:001:01'], ['COSC']))
+        broker.subscribe(department, push.parse_topics('202509', departments=['COSC']))
+        broker.subscribe(other, push.parse_topics('202509', departments=['MATH']))
+        self.assertEqual(broker.subscriber_count, 3)
+
+        # the section subscriber matches both topics but gets the delta once
+        self.assertEqual(broker.publish_event(outbox_event(1, ClassChangeEvent.SEAT_FILLED, 30)), 2)
+        self.assertEqual(broker.publish_event(outbox_event(2)), 2)
+        batch = await section.next_batch(timeout=1)
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(batch[0]['events'], [ClassChangeEvent.SEAT_FILLED, ClassChangeEvent.SEAT_OPENED])
+        self.assertEqual((batch[0]['id'], batch[0]['enrollment']), (2, 29))
+        self.assertEqual(await other.next_batch(timeout=0.01), [])
+
+        broker.unsubscribe(section)
+        broker.unsubscribe(department)
+        self.assertEqual(broker.subscriber_count, 1)
+        self.assertEqual(set(broker.index), {'dept:202509:MATH'})
+
+    def test_older_delta_keeps_the_newer_values(self):
+        subscriber = push.Subscriber()
+        key = ('202509', 'COSC', '001', '01')
+        subscriber.push(key, {'id': 5, 'event': 'seat_filled', 'enrollment': 30})
+        # replayed after the live one
+        subscriber.push(key, {'id': 3, 'event': 'seat_opened', 'enrollment': 29})
+        self.assertEqual(subscriber.pending[key], {'id': 5, 'event': 'seat_filled', 'enrollment': 30,
+                                                   'events': ['seat_opened', 'seat_filled']})
+
+    def test_slow_subscriber_is_bounded(self):
+        subscriber = push.Subscriber(max_pending=1)
+        subscriber.push(('202509', 'COSC', '001', '01'), {'event': 'seat_opened'})
+        subscriber.push(('202509', 'COSC', '002', '01'), {'event': 'seat_opened'})
+        self.assertEqual((len(subscriber.pending), subscriber.dropped), (1, 1))
+
+
+@override_settings(CORS_ALLOWED_ORIGINS=['http://localhost:3000'])
+class PushEndpointTests(SimpleTestCase):
+    ORIGIN = (b'origin', b'http://localhost:3000')
+
+    def setUp(self):
+        patcher = mock.patch.object(push.poller, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def http_scope(self, method='GET', query=b'term=202509&sections=COSC:001:01', origin=ORIGIN):
+        return {
+            'type': 'http', 'method': method, 'path': '/api/stream/', 'query_string': query,
+            'headers': [origin] if origin else [],
+        }
+
+    async def call(self, app, scope, messages=()):
+        sent = []
+        inbox = asyncio.Queue()
+        for message in messages:
+            inbox.put_nowait(message)
+
+        async def send(message):
+            sent.append(message)
+        return sent, inbox, asyncio.ensure_future(app(scope, inbox.get, send))
+
+    async def test_sse_stream(self):
+        sent, inbox, task = await self.call(push.sse_app, self.http_scope())
+        await eventually(lambda: len(sent) == 2)
+        headers = dict(sent[0]['headers'])
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(headers[b'content-type'], b'text/event-stream')
+        self.assertEqual(headers[b'access-control-allow-origin'], b'http://localhost:3000')
+
+        push.broker.publish_event(outbox_event(7))
+        push.broker.publish_event(outbox_event(8, subject='MATH'))
+        await eventually(lambda: len(sent) == 3)
+        self.assertEqual(sent[2]['body'].decode().split('\n')[0], 'id: 7')
+        delta = json.loads(sent[2]['body'].decode().split('\n')[1][len('data: '):])
+        self.assertEqual((delta['events'], delta['enrollment']), ([ClassChangeEvent.SEAT_OPENED], 29))
+
+        inbox.put_nowait({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, 2)
+        self.assertEqual(push.broker.subscriber_count, 0)
+
+    async def test_sse_cors(self):
+        sent, _, task = await self.call(push.sse_app, self.http_scope('OPTIONS'))
+        await asyncio.wait_for(task, 2)
+        headers = dict(sent[0]['headers'])
+        self.assertEqual(headers[b'access-control-allow-origin'], b'http://localhost:3000')
+        self.assertEqual(headers[b'access-control-allow-methods'], b'GET, OPTIONS')
+        self.assertIn(b'last-event-id', headers[b'access-control-allow-headers'])
+
+        sent, _, task = await self.call(push.sse_app, self.http_scope(query=b'', origin=(b'origin', b'https://evil.example')))
+        await asyncio.wait_for(task, 2)
+        self.assertEqual(sent[0]['status'], 400)
+        self.assertNotIn(b'access-control-allow-origin', dict(sent[0]['headers']))
+
+    async def test_websocket(self):
+        scope = {'type': 'websocket', 'path': '/ws/classes/', 'query_string': b'', 'headers': [self.ORIGIN]}
+        sent, inbox, task = await self.call(push.websocket_app, scope, [
+            {'type': 'websocket.connect'},
+            {'type': 'websocket.receive', 'text': json.dumps({'term': '202509', 'departments': ['COSC']})},
+        ])
+        await eventually(lambda: len(sent) == 2)
+        self.assertEqual(sent[0], {'type': 'websocket.accept'})
+        self.assertEqual(json.loads(sent[1]['text']), {'subscribed': ['dept:202509:COSC']})
+
+        push.broker.publish_event(outbox_event(9))
+        await eventually(lambda: len(sent) == 3)
+        self.assertEqual([delta['id'] for delta in json.loads(sent[2]['text'])], [9])
+
+        inbox.put_nowait({'type': 'websocket.receive', 'text': 'not json'})
+        await eventually(lambda: len(sent) == 4)
+        self.assertEqual(json.loads(sent[3]['text']), {'error': 'invalid subscription'})
+
+        inbox.put_nowait({'type': 'websocket.disconnect'})
+        await asyncio.wait_for(task, 2)
+        self.assertEqual(push.broker.subscriber_count, 0)
+
+    async def test_websocket_rejects_other_origins(self):
+        scope = {'type': 'websocket', 'path': '/ws/classes/', 'query_string': b'',
+                 'headers': [(b'origin', b'https://evil.example')]}
+        sent, _, task = await self.call(push.websocket_app, scope, [{'type': 'websocket.connect'}])
+        await asyncio.wait_for(task, 2)
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': 4403}])
+
+
+class OutboxPollerTests(TestCase):
+
+    def test_holds_back_at_uncommitted_events(self):
+        section = Class.objects.create(
+            class_code='COSC', course_number='001', section='01', term='202509', title='Title', limit=30, enrollment=29,
+        )
+        for pk in (1, 3):
+            ClassChangeEvent.objects.create(pk=pk, section=section, event_type=ClassChangeEvent.SEAT_OPENED,
+                                            term='202509', class_code='COSC', course_number='001', created=timezone.now())
+        poller = push.OutboxPoller(push.Broker(), batch_size=2)
+        poller.last_event_id = 0
+        events, more = poller.fetch()
+        self.assertEqual(([event['id'] for event in events], more), ([1], False))
+        poller.last_event_id = 1
+        self.assertEqual(poller.fetch()[0], [])
+        ClassChangeEvent.objects.create(pk=2, section=section, event_type=ClassChangeEvent.SEAT_FILLED,
+                                        term='202509', class_code='COSC', course_number='001', created=timezone.now())
+        events, more = poller.fetch()
+        self.assertEqual(([event['id'] for event in events], more), ([2, 3], True))
+        self.assertIsNone(poller.gap_seen_at)
+
+    async def test_sse_resumes_from_last_event_id(self):
+        def create_events():
+            cosc = Class.objects.create(class_code='COSC', course_number='001', section='01', term='202509',
+                                        title='Title', limit=30, enrollment=29)
+            math = Class.objects.create(class_code='MATH', course_number='003', section='01', term='202509',
+                                        title='Title', limit=30, enrollment=30)
+            for pk, section, event_type in [
+                (1, cosc, ClassChangeEvent.SEAT_FILLED), (2, math, ClassChangeEvent.SEAT_FILLED),
+                (3, cosc, ClassChangeEvent.SEAT_OPENED), (4, cosc, ClassChangeEvent.SEAT_FILLED),
+            ]:
+                ClassChangeEvent.objects.create(
+                    pk=pk, section=section, event_type=event_type, term='202509', class_code=section.class_code,
+                    course_number=section.course_number, section_number=section.section,
+                    data={'enrollment': pk, 'limit': 30}, created=timezone.now(),
+                )
+        await sync_to_async(create_events)()
+
+        poller = push.OutboxPoller(push.Broker())
+        # event 4 has already been published live
+        poller.last_event_id = 3
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/api/stream/', 'query_string': b'term=202509&sections=COSC:1:1',
+            'headers': [(b'last-event-id', b'1')],
+        }
+        sent = []
+        inbox = asyncio.Queue()
+
+        async def send(message):
+            sent.append(message)
+        with mock.patch.object(push, 'poller', poller), mock.patch.object(push, 'broker', poller.broker), \
+                mock.patch.object(poller, 'start'):
+            task = asyncio.ensure_future(push.sse_app(scope, inbox.get, send))
+            await eventually(lambda: len(sent) == 3)
+            # only the missed COSC event, then the stream goes live
+            lines = sent[2]['body'].decode().split('\n')
+            self.assertEqual(lines[0], 'id: 3')
+            self.assertEqual(json.loads(lines[1][len('data: '):])['events'], [ClassChangeEvent.SEAT_OPENED])
+
+            inbox.put_nowait({'type': 'http.disconnect'})
+            await asyncio.wait_for(task, 2)
@@ -0,0 +1,278 @@
+import codecs
+import hashlib
+from collections import deque, namedtuple
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+
+class TimetableNotFound(Exception):
+    """Raised when the page does not contain the timetable data table."""
+
+
+class TimetableRowParser(HTMLParser):
+    """
+    Incremental parser for the timetable `data-table`.
+
+    Feed it the page in chunks; completed rows are queued as dicts keyed by the
+    table headers and can be drained with `pop_rows()` while parsing continues.
+    Cell text matches BeautifulSoup's `get_text(strip=True)`.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.header_indices = None
+        self.rows = deque()
+        self.div_depth = 0          # depth of nested divs inside the data-table div
+        self.table_depth = 0        # depth of nested tables inside the data-table div
+        self.table_done = False
+        self.row = None             # cells of the row being parsed
+        self.row_is_separator = False
+        self.row_tags = ('th', 'td')
+        self.cell = None            # stripped text nodes of the cell being parsed
+        self.cell_tag = None
+        self.text = []              # raw fragments of the current text node
+
+    def pop_rows(self):
+        """Drain the rows completed so far."""
+        while self.rows:
+            yield self.rows.popleft()
+
+    # text nodes
+
+    def flush_text(self):
+        if self.text:
+            if self.cell is not None:
+                fragment = ''.join(self.text).strip()
+                if fragment:
+                    self.cell.append(fragment)
+            self.text = []
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.text.append(data)
+
+    def handle_comment(self, data):
+        self.flush_text()
+
+    # tags
+
+    def handle_starttag(self, tag, attrs):
+        self.flush_text()
+        if self.table_done:
+            return
+
+        if tag == 'div':
+            if self.div_depth:
+                self.div_depth += 1
+            elif 'data-table' in (dict(attrs).get('class') or '').split():
+                self.div_depth = 1
+            return
+
+        if not self.div_depth:
+            return
+
+        if tag == 'table':
+            self.table_depth += 1
+        elif not self.table_depth:
+            return
+        elif tag == 'tr':
+            self.end_row()
+            self.row = []
+            self.row_is_separator = False
+        elif tag in self.row_tags and self.row is not None:
+            self.end_cell()
+            self.cell = []
+            self.cell_tag = tag
+            if tag == 'td' and any(name == 'colspan' for name, _ in attrs):
+                self.row_is_separator = True
+
+    def handle_startendtag(self, tag, attrs):
+        self.flush_text()
+
+    def handle_endtag(self, tag):
+        self.flush_text()
+        if self.table_done or not self.div_depth:
+            return
+
+        if tag == 'div':
+            self.div_depth -= 1
+            if not self.div_depth and self.table_depth:
+                self.finish_table()
+        elif tag == 'table' and self.table_depth:
+            self.table_depth -= 1
+            if not self.table_depth:
+                self.finish_table()
+        elif tag in self.row_tags:
+            self.end_cell()
+        elif tag == 'tr':
+            self.end_row()
+
+    def close(self):
+        super().close()
+        self.flush_text()
+        if self.table_depth and not self.table_done:
+            self.finish_table()
+
+    # rows
+
+    def end_cell(self):
+        if self.cell is not None:
+            self.row.append((self.cell_tag, ''.join(self.cell)))
+            self.cell = None
+            self.cell_tag = None
+
+    def end_row(self):
+        self.end_cell()
+        if self.row is None:
+            return
+        row, self.row = self.row, None
+
+        if self.header_indices is None:
+            # the first row of the table holds the headers
+            headers = [text for tag, text in row if tag == 'th']
+            self.header_indices = {header: idx for idx, header in enumerate(headers)}
+            return
+
+        # skip separator rows
+        if self.row_is_separator:
+            return
+
+        cell_texts = [text for tag, text in row if tag == 'td']
+        self.rows.append({
+            header: cell_texts[idx] if idx < len(cell_texts) else ''
+            for header, idx in self.header_indices.items()
+        })
+
+    def finish_table(self):
+        self.end_row()
+        self.table_done = True
+
+
+def iter_timetable_rows(chunks, encoding='utf-8'):
+    """
+    Yield timetable rows one at a time from an iterable of HTML chunks.
+
+    Chunks may be `str` or `bytes` (e.g. `response.iter_content()`); bytes are
+    decoded incrementally with `encoding`. A plain string is treated as a
+    single chunk.
+    """
+    if isinstance(chunks, (str, bytes)):
+        chunks = [chunks]
+
+    parser = TimetableRowParser()
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        if chunk:
+            parser.feed(chunk)
+            yield from parser.pop_rows()
+
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        parser.feed(tail)
+    parser.close()
+    yield from parser.pop_rows()
+
+    if parser.header_indices is None:
+        raise TimetableNotFound("No data-table found in the timetable page")
+
+
+def iter_timetable_rows_bs4(html_content):
+    """Yield timetable rows using a full BeautifulSoup tree (fallback path)."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    # find the data table
+    container = soup.find('div', class_='data-table')
+    table = container.find('table') if container else None
+    if table is None:
+        raise TimetableNotFound("No data-table found in the timetable page")
+
+    # headers
+    header_cells = table.find('tr').find_all('th')
+    headers = [cell.get_text(strip=True) for cell in header_cells]
+    header_indices = {header: idx for idx, header in enumerate(headers)}
+
+    for row in table.find_all('tr')[1:]:  # skip header row
+        # skip separator rows
+        if row.find('td', {'colspan': True}):
+            continue
+
+        cell_texts = [cell.get_text(strip=True) for cell in row.find_all('td')]
+        yield {
+            header: cell_texts[idx] if idx < len(cell_texts) else ''
+            for header, idx in header_indices.items()
+        }
+
+
+class SubjectListParser(HTMLParser):
+    """Collects the department codes offered by the timetable's subject search form."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.subjects = []
+        self.in_depts_select = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'select':
+            self.in_depts_select = attrs.get('name') == 'depts'
+        elif tag == 'option' and self.in_depts_select or tag == 'input' and attrs.get('name') == 'depts':
+            value = (attrs.get('value') or '').strip()
+            if value and value != 'no_value' and value not in self.subjects:
+                self.subjects.append(value)
+
+    def handle_endtag(self, tag):
+        if tag == 'select':
+            self.in_depts_select = False
+
+
+def parse_subjects(html_content):
+    """Department codes listed by the subject search page, in page order."""
+    parser = SubjectListParser()
+    parser.feed(html_content)
+    parser.close()
+    return parser.subjects
+
+
+# a fetched timetable page: its parsed rows, their digest and the bytes read
+ParsedPage = namedtuple('ParsedPage', 'rows digest nbytes')
+
+
+def rows_digest(rows):
+    """
+    SHA-256 of parsed timetable rows. Only the table data goes in, so page
+    chrome, markup and generation timestamps don't change it.
+    """
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update('\x1f'.join(f'{header}\x1d{text}' for header, text in row.items()).encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def read_timetable(chunks, encoding='utf-8', parser='stream'):
+    """
+    Parse a page into a ParsedPage while its chunks arrive (e.g. from
+    `response.iter_content()`), so the HTML is never buffered whole. The bs4
+    parser needs the complete page and buffers it. Raises TimetableNotFound
+    if the page has no data table.
+    """
+    if isinstance(chunks, (str, bytes)):
+        chunks = [chunks]
+    nbytes = 0
+
+    def counted():
+        nonlocal nbytes
+        for chunk in chunks:
+            nbytes += len(chunk)
+            yield chunk
+
+    if parser == 'bs4':
+        parts = list(counted())
+        html_content = b''.join(parts).decode(encoding, errors='replace') if parts and isinstance(parts[0], bytes) \
+            else ''.join(parts)
+        rows = list(iter_timetable_rows_bs4(html_content))
+    else:
+        rows = list(iter_timetable_rows(counted(), encoding=encoding))
+    return ParsedPage(rows, rows_digest(rows), nbytes)
@@ -0,0 +1,11 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+from .views import ClassAggregateView, ClassViewSet
+
+router = DefaultRouter()
+router.register(r'classes', ClassViewSet, basename='class')
+
+urlpatterns = [
+    path('aggregates/', ClassAggregateView.as_view(), name='class-aggregates'),
+    path('', include(router.urls)),
+]
@@ -1,3 +1,134 @@
-from django.shortcuts import render
+import hashlib
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .aggregates import GROUP_FIELDS, term_aggregates
+from .data_version import get_data_version
+from .filters import ClassFilter
+from .models import Class
+from .response_cache import response_cache
+from .schedule import schedule_index
+from .serializers import CLASS_FIELDS, ClassSerializer
 
-# Create your views here.
+
+class ClassCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key, so deep pages cost the same as the first."""
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class ConditionalGetMixin:
+    """
+    Strong ETags derived from the class data version and the request URL.
+    A matching If-None-Match is answered with 304 before any query runs.
+    """
+
+    def get_etag(self, request):
+        url_hash = hashlib.blake2b(request.get_full_path().encode(), digest_size=8).hexdigest()
+        return f'"{get_data_version()}-{url_hash}"'
+
+    def not_modified(self, request, etag):
+        if_none_match = request.headers.get('If-None-Match', '')
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+    def conditional(self, request, handler, *args, **kwargs):
+        etag = self.get_etag(request)
+        if self.not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class ClassViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Classes, filterable by term, subject, course number, distrib, period and
+    open seats, and searchable with `q` (or `search`). Inactive (no longer listed) sections are hidden unless
+    `is_active` is given.
+    """
+    serializer_class = ClassSerializer
+    filterset_class = ClassFilter
+    pagination_class = ClassCursorPagination
+
+    def get_queryset(self):
+        queryset = Class.objects.only(*CLASS_FIELDS)
+        if 'is_active' not in self.request.query_params:
+            queryset = queryset.filter(is_active=True)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, self.list_values)
+
+    def list_values(self, request):
+        # pagination links are absolute, so the host is part of the key
+        key = response_cache.make_key(
+            'classes', request.query_params, term=request.query_params.get('term'), extra=request.get_host()
+        )
+        data, source = response_cache.get_or_compute(key, lambda: self.query_list(request))
+        response = Response(data)
+        response['X-Cache'] = source
+        return response
+
+    def query_list(self, request):
+        # plain dicts from .values() skip model instances and the serializer on the hot path
+        queryset = self.filter_queryset(self.get_queryset()).values(*CLASS_FIELDS)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(page).data
+        return list(queryset)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
+
+    @action(detail=False)
+    def compatible(self, request):
+        """
+        Open sections of `term` that fit around the sections with the given
+        `crns` (comma separated). `xhours=true` counts x-hours as conflicts,
+        `open_only=false` includes full sections.
+        """
+        return self.conditional(request, self.compatible_values)
+
+    def compatible_values(self, request):
+        term = request.query_params.get('term')
+        if not term:
+            return Response({'detail': 'term is required'}, status=status.HTTP_400_BAD_REQUEST)
+        crns = [crn.strip() for crn in request.query_params.get('crns', '').split(',') if crn.strip()]
+        xhours = request.query_params.get('xhours', '').lower() in ('1', 'true')
+        open_only = request.query_params.get('open_only', '').lower() not in ('0', 'false')
+
+        index = schedule_index(term)
+        pks = index.compatible(index.busy_mask(crns, xhours), xhours=xhours, open_only=open_only)
+        queryset = (
+            Class.objects.filter(pk__in=pks).exclude(crn__in=crns)
+            .order_by('class_code', 'course_number', 'section').values(*CLASS_FIELDS)
+        )
+        return Response(list(queryset))
+
+
+class ClassAggregateView(ConditionalGetMixin, APIView):
+    """
+    Per-department (`group_by=department`, the default) or per-distrib
+    (`group_by=distrib`) totals of a `term`, served from the precomputed
+    aggregates.
+    """
+
+    def get(self, request):
+        return self.conditional(request, self.aggregates)
+
+    def aggregates(self, request):
+        term = request.query_params.get('term')
+        group_by = request.query_params.get('group_by', 'department')
+        if not term:
+            return Response({'detail': 'term is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if group_by not in GROUP_FIELDS:
+            return Response(
+                {'detail': f"group_by must be one of {', '.join(GROUP_FIELDS)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(term_aggregates(term, group_by))